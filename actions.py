@@ -1,7 +1,60 @@
-"""通用操作模块 - 提供基础的 UI 自动化操作"""
+"""通用操作模块 - 提供基础的 UI 自动化操作
+
+每个方法都带有埋点（见 instrumentation.py），注册处理器后可以记录方法和设备调用的耗时。
+"""
+import itertools
+import logging
+import os
+import threading
 import time
+import weakref
+import xml.etree.ElementTree as ET
 from typing import Optional, Tuple
 import uiautomator2 as u2
+import framebuffer
+import frames
+import gestures
+import instrumentation
+import template_match
+import text_input
+import watchers
+from instrumentation import instrumented
+
+logger = logging.getLogger(__name__)
+
+
+def _locator(arguments: dict) -> Optional[str]:
+    """根据 text / resource_id 参数判断定位方式"""
+    if arguments.get("text"):
+        return "text"
+    if arguments.get("resource_id"):
+        return "resourceId"
+    return None
+
+
+def _hierarchy_nodes(xml: str) -> set:
+    """界面结构 -> 节点集合（类名、resource-id、文本、位置），用于比较两次导出之间的变化"""
+    return {
+        (node.get("class"), node.get("resource-id"), node.get("text"), node.get("bounds"))
+        for node in ET.fromstring(xml).iter("node")
+    }
+
+
+# 没有序列号的设备对象 -> 标识（计数器生成，不会像 id() 那样在对象回收后被其他设备复用）
+_anonymous_keys: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_anonymous_counter = itertools.count(1)
+_anonymous_lock = threading.Lock()
+
+
+def _device_key(device):
+    serial = getattr(device, "serial", None)
+    if serial:
+        return serial
+    with _anonymous_lock:
+        key = _anonymous_keys.get(device)
+        if key is None:
+            key = _anonymous_keys[device] = f"device-{next(_anonymous_counter)}"
+        return key
 
 
 class Actions:
@@ -14,8 +67,30 @@ class Actions:
         Args:
             device: UIAutomator2 设备对象
         """
-        self.device = device
-
+        self._device = device
+        self._instrumented_device = instrumentation.InstrumentedObject(device)
+        self._screencap: Optional[framebuffer.RawScreencap] = None
+        self.watchers: Optional[watchers.WatcherSet] = None  # 当前应用的弹窗规则（launch_app 时加载）
+
+    @property
+    def device(self) -> u2.Device:
+        """设备对象（注册了埋点处理器时返回记录设备调用的代理）"""
+        if instrumentation.enabled():
+            return self._instrumented_device
+        return self._device
+
+    @device.setter
+    def device(self, device: u2.Device):
+        self._device = device
+        self._instrumented_device = instrumentation.InstrumentedObject(device)
+        self._screencap = None
+
+    @property
+    def device_key(self):
+        """设备标识（序列号，没有序列号时为进程内唯一的编号），用作按设备缓存的键"""
+        return _device_key(self._device)
+
+    @instrumented()
     def launch_app(self, package_name: str, wait_time: float = 2.0):
         """
         启动应用
@@ -24,10 +99,12 @@ class Actions:
             package_name: 应用包名
             wait_time: 启动后等待时间（秒）
         """
-        print(f"启动应用: {package_name}")
+        logger.info("启动应用: %s", package_name)
+        self.watchers = watchers.WatcherSet.for_package(package_name)
         self.device.app_start(package_name)
-        time.sleep(wait_time)
+        self._pause(wait_time)
 
+    @instrumented()
     def stop_app(self, package_name: str):
         """
         停止应用
@@ -35,9 +112,10 @@ class Actions:
         Args:
             package_name: 应用包名
         """
-        print(f"停止应用: {package_name}")
+        logger.info("停止应用: %s", package_name)
         self.device.app_stop(package_name)
 
+    @instrumented(locator="text")
     def click_by_text(self, text: str, timeout: float = 10.0) -> bool:
         """
         根据文本点击元素
@@ -50,22 +128,22 @@ class Actions:
             是否点击成功
         """
         try:
-            print(f"点击文本: {text}")
+            logger.info("点击文本: %s", text)
             element = self.device(text=text)
-            if element.wait(timeout=timeout):
+            if self._wait(element, timeout):
                 element.click()
-                time.sleep(0.5)
+                self._pause(0.5)
                 return True
             return False
         except Exception as e:
             error_msg = str(e)
             if "INJECT_EVENTS" in error_msg or "SecurityException" in error_msg:
-                print(f"❌ 点击失败: 权限不足")
-                print(f"💡 请执行: uv run python -m uiautomator2 init")
+                logger.error("❌ 点击失败: 权限不足，请执行: uv run python -m uiautomator2 init")
             else:
-                print(f"点击文本失败: {e}")
+                logger.warning("点击文本失败: %s", e)
             return False
 
+    @instrumented(locator="resourceId")
     def click_by_id(self, resource_id: str, timeout: float = 10.0) -> bool:
         """
         根据 resource-id 点击元素
@@ -78,22 +156,22 @@ class Actions:
             是否点击成功
         """
         try:
-            print(f"点击 ID: {resource_id}")
+            logger.info("点击 ID: %s", resource_id)
             element = self.device(resourceId=resource_id)
-            if element.wait(timeout=timeout):
+            if self._wait(element, timeout):
                 element.click()
-                time.sleep(0.5)
+                self._pause(0.5)
                 return True
             return False
         except Exception as e:
             error_msg = str(e)
             if "INJECT_EVENTS" in error_msg or "SecurityException" in error_msg:
-                print(f"❌ 点击失败: 权限不足")
-                print(f"💡 请执行: uv run python -m uiautomator2 init")
+                logger.error("❌ 点击失败: 权限不足，请执行: uv run python -m uiautomator2 init")
             else:
-                print(f"点击 ID 失败: {e}")
+                logger.warning("点击 ID 失败: %s", e)
             return False
 
+    @instrumented(locator="coordinate")
     def click_coordinate(self, x: int, y: int):
         """
         根据坐标点击
@@ -103,18 +181,91 @@ class Actions:
             y: Y 坐标
         """
         try:
-            print(f"点击坐标: ({x}, {y})")
+            logger.info("点击坐标: (%s, %s)", x, y)
             self.device.click(x, y)
-            time.sleep(0.5)
+            self._pause(0.5)
         except Exception as e:
             error_msg = str(e)
             if "INJECT_EVENTS" in error_msg or "SecurityException" in error_msg:
-                print(f"❌ 点击失败: 权限不足")
-                print(f"💡 请执行: uv run python -m uiautomator2 init")
+                logger.error("❌ 点击失败: 权限不足，请执行: uv run python -m uiautomator2 init")
                 raise
             else:
                 raise
 
+    @instrumented(locator="image", false_is_failure=False)
+    def find_image(
+        self,
+        template: str,
+        timeout: float = 0.0,
+        threshold: float = template_match.DEFAULT_THRESHOLD,
+        region: Optional[Tuple[float, float, float, float]] = None,
+    ) -> Optional[dict]:
+        """
+        在截图中查找参考图（模板匹配，不依赖界面结构）
+
+        Args:
+            template: 参考图路径（一般取自应用 config.py 的 TEMPLATES）
+            timeout: 超时时间（秒），0 表示只截图匹配一次
+            threshold: 相似度阈值
+            region: 只在该区域内查找，(左, 上, 右, 下) 为屏幕宽高的比例
+
+        Returns:
+            找到时返回 {"x", "y", "score", "scale", "bounds"}，否则返回 None
+        """
+        if not os.path.exists(template):
+            logger.debug("参考图不存在: %s", template)  # 未提供参考图的机型按未找到处理
+            return None
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                screen = self.grab()
+                found = template_match.locate(screen, template, threshold, region=region)
+            except Exception as e:
+                logger.warning("模板匹配失败: %s", e)
+                return None
+            if found or time.monotonic() >= deadline:
+                break
+            self._pause(0.3)
+        if not found:
+            # 没找到时的画面留作排查依据
+            frames.buffer_for(self.device_key).add(framebuffer.to_image(screen),
+                                                label=f"find_image:{os.path.basename(template)}")
+        return found
+
+    @instrumented(locator="image")
+    def click_by_image(
+        self,
+        template: str,
+        timeout: float = 3.0,
+        threshold: float = template_match.DEFAULT_THRESHOLD,
+        region: Optional[Tuple[float, float, float, float]] = None,
+    ) -> bool:
+        """
+        根据参考图点击（模板匹配）
+
+        Args:
+            template: 参考图路径
+            timeout: 超时时间（秒）
+            threshold: 相似度阈值
+            region: 只在该区域内查找，(左, 上, 右, 下) 为屏幕宽高的比例
+
+        Returns:
+            是否点击成功
+        """
+        logger.info("点击图片: %s", os.path.basename(template))
+        found = self.find_image(template, timeout, threshold, region)
+        if not found:
+            return False
+        logger.debug("图片匹配: (%s, %s) 相似度 %s", found["x"], found["y"], found["score"])
+        try:
+            self.device.click(found["x"], found["y"])
+        except Exception as e:
+            logger.warning("点击图片失败: %s", e)
+            return False
+        self._pause(0.5)
+        return True
+
+    @instrumented()
     def swipe(self, direction: str = "up", scale: float = 0.8):
         """
         滑动屏幕
@@ -123,7 +274,7 @@ class Actions:
             direction: 滑动方向 (up/down/left/right)
             scale: 滑动距离占屏幕的比例
         """
-        print(f"滑动: {direction}")
+        logger.info("滑动: %s", direction)
         if direction == "up":
             self.device.swipe_ext("up", scale=scale)
         elif direction == "down":
@@ -132,8 +283,104 @@ class Actions:
             self.device.swipe_ext("left", scale=scale)
         elif direction == "right":
             self.device.swipe_ext("right", scale=scale)
-        time.sleep(0.5)
+        self._pause(0.5)
+
+    def _wait(self, element, timeout: float) -> bool:
+        """
+        等待元素出现。应用有自己的弹窗规则时分段等待，每段未找到就检查并关闭弹窗（见 watchers.py）
+
+        Args:
+            element: 选择器（self.device(...) 的返回值）
+            timeout: 超时时间（秒）
+
+        Returns:
+            元素是否出现
+        """
+        if not (self.watchers and self.watchers.app_rules):
+            # 只有系统弹窗规则时不分段，避免每次等待都额外导出界面结构
+            return bool(element.wait(timeout=timeout))
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if element.wait(timeout=max(0.0, min(watchers.WATCH_INTERVAL, remaining))):
+                return True
+            dismissed = self.dismiss_popups()
+            if dismissed:
+                instrumentation.record_retry()  # 关闭弹窗后重新等待
+            if deadline - time.monotonic() <= 0:
+                # 超时前刚关闭了弹窗时再确认一次
+                return bool(dismissed and element.exists)
+
+    @instrumented(false_is_failure=False)
+    def dismiss_popups(self, xml: Optional[str] = None) -> list:
+        """
+        按当前应用的弹窗规则关闭弹窗（连续出现多个时依次关闭）
+
+        Args:
+            xml: 已经导出的界面结构（如页面识别时导出的），不传时导出一次
+
+        Returns:
+            关闭的弹窗名称列表
+        """
+        dismissed = []
+        if not self.watchers:
+            return dismissed
+        for _ in range(watchers.MAX_ROUNDS):
+            if xml is None:
+                xml = self.device.dump_hierarchy(compressed=True)
+            found = self.watchers.find(xml)
+            if found is None:
+                break
+            rule, point = found
+            name = rule.get("name") or str(rule)
+            logger.info("🧹 关闭弹窗: %s", name)
+            if point is None:
+                self.device.press("back")
+            else:
+                self.device.click(*point)
+            dismissed.append(name)
+            xml = None
+            self._pause(watchers.DISMISS_PAUSE)
+        return dismissed
+
+    def macro(self) -> gestures.Macro:
+        """
+        创建手势宏：链式添加点击、滑动、按键和等待，run() 时在一次设备调用中执行（见 gestures.py）
 
+        Returns:
+            手势宏，如 actions.macro().tap(x, y).sleep(2).tap(x2, y2).run()
+        """
+        return gestures.Macro(self)
+
+    @instrumented()
+    def run_macro(self, macro: gestures.Macro) -> dict:
+        """
+        执行手势宏
+
+        Args:
+            macro: 手势宏
+
+        Returns:
+            {"batched": 是否一次执行, "total": 总耗时（秒）, "gestures": [{"gesture", "duration"}, ...]}
+        """
+        logger.info("执行手势宏: %s 个手势", len(macro))
+        start = time.perf_counter()
+        if getattr(self._device, "shell", None) is None:
+            # 不支持 shell 的设备逐个执行
+            timings = gestures.run_local(self.device, macro)
+            return {"batched": False, "total": round(time.perf_counter() - start, 3), "gestures": timings}
+
+        response = self.device.shell(macro.compile(), timeout=60)
+        output = getattr(response, "output", response)
+        timings = gestures.timings(macro, gestures.parse_marks(output))
+        total = time.perf_counter() - start
+        if any(timing["duration"] is None for timing in timings):
+            logger.warning("⚠️  手势宏没有完整执行: %s", output.strip()[-200:])
+        for timing in timings:
+            logger.debug("  %-32s %s 秒", timing["gesture"], timing["duration"])
+        return {"batched": True, "total": round(total, 3), "gestures": timings}
+
+    @instrumented(locator=_locator)
     def wait_for_element(
         self, text: Optional[str] = None, resource_id: Optional[str] = None, timeout: float = 10.0
     ) -> bool:
@@ -150,42 +397,57 @@ class Actions:
         """
         try:
             if text:
-                print(f"等待元素(文本): {text}")
-                return self.device(text=text).wait(timeout=timeout)
+                logger.info("等待元素(文本): %s", text)
+                return self._wait(self.device(text=text), timeout)
             elif resource_id:
-                print(f"等待元素(ID): {resource_id}")
-                return self.device(resourceId=resource_id).wait(timeout=timeout)
+                logger.info("等待元素(ID): %s", resource_id)
+                return self._wait(self.device(resourceId=resource_id), timeout)
             return False
         except Exception as e:
-            print(f"等待元素失败: {e}")
+            logger.warning("等待元素失败: %s", e)
             return False
 
-    def input_text(self, text: str, clear: bool = True):
+    @instrumented()
+    def input_text(self, text: str, clear: bool = True, verify: bool = True) -> dict:
         """
         输入文字（需要先点击输入框）
 
+        按设备选择最快的输入方式（直接设置 / 剪贴板粘贴 / 输入法广播 / send_keys，见 text_input.py），
+        输入后读取输入框校验，校验通过即返回，不再固定等待
+
         Args:
             text: 要输入的文本
             clear: 是否先清空输入框
-        """
-        print(f"输入文字: {text}")
-        if clear:
-            self.device.clear_text()
-        self.device.send_keys(text)
-        time.sleep(0.5)
+            verify: 是否校验输入框内容（不校验时输入后等待 0.5 秒）
 
+        Returns:
+            {"method": 输入方式, "verified": 是否校验通过, "duration": 耗时, "attempts": 尝试过的方式}
+        """
+        logger.info("输入文字: %s", text if len(text) <= 50 else f"{text[:50]}...（共 {len(text)} 字）")
+        result = text_input.engine_for(self.device_key).input(self.device, text, clear, verify)
+        if len(result["attempts"]) > 1:
+            instrumentation.record_retry(len(result["attempts"]) - 1)  # 换了输入方式
+        if not verify:
+            self._pause(0.5)
+        elif not result["verified"]:
+            logger.warning("⚠️  输入文字后校验失败（尝试了 %s）", ", ".join(result["attempts"]))
+        return result
+
+    @instrumented()
     def press_back(self):
         """按返回键"""
-        print("按返回键")
+        logger.info("按返回键")
         self.device.press("back")
-        time.sleep(0.5)
+        self._pause(0.5)
 
+    @instrumented()
     def press_home(self):
         """按 Home 键"""
-        print("按 Home 键")
+        logger.info("按 Home 键")
         self.device.press("home")
-        time.sleep(0.5)
+        self._pause(0.5)
 
+    @instrumented()
     def take_screenshot(self, filename: Optional[str] = None) -> str:
         """
         截图
@@ -198,10 +460,85 @@ class Actions:
         """
         if not filename:
             filename = f"screenshot_{int(time.time())}.png"
-        print(f"截图: {filename}")
+        logger.info("截图: %s", filename)
         self.device.screenshot(filename)
         return filename
 
+    @instrumented()
+    def grab(self, region: Optional[Tuple[float, float, float, float]] = None):
+        """
+        快速截图：读取原始像素（不经过 PNG 编解码），用于高频的画面检查和模板匹配
+
+        Args:
+            region: 只返回该区域，(左, 上, 右, 下) 为屏幕宽高的比例
+
+        Returns:
+            高 x 宽 x 4 的 RGBA numpy 数组（复用的缓冲区上的视图，下次 grab 会被覆盖，需要保留时请 copy()）
+        """
+        if self._screencap is None:
+            self._screencap = framebuffer.RawScreencap(self._device)
+        return self._screencap.capture(region)
+
+    @instrumented()
+    def capture(
+        self,
+        scale: float = 0.5,
+        region: Optional[Tuple[float, float, float, float]] = None,
+        format: str = "jpeg",
+        quality: int = 70,
+        filename: Optional[str] = None,
+        label: str = "capture",
+    ):
+        """
+        截图到内存（裁剪、缩放后返回，同时放入设备的帧缓冲区，不写磁盘）
+
+        Args:
+            scale: 缩放比例（1 为原始分辨率）
+            region: 裁剪区域，(左, 上, 右, 下) 为屏幕宽高的比例
+            format: 返回格式：jpeg（JPEG 字节）/ array（RGB numpy 数组）/ pillow（PIL 图像）
+            quality: JPEG 质量
+            filename: 同时保存到文件（不指定时不写磁盘）
+            label: 帧缓冲区中的标签
+
+        Returns:
+            对应格式的截图
+        """
+        if format not in ("jpeg", "array", "pillow"):
+            raise ValueError(f"不支持的截图格式: {format}（可选: jpeg / array / pillow）")
+        image = frames.process(self.device.screenshot(format="pillow"), scale, region)
+        # 缓冲区中的帧不超过 BUFFER_SCALE（已经缩得更小时不再缩放）
+        frames.buffer_for(self.device_key).add(image, label, scale=min(1.0, frames.BUFFER_SCALE / scale))
+        if filename:
+            logger.info("截图: %s", filename)
+            image.save(filename)
+        if format == "jpeg":
+            return frames.encode_jpeg(image, quality)
+        if format == "array":
+            return frames.to_array(image)
+        return image
+
+    @instrumented()
+    def capture_failure(self, result: dict, since: Optional[float] = None) -> dict:
+        """
+        工作流失败时截取当前画面，并把执行期间缓冲的帧附加到结果的 frames 字段
+
+        Args:
+            result: 工作流结果（成功时原样返回）
+            since: 工作流开始时间（time.time()），只附带之后的帧
+
+        Returns:
+            结果字典
+        """
+        if result.get("success") or frames.FAILURE_FRAMES <= 0:
+            return result
+        try:
+            self.capture(format="pillow", label="failure")
+        except Exception as e:
+            logger.warning("失败现场截图失败: %s", e)
+        result["frames"] = frames.buffer_for(self.device_key).export(since, frames.FAILURE_FRAMES)
+        return result
+
+    @instrumented(locator=_locator, false_is_failure=False)
     def element_exists(self, text: Optional[str] = None, resource_id: Optional[str] = None) -> bool:
         """
         检查元素是否存在
@@ -222,6 +559,7 @@ class Actions:
         except:
             return False
 
+    @instrumented()
     def get_screen_size(self) -> Tuple[int, int]:
         """
         获取屏幕尺寸
@@ -232,6 +570,7 @@ class Actions:
         info = self.device.info
         return info["displayWidth"], info["displayHeight"]
 
+    @instrumented()
     def sleep(self, seconds: float):
         """
         等待指定时间
@@ -239,5 +578,82 @@ class Actions:
         Args:
             seconds: 等待秒数
         """
-        print(f"等待 {seconds} 秒")
+        logger.debug("等待 %s 秒", seconds)
+        self._pause(seconds)
+
+    @instrumented(kind="sleep", name="sleep")
+    def _pause(self, seconds: float):
+        """
+        等待界面响应（各操作之后的固定等待都经过这里，便于基准测试统计）
+
+        Args:
+            seconds: 等待秒数
+        """
         time.sleep(seconds)
+
+    @instrumented()
+    def wait_idle(
+        self,
+        timeout: float = 5.0,
+        interval: float = 0.2,
+        stable: int = 3,
+        method: str = "hierarchy",
+        region: Optional[Tuple[float, float, float, float]] = None,
+        tolerance: float = 0,
+    ) -> dict:
+        """
+        等待界面稳定（动画、页面切换结束），代替操作之后的固定等待
+
+        每隔 interval 秒取样一次，与上一次取样比较，连续 stable 次没有变化即认为界面已稳定：
+            hierarchy  导出界面结构，比较节点（类名、resource-id、文本、位置）集合，变化的节点数不超过 tolerance
+            frame      原始截图（见 grab），比较像素差异，差异不超过 tolerance（0 ~ 1，建议 0.005 左右）
+        带相机预览等持续变化画面的页面请用 hierarchy。点击后页面可能还没开始切换，
+        interval * stable 应大于页面开始响应的时间（默认 0.6 秒）。
+
+        Args:
+            timeout: 最长等待时间（秒），超时后直接返回
+            interval: 取样间隔（秒）
+            stable: 需要连续稳定的次数
+            method: 取样方式：hierarchy / frame
+            region: frame 方式只比较该区域，(左, 上, 右, 下) 为屏幕宽高的比例
+            tolerance: 允许的变化量（见上）
+
+        Returns:
+            {"idle": 是否稳定, "settle": 界面最后一次变化距开始的秒数, "elapsed": 总耗时, "samples": 取样次数}
+        """
+        if method not in ("hierarchy", "frame"):
+            raise ValueError(f"不支持的取样方式: {method}（可选: hierarchy / frame）")
+
+        start = time.monotonic()
+        previous = None
+        settle = 0.0
+        unchanged = 0
+        samples = 0
+        while True:
+            sample_time = time.monotonic()
+            if method == "hierarchy":
+                current = _hierarchy_nodes(self.device.dump_hierarchy(compressed=True))
+            else:
+                current = self.grab(region).copy()  # grab 返回复用缓冲区上的视图
+            samples += 1
+
+            if previous is not None:
+                if method == "hierarchy":
+                    changed = len(previous ^ current)
+                else:
+                    changed = framebuffer.difference(previous, current)
+                if changed <= tolerance:
+                    unchanged += 1
+                else:
+                    unchanged = 0
+                    settle = sample_time - start
+            previous = current
+
+            elapsed = time.monotonic() - start
+            if unchanged >= stable:
+                logger.debug("界面已稳定: %.2f 秒（取样 %s 次）", settle, samples)
+                return {"idle": True, "settle": round(settle, 3), "elapsed": round(elapsed, 3), "samples": samples}
+            if elapsed >= timeout:
+                logger.warning("⚠️  等待界面稳定超时: %s 秒（取样 %s 次）", timeout, samples)
+                return {"idle": False, "settle": round(elapsed, 3), "elapsed": round(elapsed, 3), "samples": samples}
+            self._pause(max(0.0, min(interval - (time.monotonic() - sample_time), timeout - elapsed)))
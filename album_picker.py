@@ -0,0 +1,287 @@
+"""相册选择 - 从相册选择器的图片网格中选择第 N 张图片
+
+以前各工作流按固定的屏幕比例计算图片位置（3 列、每行 1/6 屏高），第一屏之外的图片会点错位置。
+这里从界面结构中读取一次网格布局，之后任意序号的位置都可以直接算出：
+
+    列数      第一行完整单元格的不同左边界个数
+    单元格    完整单元格的宽高，以及相邻行、列之间的间距（含分隔）
+    起点      第一张图片（未滚动时）的左上角
+
+布局按设备和选择器的包名缓存（如 com.google.android.documentsui），同一台设备再次打开相册时不再读取。
+目标图片不在可见区域时用慢速滑动（松手前停住，不会惯性滑动）滚动网格，滑动后按图片的描述对比滑动前后的位置，
+得到实际滚动的距离（滑动开始时的 touch slop 会少滚一点），直到目标完整可见后点击。
+
+使用方法：
+    if not album_picker.pick(actions, image_index):
+        return {"success": False, "error": f"相册中没有第 {image_index} 张图片"}
+
+假设相册刚打开（网格在顶部），网格中的每个子元素是一张图片（不支持带日期分组标题的网格）。
+"""
+import logging
+import re
+import threading
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 已知相册选择器的网格 resource-id（包名 -> resource-id），其他选择器取子元素最多的网格或可滚动列表
+GRIDS = {
+    "com.google.android.documentsui": "com.google.android.documentsui:id/dir_list",
+    "com.android.documentsui": "com.android.documentsui:id/dir_list",
+}
+
+GRID_CLASSES = (
+    "android.widget.GridView",
+    "androidx.recyclerview.widget.RecyclerView",
+    "android.support.v7.widget.RecyclerView",
+)
+
+# 单元格尺寸和位置比较的容差（像素）
+TOLERANCE = 3
+
+# 每次滑动最多滚动网格高度的比例
+MAX_SWIPE = 0.7
+
+# 最短滑动距离（像素），太短的滑动会被 touch slop 完全吃掉
+MIN_SWIPE = 48
+
+# 滑动时间（秒）和最多滑动次数
+SWIPE_DURATION = 0.6
+MAX_SWIPES = 20
+
+_BOUNDS = re.compile(r"\[(-?\d+),(-?\d+)\]\[(-?\d+),(-?\d+)\]")
+
+Bounds = Tuple[int, int, int, int]
+
+
+def _bounds(node: ET.Element) -> Optional[Bounds]:
+    match = _BOUNDS.match(node.get("bounds") or "")
+    return tuple(map(int, match.groups())) if match else None
+
+
+def _distinct(values: List[int]) -> List[int]:
+    """去掉相差不超过 TOLERANCE 的重复值，升序返回"""
+    result: List[int] = []
+    for value in sorted(values):
+        if not result or value - result[-1] > TOLERANCE:
+            result.append(value)
+    return result
+
+
+def _signature(node: ET.Element) -> str:
+    """单元格的标识（自身及子孙元素的描述和文本），用于对比滑动前后的位置"""
+    parts = [f"{n.get('content-desc') or ''}|{n.get('text') or ''}" for n in node.iter("node")]
+    return "/".join(parts) if any(part != "|" for part in parts) else ""
+
+
+def find_grid(root: ET.Element, package: Optional[str] = None) -> Optional[ET.Element]:
+    """在界面结构中找到图片网格"""
+    resource_id = GRIDS.get(package or "")
+    candidates = []
+    for node in root.iter("node"):
+        if resource_id and node.get("resource-id") == resource_id:
+            return node
+        if node.get("class") in GRID_CLASSES or node.get("scrollable") == "true":
+            children = [child for child in node.findall("node") if _bounds(child)]
+            if len(children) >= 2:
+                candidates.append((len(children), node))
+    return max(candidates, key=lambda item: item[0])[1] if candidates else None
+
+
+def _cells(grid: ET.Element) -> List[Tuple[ET.Element, Bounds]]:
+    """网格的子元素及其位置（去掉宽或高为 0 的）"""
+    cells = []
+    for child in grid.findall("node"):
+        bounds = _bounds(child)
+        if bounds and bounds[2] > bounds[0] and bounds[3] > bounds[1]:
+            cells.append((child, bounds))
+    return cells
+
+
+def read_layout(xml: str, package: Optional[str] = None) -> Optional[dict]:
+    """
+    从界面结构中读取网格布局（相册刚打开、网格在顶部时）
+
+    Args:
+        xml: dump_hierarchy 返回的 XML
+        package: 相册选择器的包名
+
+    Returns:
+        {"grid": 网格位置, "columns": 列数, "cell": (宽, 高), "pitch": (列间距, 行间距), "origin": (左, 上)}，
+        找不到网格时返回 None
+    """
+    grid = find_grid(ET.fromstring(xml), package)
+    if grid is None:
+        return None
+    cells = _cells(grid)
+    if not cells:
+        return None
+
+    width = max(bounds[2] - bounds[0] for _, bounds in cells)
+    height = max(bounds[3] - bounds[1] for _, bounds in cells)
+    full = [bounds for _, bounds in cells
+            if width - (bounds[2] - bounds[0]) <= TOLERANCE and height - (bounds[3] - bounds[1]) <= TOLERANCE]
+    lefts = _distinct([bounds[0] for bounds in full])
+    tops = _distinct([bounds[1] for bounds in full])
+    pitch_x = lefts[1] - lefts[0] if len(lefts) > 1 else width
+    pitch_y = tops[1] - tops[0] if len(tops) > 1 else height
+
+    # 第一个子元素是第一张图片；被网格上边缘截断时按下边缘推算
+    first = cells[0][1]
+    origin_top = first[1] if first[3] - first[1] >= height - TOLERANCE else first[3] - height
+    return {
+        "grid": _bounds(grid),
+        "columns": len(lefts),
+        "cell": (width, height),
+        "pitch": (pitch_x, pitch_y),
+        "origin": (lefts[0], origin_top),
+    }
+
+
+def position(layout: dict, index: int, scrolled: int = 0) -> Bounds:
+    """第 index 张图片的位置（网格已向上滚动 scrolled 像素）"""
+    row, col = divmod(index, layout["columns"])
+    left = layout["origin"][0] + col * layout["pitch"][0]
+    top = layout["origin"][1] + row * layout["pitch"][1] - scrolled
+    return left, top, left + layout["cell"][0], top + layout["cell"][1]
+
+
+_layouts: Dict[Tuple[object, str], dict] = {}
+_layouts_lock = threading.Lock()
+
+
+def _key(actions, package: str) -> Tuple[object, str]:
+    return actions.device_key, package
+
+
+def invalidate(actions, package: Optional[str] = None):
+    """清除设备的布局缓存（package 为 None 时清除所有选择器）"""
+    device_key = actions.device_key
+    with _layouts_lock:
+        for key in [key for key in _layouts if key[0] == device_key and package in (None, key[1])]:
+            del _layouts[key]
+
+
+def layout_for(actions) -> Optional[dict]:
+    """当前相册选择器的网格布局（按设备和包名缓存，第一次时从界面结构读取）"""
+    package = actions.device.app_current()["package"]
+    key = _key(actions, package)
+    with _layouts_lock:
+        layout = _layouts.get(key)
+    if layout is None:
+        layout = read_layout(actions.device.dump_hierarchy(), package)
+        if layout is None:
+            logger.warning("  ✗ 未找到相册网格: %s", package)
+            return None
+        layout["package"] = package
+        logger.info("  相册网格: %s 列，单元格 %sx%s，间距 %s", layout["columns"], *layout["cell"], layout["pitch"])
+        with _layouts_lock:
+            _layouts[key] = layout
+    return layout
+
+
+def _anchors(xml: str, package: str) -> Dict[str, int]:
+    """网格中完整可见的单元格：标识 -> 上边缘"""
+    grid = find_grid(ET.fromstring(xml), package)
+    if grid is None:
+        return {}
+    cells = _cells(grid)
+    height = max((bounds[3] - bounds[1] for _, bounds in cells), default=0)
+    anchors = {}
+    for node, bounds in cells:
+        signature = _signature(node)
+        if signature and bounds[3] - bounds[1] >= height - TOLERANCE:
+            anchors[signature] = bounds[1]
+    return anchors
+
+
+def _swipe(actions, layout: dict, distance: int):
+    """在网格中间向上滑动 distance 像素（负数向下），松手前停住"""
+    left, top, right, bottom = layout["grid"]
+    x = (left + right) // 2
+    start = (top + bottom) // 2 + distance // 2
+    end = start - distance
+    device = actions.device
+    if hasattr(device, "swipe_points"):
+        device.swipe_points([(x, start), (x, end), (x, end)], SWIPE_DURATION)
+    else:
+        device.swipe(x, start, x, end, duration=SWIPE_DURATION)
+
+
+def _scroll_into_view(actions, layout: dict, index: int) -> Tuple[Optional[int], Optional[str]]:
+    """
+    滚动网格直到第 index 张图片完整可见
+
+    Returns:
+        (滚动的距离（滚不到时为 None）, 最后一次滑动后导出的界面结构（没有滑动时为 None）)
+    """
+    grid_top, grid_bottom = layout["grid"][1], layout["grid"][3]
+    margin = max(0, layout["pitch"][1] - layout["cell"][1]) + TOLERANCE
+    max_step = int((grid_bottom - grid_top) * MAX_SWIPE)
+    scrolled = 0
+    slop = 0  # 上一次滑动少滚动的距离（touch slop），下一次滑动时补上
+    before = xml = None
+    for _ in range(MAX_SWIPES):
+        _, top, _, bottom = position(layout, index, scrolled)
+        if top >= grid_top - TOLERANCE and bottom <= grid_bottom + TOLERANCE:
+            return scrolled, xml
+        distance = bottom - grid_bottom + margin if bottom > grid_bottom else top - grid_top - margin
+        direction = 1 if distance > 0 else -1
+        distance = direction * min(max_step, max(MIN_SWIPE, abs(distance) + slop))
+
+        if before is None:
+            before = _anchors(actions.device.dump_hierarchy(), layout["package"])
+        _swipe(actions, layout, distance)
+        xml = actions.device.dump_hierarchy()
+        after = _anchors(xml, layout["package"])
+
+        shifts = sorted(before[key] - after[key] for key in before.keys() & after.keys())
+        shift = shifts[len(shifts) // 2] if shifts else distance  # 没有可对比的单元格时按滑动距离估算
+        logger.debug("  滑动 %s 像素，实际滚动 %s 像素", distance, shift)
+        if abs(shift) <= TOLERANCE:
+            logger.warning("  ✗ 网格已滚动到%s，没有第 %s 张图片", "底" if direction > 0 else "顶", index)
+            return None, xml
+        if abs(distance) < max_step:
+            slop = max(0, abs(distance) - abs(shift))
+        scrolled += shift
+        before = after
+    logger.warning("  ✗ 滑动 %s 次仍未找到第 %s 张图片", MAX_SWIPES, index)
+    return None, xml
+
+
+def _has_cell(xml: str, package: str, bounds: Bounds) -> bool:
+    """界面结构中计算出的位置上是否有图片（图片数少于序号时，位置可能落在网格的空白处）"""
+    grid = find_grid(ET.fromstring(xml), package)
+    if grid is None:
+        return False
+    x, y = (bounds[0] + bounds[2]) // 2, (bounds[1] + bounds[3]) // 2
+    return any(left <= x <= right and top <= y <= bottom for _, (left, top, right, bottom) in _cells(grid))
+
+
+def pick(actions, index: int, layout: Optional[dict] = None) -> bool:
+    """
+    点击相册中的第 index 张图片（从 0 开始）
+
+    Args:
+        actions: 操作对象（相册选择器已打开）
+        index: 图片序号
+        layout: 已经取得的网格布局（见 layout_for），不传时自动获取
+
+    Returns:
+        是否点击（相册中没有第 index 张图片时返回 False）
+    """
+    layout = layout or layout_for(actions)
+    if layout is None:
+        return False
+    scrolled, xml = _scroll_into_view(actions, layout, index)
+    if scrolled is None:
+        return False
+    left, top, right, bottom = position(layout, index, scrolled)
+    row, col = divmod(index, layout["columns"])
+    if not _has_cell(xml or actions.device.dump_hierarchy(), layout["package"], (left, top, right, bottom)):
+        logger.warning("  ✗ 第 %s 行第 %s 列没有图片，相册中没有第 %s 张图片", row + 1, col + 1, index)
+        return False
+    logger.info("  第 %s 张图片: 第 %s 行第 %s 列", index, row + 1, col + 1)
+    actions.click_coordinate((left + right) // 2, (top + bottom) // 2)
+    return True
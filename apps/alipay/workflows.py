@@ -1,7 +1,12 @@
 """支付宝工作流定义"""
+import logging
+import album_picker
+import calibration
 from actions import Actions
 from .config import PACKAGE_NAME, TEXTS
 
+logger = logging.getLogger(__name__)
+
 
 def scan_from_album(actions: Actions, image_index: int = 0) -> dict:
     """
@@ -15,9 +20,7 @@ def scan_from_album(actions: Actions, image_index: int = 0) -> dict:
         执行结果字典
     """
     try:
-        print("=" * 50)
-        print("开始执行支付宝扫码工作流")
-        print("=" * 50)
+        logger.info("开始执行支付宝扫码工作流")
 
         # 1. 启动支付宝
         actions.launch_app(PACKAGE_NAME, wait_time=3)
@@ -30,24 +33,30 @@ def scan_from_album(actions: Actions, image_index: int = 0) -> dict:
         actions.sleep(2)
 
         # 3. 点击相册
-        if not actions.click_by_text(TEXTS["album"], timeout=3):
-            # 如果没有文字按钮，可能需要使用坐标点击
+        if actions.click_by_text(TEXTS["album"], timeout=3):
+            actions.sleep(2)
+        else:
+            # 如果没有文字按钮，使用坐标点击：点击相册、等待相册打开在一次设备调用中完成
+            # 优先使用校准过的坐标，该机型没有校准时按比例估算右上角区域
+            point = calibration.point(actions, "alipay", "album")
+            if point is None:
+                width, height = actions.get_screen_size()
+                point = int(width * 0.9), int(height * 0.1)
+            actions.macro().tap(*point).sleep(2).run()
+
+        # 4. 选择图片（按网格布局计算位置，必要时滚动，见 album_picker.py）
+        # 找不到网格（不认识的相册选择器）时退回坐标点击，只适用于第一屏的图片
+        layout = album_picker.layout_for(actions)
+        if layout is not None:
+            if not album_picker.pick(actions, image_index, layout):
+                return {"success": False, "error": f"相册中没有第 {image_index} 张图片"}
+        else:
             width, height = actions.get_screen_size()
-            actions.click_coordinate(int(width * 0.9), int(height * 0.1))
-
-        actions.sleep(2)
-
-        # 4. 选择图片
-        width, height = actions.get_screen_size()
-        x = int(width / 6)
-        y = int(height / 4) + image_index * int(height / 6)
-        actions.click_coordinate(x, y)
+            actions.click_coordinate(int(width / 6), int(height / 4) + image_index * int(height / 6))
 
         actions.sleep(3)
 
-        print("=" * 50)
-        print("支付宝扫码工作流执行完成")
-        print("=" * 50)
+        logger.info("支付宝扫码工作流执行完成")
 
         return {
             "success": True,
@@ -64,3 +73,14 @@ def scan_from_album(actions: Actions, image_index: int = 0) -> dict:
 WORKFLOWS = {
     "scan_from_album": scan_from_album,
 }
+
+
+def _goto_scan_page(actions: Actions) -> bool:
+    actions.launch_app(PACKAGE_NAME, wait_time=3)
+    return actions.click_by_text(TEXTS["scan"], timeout=5)
+
+
+# 坐标校准时进入各页面的导航（见 calibration.py 和 config.py 的 CALIBRATION）
+CALIBRATION_PAGES = {
+    "scan": _goto_scan_page,
+}
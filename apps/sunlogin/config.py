@@ -20,11 +20,30 @@ RESOURCE_IDS = {
     "scan_view": "com.oray.sunlogin:id/scan_view",  # 扫码页面的视图
     # 相册相关
     "album_button": "com.oray.sunlogin:id/iv_scan_pic",  # 从相册选择图片的按钮
-    "album_grid": "com.google.android.documentsui:id/dir_list",  # 相册的 GridView
+    "album_grid": "com.google.android.documentsui:id/dir_list",  # 相册的 GridView（album_picker.py 按包名识别）
 }
 
-# 扫码按钮坐标（备用方案：如果没有 resource-id，使用坐标点击）
-# 不同分辨率的设备坐标可能不同，需要根据实际情况调整
+# 页面特征元素（出现任意一个即认为在该页面，见 pages.py）
+PAGES = {
+    "my": {"texts": ["我的福利", "我的订单", "阳光小店"]},  # "我的"页面
+    "device": {"texts": ["开机设备", "排序"]},  # "设备"页面
+    "scan": {"ids": ["com.oray.sunlogin:id/scan_view"]},  # 扫码页面
+}
+
+# 坐标校准目标（见 calibration.py）：在每种机型上运行一次 `python calibration.py run sunlogin`，
+# 记录扫码按钮的真实位置，运行时优先于下面的比例坐标
+# 扫码按钮没有文本和 ID，按左上角区域内唯一的 ImageView 查找；区域内还有头像、logo 等 ImageView 时
+# 校准会报告多个元素符合条件而不记录，需要从 uiautodev 取得扫码按钮的 content-desc 填入 description
+CALIBRATION = {
+    "scan_button": {
+        "page": "my",
+        "class": "android.widget.ImageView",
+        "region": (0, 0, 0.3, 0.2),  # "我的"页面左上角
+    },
+}
+
+# 扫码按钮坐标（备用方案：如果没有 resource-id 也没有校准，使用比例坐标点击）
+# 不同分辨率的设备坐标可能不同，刘海屏、长屏手机上可能点偏，建议先校准
 SCAN_BUTTON_POSITION = {
     "ratio_x": 0.1,  # 屏幕宽度的 10% 位置
     "ratio_y": 0.08,  # 屏幕高度的 8% 位置
@@ -1,84 +1,76 @@
 """向日葵的可复用步骤（Steps）"""
+import logging
+import album_picker
+import calibration
+import log
 from actions import Actions
+from pages import PageClassifier
 from .config import PACKAGE_NAME, TEXTS, RESOURCE_IDS, SCAN_BUTTON_POSITION
 
+logger = logging.getLogger(__name__)
+
 
 # ==================== 页面判断 ====================
 
-def is_on_my_page(actions: Actions) -> bool:
-    """检查是否在"我的"页面
+def current_page(actions: Actions):
+    """识别当前页面（my / device / scan，无法识别时为 None）
 
-    通过查找"我的"页面特有的元素来判断
-    根据截图，可以查找：用户名、福利、订单、兑换等元素
+    只导出一次界面结构，按 config.py 的 PAGES 和 pages.json 页面库比对（见 pages.py）
     """
-    # 方法1：检查是否有"我的福利"、"我的订单"等文本
-    if actions.element_exists(text="我的福利"):
-        return True
-    if actions.element_exists(text="我的订单"):
-        return True
-    if actions.element_exists(text="阳光小店"):
-        return True
+    return PageClassifier.for_app("sunlogin").classify(actions)
 
-    # 方法2：检查是否有用户名显示
-    # 如果有其他特征元素，可以继续添加
 
-    return False
+def is_on_my_page(actions: Actions) -> bool:
+    """检查是否在"我的"页面
+
+    "我的"页面特有的元素：我的福利、我的订单、阳光小店（见 config.py 的 PAGES）
+    """
+    return current_page(actions) == "my"
 
 
 def is_on_device_page(actions: Actions) -> bool:
     """检查是否在"设备"页面
 
-    通过查找"设备"页面特有的元素来判断
-    根据截图，可以查找：开机设备、设备列表等元素
+    "设备"页面特有的元素：开机设备、右上角的排序按钮（见 config.py 的 PAGES）
     """
-    # 检查是否有"开机设备"文本
-    if actions.element_exists(text="开机设备"):
-        return True
-
-    # 检查是否有"排序"按钮（设备页面右上角）
-    if actions.element_exists(text="排序"):
-        return True
-
-    return False
+    return current_page(actions) == "device"
 
 
+@log.step
 def ensure_on_my_page(actions: Actions) -> bool:
     """确保当前在"我的"页面，如果不在则切换过去"""
-    print("→ 检查并确保在'我的'页面")
+    logger.info("→ 检查并确保在'我的'页面")
 
     if is_on_my_page(actions):
-        print("  ✓ 已在'我的'页面")
+        logger.info("  ✓ 已在'我的'页面")
         return True
 
-    print("  当前不在'我的'页面，切换中...")
+    logger.info("  当前不在'我的'页面，切换中...")
     return goto_my_tab(actions)
 
 
+@log.step
 def ensure_on_device_page(actions: Actions) -> bool:
     """确保当前在"设备"页面，如果不在则切换过去"""
-    print("→ 检查并确保在'设备'页面")
+    logger.info("→ 检查并确保在'设备'页面")
 
     if is_on_device_page(actions):
-        print("  ✓ 已在'设备'页面")
+        logger.info("  ✓ 已在'设备'页面")
         return True
 
-    print("  当前不在'设备'页面，切换中...")
+    logger.info("  当前不在'设备'页面，切换中...")
     return goto_device_tab(actions)
 
 
 def is_on_scan_page(actions: Actions) -> bool:
     """检查是否在扫码页面
 
-    通过查找扫码页面特有的元素来判断
-    使用 resource-id: com.oray.sunlogin:id/scan_view
+    扫码页面特有的元素：resource-id com.oray.sunlogin:id/scan_view（见 config.py 的 PAGES）
     """
-    # 通过 resource-id 判断（最可靠的方式）
-    if actions.element_exists(resource_id="com.oray.sunlogin:id/scan_view"):
-        return True
-
-    return False
+    return current_page(actions) == "scan"
 
 
+@log.step
 def wait_for_scan_page(actions: Actions, timeout: float = 5.0) -> bool:
     """等待扫码页面加载
 
@@ -88,169 +80,162 @@ def wait_for_scan_page(actions: Actions, timeout: float = 5.0) -> bool:
     Returns:
         是否成功进入扫码页面
     """
-    print(f"→ 等待扫码页面加载（最多 {timeout} 秒）")
+    logger.info("→ 等待扫码页面加载（最多 %s 秒）", timeout)
 
     if actions.wait_for_element(resource_id="com.oray.sunlogin:id/scan_view", timeout=timeout):
-        print("  ✓ 扫码页面已加载")
+        logger.info("  ✓ 扫码页面已加载")
         return True
     else:
-        print("  ✗ 扫码页面加载超时")
+        logger.warning("  ✗ 扫码页面加载超时")
         return False
 
 
 # ==================== 基础操作 ====================
 
+@log.step
 def open_app(actions: Actions) -> bool:
     """步骤：启动向日葵应用"""
-    print("→ 启动向日葵应用")
+    logger.info("→ 启动向日葵应用")
     actions.launch_app(PACKAGE_NAME, wait_time=3)
     return True
 
 
+@log.step
 def goto_my_tab(actions: Actions) -> bool:
     """步骤：点击底部"我的"标签
 
     优先使用 resource-id，如果失败则使用文本定位
     """
-    print("→ 点击底部'我的'标签")
+    logger.info("→ 点击底部'我的'标签")
 
     # 方法1：优先使用 resource-id（更可靠，更快）
     if RESOURCE_IDS["my_tab_button"]:
-        print(f"  使用 resource-id: {RESOURCE_IDS['my_tab_button']}")
+        logger.info("  使用 resource-id: %s", RESOURCE_IDS["my_tab_button"])
         if actions.click_by_id(RESOURCE_IDS["my_tab_button"], timeout=5):
             actions.sleep(1)
             return True
         else:
-            print("  ✗ 通过 resource-id 点击失败，尝试文本点击")
+            logger.warning("  ✗ 通过 resource-id 点击失败，尝试文本点击")
 
     # 方法2：备用方案 - 使用文本点击
-    print(f"  使用文本点击: {TEXTS['my_tab']}")
+    logger.info("  使用文本点击: %s", TEXTS["my_tab"])
     if not actions.click_by_text(TEXTS["my_tab"], timeout=5):
-        print(f"  ✗ 未找到'{TEXTS['my_tab']}'标签")
+        logger.warning("  ✗ 未找到'%s'标签", TEXTS["my_tab"])
         return False
 
     actions.sleep(1)
     return True
 
 
+@log.step
 def goto_device_tab(actions: Actions) -> bool:
     """步骤：点击底部"设备"标签
 
     优先使用 resource-id，如果失败则使用文本定位
     """
-    print("→ 点击底部'设备'标签")
+    logger.info("→ 点击底部'设备'标签")
 
     # 方法1：优先使用 resource-id（更可靠，更快）
     if RESOURCE_IDS["device_tab_button"]:
-        print(f"  使用 resource-id: {RESOURCE_IDS['device_tab_button']}")
+        logger.info("  使用 resource-id: %s", RESOURCE_IDS["device_tab_button"])
         if actions.click_by_id(RESOURCE_IDS["device_tab_button"], timeout=5):
             actions.sleep(1)
             return True
         else:
-            print("  ✗ 通过 resource-id 点击失败，尝试文本点击")
+            logger.warning("  ✗ 通过 resource-id 点击失败，尝试文本点击")
 
     # 方法2：备用方案 - 使用文本点击
-    print(f"  使用文本点击: {TEXTS['device_tab']}")
+    logger.info("  使用文本点击: %s", TEXTS["device_tab"])
     if not actions.click_by_text(TEXTS["device_tab"], timeout=5):
-        print(f"  ✗ 未找到'{TEXTS['device_tab']}'标签")
+        logger.warning("  ✗ 未找到'%s'标签", TEXTS["device_tab"])
         return False
 
     actions.sleep(1)
     return True
 
 
+@log.step
 def click_scan_button(actions: Actions) -> bool:
     """步骤：点击左上角扫码按钮
 
-    优先使用 resource-id 点击，如果没有配置则使用坐标点击
+    优先使用 resource-id 点击，如果没有配置则使用坐标点击（校准过的坐标优先，见 calibration.py）
     """
-    print("→ 点击左上角扫码按钮")
+    logger.info("→ 点击左上角扫码按钮")
 
     # 方法1：优先使用 resource-id（更可靠）
     if RESOURCE_IDS["scan_button"]:
-        print(f"  使用 resource-id: {RESOURCE_IDS['scan_button']}")
+        logger.info("  使用 resource-id: %s", RESOURCE_IDS["scan_button"])
         if actions.click_by_id(RESOURCE_IDS["scan_button"], timeout=3):
-            actions.sleep(2)
+            actions.wait_idle(timeout=2)
             return True
         else:
-            print("  ✗ 通过 resource-id 点击失败，尝试坐标点击")
+            logger.warning("  ✗ 通过 resource-id 点击失败，尝试坐标点击")
 
-    # 方法2：备用方案 - 使用坐标点击
-    print("  使用坐标点击")
-    width, height = actions.get_screen_size()
-    scan_x = int(width * SCAN_BUTTON_POSITION["ratio_x"])
-    scan_y = int(height * SCAN_BUTTON_POSITION["ratio_y"])
-    print(f"  坐标: ({scan_x}, {scan_y})")
+    # 方法2：备用方案 - 使用坐标点击（该机型校准过时使用校准的坐标，否则按比例估算）
+    point = calibration.point(actions, "sunlogin", "scan_button")
+    if point:
+        scan_x, scan_y = point
+        logger.info("  使用校准坐标: (%s, %s)", scan_x, scan_y)
+    else:
+        width, height = actions.get_screen_size()
+        scan_x = int(width * SCAN_BUTTON_POSITION["ratio_x"])
+        scan_y = int(height * SCAN_BUTTON_POSITION["ratio_y"])
+        logger.info("  使用比例坐标: (%s, %s)", scan_x, scan_y)
     actions.click_coordinate(scan_x, scan_y)
-    actions.sleep(2)
+    actions.wait_idle(timeout=2)  # 扫码页面有相机预览，按界面结构判断
     return True
 
 
+@log.step
 def click_album(actions: Actions) -> bool:
     """步骤：点击相册按钮（从本地相册选择图片）
 
     使用 resource-id: com.oray.sunlogin:id/iv_scan_pic
     """
-    print("→ 点击相册按钮")
+    logger.info("→ 点击相册按钮")
 
     # 使用 resource-id 点击（最可靠）
     if RESOURCE_IDS["album_button"]:
-        print(f"  使用 resource-id: {RESOURCE_IDS['album_button']}")
+        logger.info("  使用 resource-id: %s", RESOURCE_IDS["album_button"])
         if actions.click_by_id(RESOURCE_IDS["album_button"], timeout=5):
             actions.sleep(1)
             return True
         else:
-            print("  ✗ 通过 resource-id 点击失败")
+            logger.warning("  ✗ 通过 resource-id 点击失败")
             return False
 
     # 备用方案：尝试文字点击
-    print("  尝试通过文字点击")
+    logger.info("  尝试通过文字点击")
     if actions.click_by_text("相册", timeout=3):
         actions.sleep(1)
         return True
 
-    print("  ✗ 未找到相册按钮")
+    logger.warning("  ✗ 未找到相册按钮")
     return False
 
 
+@log.step
 def select_image(actions: Actions, image_index: int = 0) -> bool:
     """步骤：从相册选择图片
 
-    通过定位 GridView 中的子元素来选择图片
-    GridView 中每个 LinearLayout 代表一张图片
+    从界面结构中读取相册网格的布局（列数、单元格大小，按设备缓存），计算图片位置，
+    不在第一屏的图片先滚动到可见区域（见 album_picker.py）
 
     Args:
         image_index: 图片索引（从 0 开始，0 是第一张图片）
     """
-    print(f"→ 选择第 {image_index} 张图片")
-
-    try:
-        # 方法1：尝试通过 GridView 的子元素点击
-        # 在 UIAutomator2 中，可以通过 child 方法访问子元素
-        grid_view = actions.device(resourceId=RESOURCE_IDS["album_grid"])
-
-        if grid_view.exists:
-            print(f"  找到 GridView，尝试点击第 {image_index} 个子元素")
-            # 点击 GridView 的第 image_index 个子元素
-            # UIAutomator2 的语法：child(instance=index)
-            child = actions.device(resourceId=RESOURCE_IDS["album_grid"]).child(
-                className="android.widget.LinearLayout",
-                instance=image_index
-            )
-
-            if child.exists:
-                print(f"  找到第 {image_index} 张图片，点击中...")
-                child.click()
-                actions.sleep(2)
-                return True
-            else:
-                print(f"  ✗ 第 {image_index} 张图片不存在，使用备用方案")
-
-    except Exception as e:
-        print(f"  通过 GridView 选择失败: {e}，使用坐标点击")
-
-    # 方法2：备用方案 - 使用坐标点击
-    print("  使用坐标点击（备用方案）")
+    logger.info("→ 选择第 %s 张图片", image_index)
+
+    # 方法1：按网格布局点击
+    layout = album_picker.layout_for(actions)
+    if layout is not None:
+        if not album_picker.pick(actions, image_index, layout):
+            return False
+        actions.sleep(2)
+        return True
+
+    # 方法2：备用方案 - 找不到网格时使用坐标点击（只适用于第一屏的图片）
+    logger.info("  使用坐标点击（备用方案）")
     width, height = actions.get_screen_size()
 
     # 根据截图，相册图片看起来是网格布局
@@ -270,7 +255,7 @@ def select_image(actions: Actions, image_index: int = 0) -> bool:
     x = start_x + col * spacing_x
     y = start_y + row * spacing_y
 
-    print(f"  坐标: ({x}, {y}) [第{row}行第{col}列]")
+    logger.info("  坐标: (%s, %s) [第%s行第%s列]", x, y, row, col)
     actions.click_coordinate(x, y)
     actions.sleep(2)
     return True
@@ -2,9 +2,12 @@
 
 完整的自动化流程：打开app → 切换到我的页面 → 点击扫码 → 选择相册 → 选择图片
 """
+import logging
 from actions import Actions
 from . import steps
 
+logger = logging.getLogger(__name__)
+
 
 def execute(actions: Actions, image_index: int = 0) -> dict:
     """向日葵完整工作流：从相册扫描二维码
@@ -23,9 +26,7 @@ def execute(actions: Actions, image_index: int = 0) -> dict:
         执行结果字典
     """
     try:
-        print("\n" + "=" * 60)
-        print("🚀 向日葵工作流：从相册扫描二维码")
-        print("=" * 60 + "\n")
+        logger.info("🚀 向日葵工作流：从相册扫描二维码")
 
         # 步骤 1: 启动应用
         if not steps.open_app(actions):
@@ -51,9 +52,7 @@ def execute(actions: Actions, image_index: int = 0) -> dict:
         if not steps.select_image(actions, image_index):
             return {"success": False, "error": f"选择第 {image_index} 张图片失败"}
 
-        print("\n" + "=" * 60)
-        print("✅ 工作流执行成功")
-        print("=" * 60 + "\n")
+        logger.info("✅ 工作流执行成功")
 
         return {
             "success": True,
@@ -70,3 +69,13 @@ def execute(actions: Actions, image_index: int = 0) -> dict:
 WORKFLOWS = {
     "execute": execute,
 }
+
+
+def _goto_my_page(actions: Actions) -> bool:
+    return steps.open_app(actions) and steps.ensure_on_my_page(actions)
+
+
+# 坐标校准时进入各页面的导航（见 calibration.py 和 config.py 的 CALIBRATION）
+CALIBRATION_PAGES = {
+    "my": _goto_my_page,
+}
@@ -15,3 +15,21 @@ TEXTS = {
 RESOURCE_IDS = {
     "search_box": "com.tencent.mm:id/f8y",
 }
+
+# 弹窗规则（见 watchers.py）：等待元素时自动关闭，文本需要根据实际弹窗调整
+WATCHERS = [
+    {"name": "更新提示", "text": "以后再说", "package": PACKAGE_NAME},
+    {"name": "更新提示", "text": "忽略本次更新", "package": PACKAGE_NAME},
+    {"name": "青少年模式", "text_contains": "青少年模式", "click": {"text": "我知道了"}, "package": PACKAGE_NAME},
+]
+
+
+# 坐标校准目标（见 calibration.py）：记录扫一扫页面相册图标的真实位置，"相册"文字按钮找不到时使用
+# 没有文字的版本中相册是图标，按图标的 content-desc 查找（不能用工作流刚找不到的文字）
+CALIBRATION = {
+    "album": {
+        "page": "scan",
+        "description": TEXTS["album"],
+        "region": (0.5, 0, 1, 0.3),  # 右上角
+    },
+}
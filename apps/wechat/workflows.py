@@ -1,7 +1,12 @@
 """微信工作流定义"""
+import logging
+import album_picker
+import calibration
 from actions import Actions
 from .config import PACKAGE_NAME, TEXTS
 
+logger = logging.getLogger(__name__)
+
 
 def scan_from_album(actions: Actions, image_index: int = 0) -> dict:
     """
@@ -15,9 +20,7 @@ def scan_from_album(actions: Actions, image_index: int = 0) -> dict:
         执行结果字典
     """
     try:
-        print("=" * 50)
-        print("开始执行微信扫码工作流")
-        print("=" * 50)
+        logger.info("开始执行微信扫码工作流")
 
         # 1. 启动微信
         actions.launch_app(PACKAGE_NAME, wait_time=3)
@@ -37,31 +40,33 @@ def scan_from_album(actions: Actions, image_index: int = 0) -> dict:
         # 4. 点击右上角相册图标或"相册"按钮
         # 注意：不同版本的微信界面可能不同，这里提供两种方式
         if not actions.click_by_text(TEXTS["album"], timeout=3):
-            # 如果没有文字按钮，尝试点击右上角区域（需要根据实际屏幕调整坐标）
-            width, height = actions.get_screen_size()
-            actions.click_coordinate(int(width * 0.9), int(height * 0.1))
+            # 如果没有文字按钮，点击校准过的坐标，该机型没有校准时按比例估算右上角区域
+            point = calibration.point(actions, "wechat", "album")
+            if point is None:
+                width, height = actions.get_screen_size()
+                point = int(width * 0.9), int(height * 0.1)
+            actions.click_coordinate(*point)
 
         actions.sleep(2)
 
-        # 5. 选择相册中的图片
-        # 这里使用坐标点击，实际使用时需要根据设备调整
-        # 通常第一张图在左上角
-        width, height = actions.get_screen_size()
-        # 假设图片网格布局，第一张图大概在 (width/6, height/4) 位置
-        x = int(width / 6)
-        y = int(height / 4) + image_index * int(height / 6)
-        actions.click_coordinate(x, y)
+        # 5. 选择相册中的图片（按网格布局计算位置，必要时滚动，见 album_picker.py）
+        # 找不到网格（不认识的相册选择器）时退回坐标点击，只适用于第一屏的图片
+        layout = album_picker.layout_for(actions)
+        if layout is not None:
+            if not album_picker.pick(actions, image_index, layout):
+                return {"success": False, "error": f"相册中没有第 {image_index} 张图片"}
+        else:
+            width, height = actions.get_screen_size()
+            actions.click_coordinate(int(width / 6), int(height / 4) + image_index * int(height / 6))
 
         actions.sleep(3)
 
         # 6. 等待扫码结果
         # 这里只是简单等待，实际项目中可能需要识别扫码结果
-        print("等待扫码结果...")
+        logger.info("等待扫码结果...")
         actions.sleep(2)
 
-        print("=" * 50)
-        print("微信扫码工作流执行完成")
-        print("=" * 50)
+        logger.info("微信扫码工作流执行完成")
 
         return {
             "success": True,
@@ -87,9 +92,7 @@ def send_message(actions: Actions, contact_name: str, message: str) -> dict:
         执行结果字典
     """
     try:
-        print("=" * 50)
-        print(f"开始执行微信发送消息工作流: 发送给 {contact_name}")
-        print("=" * 50)
+        logger.info("开始执行微信发送消息工作流: 发送给 %s", contact_name)
 
         # 1. 启动微信
         actions.launch_app(PACKAGE_NAME, wait_time=3)
@@ -122,9 +125,7 @@ def send_message(actions: Actions, contact_name: str, message: str) -> dict:
         if not actions.click_by_text(TEXTS["send"], timeout=3):
             return {"success": False, "error": "未找到发送按钮"}
 
-        print("=" * 50)
-        print("微信发送消息工作流执行完成")
-        print("=" * 50)
+        logger.info("微信发送消息工作流执行完成")
 
         return {
             "success": True,
@@ -142,3 +143,14 @@ WORKFLOWS = {
     "scan_from_album": scan_from_album,
     "send_message": send_message,
 }
+
+
+def _goto_scan_page(actions: Actions) -> bool:
+    actions.launch_app(PACKAGE_NAME, wait_time=3)
+    return actions.click_by_text(TEXTS["discover"], timeout=5) and actions.click_by_text(TEXTS["scan"], timeout=5)
+
+
+# 坐标校准时进入各页面的导航（见 calibration.py 和 config.py 的 CALIBRATION）
+CALIBRATION_PAGES = {
+    "scan": _goto_scan_page,
+}
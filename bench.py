@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""工作流基准测试 - 重复执行工作流并按阶段统计耗时
+
+每次执行的耗时按两个维度拆分：
+
+    阶段（phase）：
+        launch    启动应用（app_start 及启动后的等待）
+        navigate  页面切换（返回键、滑动）以及工作流自身在各操作之间的逻辑
+        locate    查找元素（wait / exists、获取屏幕尺寸）
+        click     点击和输入
+        settle    操作后等待界面响应的固定等待
+        result    最后一个操作之后到工作流返回（整理结果）
+
+    类型（kind）：
+        sleep     固定等待（time.sleep）
+        rpc       设备调用
+        python    其余时间（本地代码）
+
+输出每个阶段和类型的 p50/p95/p99（毫秒），并可保存为 JSON，用于不同版本之间对比。
+
+使用方法：
+    # 模拟设备（不需要手机），每个工作流执行 20 次
+    python bench.py --device fake --iterations 20 --json bench.json
+
+    # 真机，与上一个版本的结果对比
+    python bench.py --device u2 --iterations 10 --json new.json --compare old.json
+"""
+import argparse
+import importlib
+import json
+import platform
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import instrumentation
+import log
+from actions import Actions
+
+
+DEFAULT_WORKFLOWS = ["wechat.scan_from_album", "alipay.scan_from_album", "sunlogin.execute"]
+
+PHASES = ["launch", "navigate", "locate", "click", "settle", "result"]
+KINDS = ["sleep", "rpc", "python"]
+
+# Actions 方法所属的阶段（方法内除设备调用和固定等待以外的时间计入该阶段）
+# 计时基于埋点事件（instrumentation.py），不在表中的方法计入 navigate
+METHOD_PHASES = {
+    "launch_app": "launch",
+    "stop_app": "launch",
+    "click_by_text": "click",
+    "click_by_id": "click",
+    "click_coordinate": "click",
+    "click_by_image": "click",
+    "find_image": "locate",
+    "grab": "locate",
+    "input_text": "click",
+    "swipe": "navigate",
+    "press_back": "navigate",
+    "press_home": "navigate",
+    "wait_for_element": "locate",
+    "element_exists": "locate",
+    "get_screen_size": "locate",
+    "take_screenshot": "result",
+    "sleep": "settle",
+    "wait_idle": "settle",
+    "dismiss_popups": "navigate",
+    "run_macro": "click",
+}
+
+# 设备调用所属的阶段
+RPC_PHASES = {
+    "app_start": "launch",
+    "app_stop": "launch",
+    "wait": "locate",
+    "wait_gone": "locate",
+    "exists": "locate",
+    "count": "locate",
+    "info": "locate",
+    "window_size": "locate",
+    "click": "click",
+    "send_keys": "click",
+    "clear_text": "click",
+    "set_text": "click",
+    "set_clipboard": "click",
+    "swipe": "navigate",
+    "swipe_ext": "navigate",
+    "press": "navigate",
+    "screenshot": "result",
+    "screencap": "locate",
+    "shell": "click",
+    "dump_hierarchy": "result",
+}
+
+
+# ==================== 计时 ====================
+
+class StepTimer(instrumentation.Handler):
+    """埋点处理器：记录一次工作流执行中各阶段、各类型的耗时"""
+
+    def __init__(self):
+        self.phases = {phase: {kind: 0.0 for kind in KINDS} for phase in PHASES}
+        self.rpc_calls: Dict[str, int] = {}
+        self._method: Optional[str] = None  # 正在执行的 Actions 方法
+        self._method_start = 0.0
+        self._inner = 0.0  # 当前方法内已计入的设备调用和等待时间
+        self._outer = 0.0  # 方法外（工作流直接调用设备）已计入的时间
+        self.start = time.perf_counter()
+        self.last_call_end = self.start
+
+    def _add(self, phase: str, kind: str, seconds: float):
+        self.phases[phase][kind] += seconds
+        if self._method is not None:
+            self._inner += seconds
+        else:
+            self._outer += seconds
+
+    def on_start(self, event: dict):
+        if event["kind"] != "action" or event["parent"] is not None:
+            return
+        # 进入 Actions 方法：上一个方法结束以来的时间计入 navigate（工作流自身的逻辑）
+        now = time.perf_counter()
+        self.phases["navigate"]["python"] += max(0.0, now - self.last_call_end - self._outer)
+        self._outer = 0.0
+        self._method = event["name"]
+        self._method_start = now
+        self._inner = 0.0
+
+    def on_end(self, event: dict):
+        kind, name = event["kind"], event["name"]
+        if kind == "rpc":
+            self.rpc_calls[name] = self.rpc_calls.get(name, 0) + 1
+            # 模板匹配的截图用于查找元素，其余截图计入 result
+            image_lookup = name == "screenshot" and event["parent"] in ("find_image", "click_by_image")
+            self._add("locate" if image_lookup else RPC_PHASES.get(name, "locate"), "rpc", event["duration"])
+        elif kind == "sleep":
+            # 启动应用后的等待计入 launch，其余计入 settle
+            phase = "launch" if event["parent"] in ("launch_app", "stop_app") else "settle"
+            self._add(phase, "sleep", event["duration"])
+        elif kind == "action" and event["parent"] is None:
+            # 离开 Actions 方法：方法内的其余时间计入方法所属阶段
+            now = time.perf_counter()
+            phase = METHOD_PHASES.get(name, "navigate")
+            self.phases[phase]["python"] += max(0.0, now - self._method_start - self._inner)
+            self._method = None
+            self.last_call_end = now
+
+    def finish(self) -> float:
+        """工作流返回：最后一个操作之后的时间计入 result，返回总耗时"""
+        now = time.perf_counter()
+        self.phases["result"]["python"] += max(0.0, now - self.last_call_end - self._outer)
+        return now - self.start
+
+
+class ScaledActions(Actions):
+    """按比例缩短固定等待的 Actions（仅用于模拟设备）"""
+
+    def __init__(self, device, sleep_scale: float = 1.0):
+        super().__init__(device)
+        self.sleep_scale = sleep_scale
+
+    def _pause(self, seconds: float):
+        super()._pause(seconds * self.sleep_scale)
+
+
+# ==================== 统计 ====================
+
+def percentile(samples: List[float], p: float) -> float:
+    """最近秩法计算分位数"""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def summarize(samples: List[float]) -> dict:
+    """秒 -> 毫秒分位数"""
+    if not samples:
+        return {}
+    return {
+        "p50": round(percentile(samples, 50) * 1000, 1),
+        "p95": round(percentile(samples, 95) * 1000, 1),
+        "p99": round(percentile(samples, 99) * 1000, 1),
+        "mean": round(sum(samples) / len(samples) * 1000, 1),
+    }
+
+
+def run_workflow(device, app: str, workflow: str, params: dict, iterations: int,
+                 sleep_scale: float = 1.0, cold: bool = False) -> dict:
+    """
+    重复执行一个工作流
+
+    Args:
+        device: 设备对象（uiautomator2 或模拟设备）
+        app: 应用名称
+        workflow: 工作流名称
+        params: 工作流参数
+        iterations: 执行次数
+        sleep_scale: 固定等待的缩放比例（0 表示跳过，只用于模拟设备）
+        cold: 每次执行前先停止应用（冷启动）
+
+    Returns:
+        统计结果
+    """
+    module = importlib.import_module(f"apps.{app}")
+    workflow_func = module.WORKFLOWS[workflow]
+    package = getattr(importlib.import_module(f"apps.{app}.config"), "PACKAGE_NAME", None)
+
+    actions = ScaledActions(device, sleep_scale)
+    runs = []
+    for _ in range(iterations):
+        if cold and package:
+            device.app_stop(package)
+        timer = StepTimer()
+        instrumentation.add_handler(timer)
+        try:
+            result = workflow_func(actions, **params)
+        finally:
+            instrumentation.remove_handler(timer)
+        total = timer.finish()
+        runs.append({"timer": timer, "total": total, "result": result})
+
+    failures: Dict[str, int] = {}
+    for run in runs:
+        if not run["result"].get("success"):
+            error = run["result"].get("error", "unknown")
+            failures[error] = failures.get(error, 0) + 1
+
+    rpc_names = sorted({name for run in runs for name in run["timer"].rpc_calls})
+    return {
+        "iterations": iterations,
+        "success": iterations - sum(failures.values()),
+        "failures": failures,
+        "total_ms": summarize([run["total"] for run in runs]),
+        "phases_ms": {
+            phase: {
+                "total": summarize([sum(run["timer"].phases[phase].values()) for run in runs]),
+                **{kind: summarize([run["timer"].phases[phase][kind] for run in runs]) for kind in KINDS},
+            }
+            for phase in PHASES
+        },
+        "kinds_ms": {
+            kind: summarize([sum(run["timer"].phases[phase][kind] for phase in PHASES) for run in runs])
+            for kind in KINDS
+        },
+        "rpc_calls_per_run": {
+            name: round(sum(run["timer"].rpc_calls.get(name, 0) for run in runs) / iterations, 2)
+            for name in rpc_names
+        },
+    }
+
+
+# ==================== 输出 ====================
+
+def print_report(report: dict, baseline: Optional[dict] = None):
+    """打印基准测试结果（提供 baseline 时显示 p50 变化）"""
+
+    def delta(current: dict, previous: Optional[dict]) -> str:
+        if not previous or not current or not previous.get("p50"):
+            return ""
+        change = (current["p50"] - previous["p50"]) / previous["p50"] * 100
+        return f"  ({change:+.1f}%)"
+
+    def fmt(stats: dict) -> str:
+        if not stats:
+            return "-"
+        return f"p50 {stats['p50']:>9.1f}  p95 {stats['p95']:>9.1f}  p99 {stats['p99']:>9.1f}"
+
+    meta = report["meta"]
+    print(f"\n{'='*78}")
+    print(f"📊 基准测试: 设备 {meta['device']}，每个工作流 {meta['iterations']} 次（单位: 毫秒）")
+    print(f"{'='*78}")
+    for name, stats in report["workflows"].items():
+        previous = (baseline or {}).get("workflows", {}).get(name, {})
+        print(f"\n▶ {name}  成功 {stats['success']}/{stats['iterations']}")
+        for error, count in stats["failures"].items():
+            print(f"   ✗ {error} ×{count}")
+        print(f"   {'总耗时':<10}{fmt(stats['total_ms'])}{delta(stats['total_ms'], previous.get('total_ms'))}")
+        for phase in PHASES:
+            phase_stats = stats["phases_ms"][phase]["total"]
+            previous_phase = previous.get("phases_ms", {}).get(phase, {}).get("total")
+            print(f"   {phase:<12}{fmt(phase_stats)}{delta(phase_stats, previous_phase)}")
+        print(f"   {'-'*60}")
+        for kind in KINDS:
+            kind_stats = stats["kinds_ms"][kind]
+            print(f"   {kind:<12}{fmt(kind_stats)}{delta(kind_stats, previous.get('kinds_ms', {}).get(kind))}")
+        calls = ", ".join(f"{name} {count}" for name, count in stats["rpc_calls_per_run"].items())
+        print(f"   每次设备调用: {calls}")
+    print(f"\n{'='*78}\n")
+
+
+def connect_device(args):
+    """按参数连接真机或创建模拟设备"""
+    if args.device == "fake":
+        from fake_device import FakeDevice
+        device = FakeDevice(rpc_latency=args.rpc_latency, rpc_jitter=args.rpc_jitter, seed=0)
+        device.delay_scale = args.sleep_scale
+        return device
+
+    from device import DeviceManager
+    return DeviceManager(args.serial, backend="u2").connect()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="工作流基准测试")
+    parser.add_argument("--device", choices=["u2", "fake"], default="fake", help="真机（u2）或模拟设备（fake）")
+    parser.add_argument("--serial", default=None, help="真机序列号（默认第一个设备）")
+    parser.add_argument("--workflows", default=",".join(DEFAULT_WORKFLOWS), help="逗号分隔的 app.workflow 列表")
+    parser.add_argument("--iterations", "-n", type=int, default=10, help="每个工作流的执行次数")
+    parser.add_argument("--params", default="{}", help='工作流参数（JSON），如 \'{"image_index": 0}\'')
+    parser.add_argument("--cold", action="store_true", help="每次执行前停止应用（冷启动）")
+    parser.add_argument("--rpc-latency", type=float, default=0.03, help="模拟设备的调用耗时（秒）")
+    parser.add_argument("--rpc-jitter", type=float, default=0.01, help="模拟设备调用耗时的随机波动（秒）")
+    parser.add_argument("--sleep-scale", type=float, default=1.0,
+                        help="固定等待的缩放比例，仅用于模拟设备（0 = 跳过等待，只测框架开销）")
+    parser.add_argument("--json", dest="json_path", default=None, help="结果保存为 JSON 文件")
+    parser.add_argument("--compare", default=None, help="与之前保存的 JSON 结果对比")
+    parser.add_argument("--verbose", action="store_true", help="显示工作流日志")
+    args = parser.parse_args(argv)
+
+    if args.device != "fake" and args.sleep_scale != 1.0:
+        parser.error("--sleep-scale 只能用于模拟设备（真机需要等待界面响应）")
+
+    params = json.loads(args.params)
+    device = connect_device(args)
+    report = {
+        "meta": {
+            "device": args.device,
+            "iterations": args.iterations,
+            "params": params,
+            "cold": args.cold,
+            "rpc_latency": args.rpc_latency if args.device == "fake" else None,
+            "sleep_scale": args.sleep_scale,
+            "python": platform.python_version(),
+            "time": datetime.now().isoformat(timespec="seconds"),
+        },
+        "workflows": {},
+    }
+
+    # 工作流每一步都会写日志，默认只输出错误以免影响计时
+    log.setup(level=None if args.verbose else "ERROR")
+
+    for name in args.workflows.split(","):
+        app, workflow = name.strip().split(".", 1)
+        print(f"⏱️ {name} × {args.iterations}", file=sys.stderr)
+        report["workflows"][name] = run_workflow(
+            device, app, workflow, params, args.iterations, args.sleep_scale, args.cold
+        )
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2, sort_keys=True)
+        print(f"💾 结果已保存: {args.json_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""坐标校准 - 为每种机型记录按坐标点击的元素的真实位置
+
+没有文本和 ID 的按钮（如向日葵"我的"页面左上角的扫码按钮、微信扫一扫页面的相册图标）以前按屏幕比例估算坐标，
+在刘海屏、长屏手机上会点偏。校准工具在每种机型上运行一次：按应用的导航进入对应页面，
+从界面结构（或参考图模板匹配）中找到这些元素的真实位置，保存为按机型和分辨率区分的校准文件。
+工作流运行时直接读取（每台设备只读取一次文件，之后是内存中的字典查找），没有校准时再按比例估算。
+
+应用在 config.py 中声明校准目标，在 workflows.py 中用 CALIBRATION_PAGES 提供进入各页面的导航：
+
+    CALIBRATION = {
+        "scan_button": {
+            "page": "my",                          # 所在页面（CALIBRATION_PAGES 中的名称）
+            "class": "android.widget.ImageView",   # 界面结构中的匹配条件：text / description / resource_id / class
+            "region": (0, 0, 0.3, 0.2),            # 只在该区域内查找，(左, 上, 右, 下) 为屏幕宽高的比例
+                                                   # 区域内有多个元素符合条件时不校准，需要加条件区分
+            "template": "templates/scan.png",      # 可选：界面结构中找不到时用参考图匹配
+        },
+    }
+
+使用方法：
+    # 在设备上校准（结果保存在 calibration/<机型>_<宽>x<高>.json，可以提交到仓库）
+    python calibration.py run sunlogin wechat --serial <设备序列号>
+    python calibration.py show
+
+    # 工作流中读取
+    point = calibration.point(actions, "sunlogin", "scan_button")   # (x, y) 或 None
+
+环境变量 QRCODE_CALIBRATION_DIR 可以指定校准文件目录。
+"""
+import argparse
+import importlib
+import json
+import logging
+import os
+import re
+import threading
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import log
+
+logger = logging.getLogger(__name__)
+
+CALIBRATION_DIR = os.environ.get(
+    "QRCODE_CALIBRATION_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "calibration")
+)
+
+# 界面结构中的匹配条件 -> 节点属性
+_CONDITIONS = {
+    "text": "text",
+    "description": "content-desc",
+    "resource_id": "resource-id",
+    "class": "class",
+}
+
+_BOUNDS = re.compile(r"\[(-?\d+),(-?\d+)\]\[(-?\d+),(-?\d+)\]")
+
+
+# ==================== 校准文件 ====================
+
+def device_profile(device) -> dict:
+    """设备的机型和分辨率（校准文件按此区分）"""
+    info = device.info
+    model = None
+    try:
+        model = device.device_info.get("model")
+    except Exception:
+        pass
+    model = model or info.get("model") or info.get("productName") or "unknown"
+    return {"model": model, "width": info["displayWidth"], "height": info["displayHeight"]}
+
+
+def profile_path(profile: dict) -> str:
+    """校准文件路径：<机型>_<宽>x<高>.json"""
+    model = re.sub(r"[^\w.-]+", "-", profile["model"]).strip("-") or "unknown"
+    return os.path.join(CALIBRATION_DIR, f"{model}_{profile['width']}x{profile['height']}.json")
+
+
+def load(path: str) -> dict:
+    """读取校准文件（不存在时返回空的校准）"""
+    if not os.path.exists(path):
+        return {"version": 1, "apps": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save(path: str, calibration: dict):
+    """保存校准文件"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(calibration, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+
+# ==================== 运行时读取 ====================
+
+_loaded: Dict[object, dict] = {}  # 设备 -> 校准（每台设备只读取一次）
+_loaded_lock = threading.Lock()
+
+
+def _for_device(actions) -> dict:
+    key = actions.device_key
+    with _loaded_lock:
+        calibration = _loaded.get(key)
+    if calibration is None:
+        try:
+            calibration = load(profile_path(device_profile(actions.device)))
+        except Exception as e:
+            logger.warning("读取坐标校准失败: %s", e)
+            calibration = {"version": 1, "apps": {}}
+        with _loaded_lock:
+            _loaded[key] = calibration
+    return calibration
+
+
+def point(actions, app: str, name: str) -> Optional[Tuple[int, int]]:
+    """
+    读取校准过的坐标
+
+    Args:
+        actions: 操作对象
+        app: 应用名称
+        name: 校准目标名称（config.py 的 CALIBRATION 中的键）
+
+    Returns:
+        (x, y)，该机型没有校准过时返回 None
+    """
+    target = _for_device(actions)["apps"].get(app, {}).get(name)
+    if not target:
+        return None
+    return target["x"], target["y"]
+
+
+def reset():
+    """清除已读取的校准（重新校准后使用）"""
+    with _loaded_lock:
+        _loaded.clear()
+
+
+# ==================== 校准 ====================
+
+def _in_region(bounds: Tuple[int, int, int, int], region, width: int, height: int) -> bool:
+    """元素中心是否在区域内"""
+    if not region:
+        return True
+    x, y = (bounds[0] + bounds[2]) / 2, (bounds[1] + bounds[3]) / 2
+    return region[0] * width <= x <= region[2] * width and region[1] * height <= y <= region[3] * height
+
+
+def find_in_hierarchy(xml: str, target: dict, width: int, height: int) -> Optional[Tuple[int, int, int, int]]:
+    """
+    在界面结构中查找校准目标
+
+    Args:
+        xml: dump_hierarchy 返回的 XML
+        target: 校准目标（config.py 的 CALIBRATION 中的值）
+        width: 屏幕宽度
+        height: 屏幕高度
+
+    Returns:
+        元素位置 (左, 上, 右, 下)，找不到或有多个元素符合条件（无法确定是哪一个）时返回 None
+    """
+    conditions = {attribute: target[key] for key, attribute in _CONDITIONS.items() if key in target}
+    if not conditions:
+        return None
+    found = []
+    for node in ET.fromstring(xml).iter("node"):
+        if any(node.get(attribute) != value for attribute, value in conditions.items()):
+            continue
+        match = _BOUNDS.match(node.get("bounds") or "")
+        if not match:
+            continue
+        bounds = tuple(map(int, match.groups()))
+        if bounds[2] > bounds[0] and bounds[3] > bounds[1] and _in_region(bounds, target.get("region"), width, height):
+            found.append(bounds)
+    if len(found) > 1:
+        # 如 class 条件同时匹配到头像、logo，宁可不校准也不要记录错误的位置
+        logger.warning("  ✗ %s 个元素符合条件 %s: %s，请加上 description 或 resource_id 区分",
+                       len(found), conditions, found)
+        return None
+    return found[0] if found else None
+
+
+def discover(actions, target: dict, width: int, height: int) -> Optional[dict]:
+    """
+    在当前页面中找到校准目标的真实位置
+
+    Returns:
+        {"x", "y", "bounds", "source": hierarchy / template}，找不到时返回 None
+    """
+    bounds = find_in_hierarchy(actions.device.dump_hierarchy(), target, width, height)
+    if bounds:
+        return {"x": (bounds[0] + bounds[2]) // 2, "y": (bounds[1] + bounds[3]) // 2,
+                "bounds": list(bounds), "source": "hierarchy"}
+    if target.get("template"):
+        found = actions.find_image(target["template"], region=target.get("region"))
+        if found:
+            return {"x": found["x"], "y": found["y"], "bounds": list(found["bounds"]), "source": "template"}
+    return None
+
+
+def calibrate(actions, app: str) -> Dict[str, Optional[dict]]:
+    """
+    校准一个应用的所有目标
+
+    Args:
+        actions: 操作对象
+        app: 应用名称
+
+    Returns:
+        目标名称 -> 校准结果（找不到时为 None）
+    """
+    config = importlib.import_module(f"apps.{app}.config")
+    workflows = importlib.import_module(f"apps.{app}.workflows")
+    targets: dict = getattr(config, "CALIBRATION", {})
+    pages: dict = getattr(workflows, "CALIBRATION_PAGES", {})
+    width, height = actions.get_screen_size()
+
+    results: Dict[str, Optional[dict]] = {}
+    for page in dict.fromkeys(target.get("page") for target in targets.values()):
+        names = [name for name, target in targets.items() if target.get("page") == page]
+        if page is not None:
+            logger.info("进入页面: %s.%s", app, page)
+            if page not in pages or not pages[page](actions):
+                logger.warning("  ✗ 无法进入页面 %s，跳过 %s", page, ", ".join(names))
+                results.update({name: None for name in names})
+                continue
+            actions.wait_idle(timeout=3)
+        for name in names:
+            results[name] = discover(actions, targets[name], width, height)
+            logger.info("  %s: %s", name, results[name])
+    return results
+
+
+# ==================== 命令行 ====================
+
+def print_profile(path: str, calibration: dict):
+    print(f"\n📐 {os.path.basename(path)}（{calibration.get('model')}，{calibration.get('width')}x{calibration.get('height')}，"
+          f"{calibration.get('updated', '-')}）")
+    for app, targets in sorted(calibration.get("apps", {}).items()):
+        for name, target in sorted(targets.items()):
+            label = f"{app}.{name}"
+            print(f"  {label:<28} ({target['x']:>4}, {target['y']:>4})  {target['source']:<9}  {target['bounds']}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="坐标校准")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="在设备上校准应用的坐标")
+    run_parser.add_argument("apps", nargs="+", help="应用名称")
+    run_parser.add_argument("--serial", default=None, help="设备序列号（默认第一个设备）")
+
+    subparsers.add_parser("show", help="查看已有的校准文件")
+    args = parser.parse_args(argv)
+
+    if args.command == "show":
+        paths = sorted(os.listdir(CALIBRATION_DIR)) if os.path.isdir(CALIBRATION_DIR) else []
+        for name in paths:
+            if name.endswith(".json"):
+                print_profile(os.path.join(CALIBRATION_DIR, name), load(os.path.join(CALIBRATION_DIR, name)))
+        if not paths:
+            print(f"没有校准文件: {CALIBRATION_DIR}")
+        return
+
+    log.setup()
+    from actions import Actions
+    from device import DeviceManager
+
+    device = DeviceManager(args.serial).connect()
+    actions = Actions(device)
+    profile = device_profile(device)
+    path = profile_path(profile)
+    calibration = load(path)
+    calibration.update(profile)
+
+    missing = []
+    for app in args.apps:
+        results = calibrate(actions, app)
+        found = {name: result for name, result in results.items() if result}
+        missing += [f"{app}.{name}" for name, result in results.items() if not result]
+        calibration["apps"].setdefault(app, {}).update(found)
+
+    calibration["updated"] = datetime.now().isoformat(timespec="seconds")
+    save(path, calibration)
+    print_profile(path, calibration)
+    if missing:
+        print(f"\n⚠️  未找到: {', '.join(missing)}（这些目标运行时仍按比例估算）")
+    print(f"\n💾 校准文件已保存: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,50 @@
 #!/usr/bin/env python3
-"""交互式命令行工具 - 用于测试和调试自动化操作"""
+"""交互式命令行工具 - 用于测试和调试自动化操作
+
+除交互模式外，也可以直接在命令行中批量执行（不进入交互）：
+    python cli.py bench <app> <workflow> -n 50 [参数]   重复执行工作流，输出每次和每个步骤的耗时
+    python cli.py script commands.txt                  依次执行文件中的命令（每行一条，# 开头为注释）
+"""
 import cmd
+import logging
 import sys
 import os
 import importlib
+import time
+import instrumentation
+import log
+from bench import summarize
 from device import get_device_manager
 from actions import Actions
 
 
+class StepTimer(instrumentation.Handler):
+    """埋点处理器：按步骤累计一次工作流执行的耗时
+
+    步骤为 @log.step 装饰的步骤函数；不在步骤函数内的 Actions 调用各自作为一个步骤，
+    同一方法第 n 次调用记为 方法名#n（n > 1），以便与其他次执行按顺序对齐。
+    """
+
+    def __init__(self):
+        self.steps = {}  # 步骤 -> 耗时（秒），按首次出现的顺序
+        self.rpc_calls = 0
+        self.sleep = 0.0
+        self._occurrences = {}  # 步骤函数外各 Actions 方法的调用次数
+
+    def on_end(self, event: dict):
+        if event["kind"] == "rpc":
+            self.rpc_calls += 1
+        elif event["kind"] == "sleep":
+            self.sleep += event["duration"]
+        if event["kind"] != "action" or event["parent"] is not None:
+            return
+        step = log.current_context().get("step")
+        if step is None:
+            count = self._occurrences[event["name"]] = self._occurrences.get(event["name"], 0) + 1
+            step = event["name"] if count == 1 else f"{event['name']}#{count}"
+        self.steps[step] = self.steps.get(step, 0.0) + event["duration"]
+
+
 class AutomationCLI(cmd.Cmd):
     """交互式自动化测试命令行"""
 
@@ -22,6 +59,8 @@ class AutomationCLI(cmd.Cmd):
   steps                          列出所有可用的步骤
   run <app> <workflow> [参数]    直接执行工作流
   step <app> <step> [参数]       直接执行步骤
+  bench <app> <workflow> -n N    重复执行工作流并统计耗时
+  script <文件>                  依次执行文件中的命令
 
 🔧 调试命令:
   launch <包名>                  启动应用
@@ -39,6 +78,7 @@ class AutomationCLI(cmd.Cmd):
         self.actions = None
         self.available_apps = {}  # 存储所有可用的 app 和工作流
         self.available_steps = {}  # 存储所有可用的 app 和 steps
+        self.last_result = None  # 最近一次 run 的结果（脚本模式据此判断成败）
 
     def preloop(self):
         """在命令循环开始前连接设备"""
@@ -111,6 +151,43 @@ class AutomationCLI(cmd.Cmd):
             except Exception as e:
                 print(f"⚠️  加载 {app_name} 的 steps 失败: {e}")
 
+    @staticmethod
+    def _parse_params(parts):
+        """解析 key=value 形式的参数（数字自动转换）"""
+        params = {}
+        for param in parts:
+            if "=" in param:
+                key, value = param.split("=", 1)
+                # 尝试转换为数字
+                try:
+                    value = int(value)
+                except ValueError:
+                    try:
+                        value = float(value)
+                    except ValueError:
+                        pass  # 保持字符串
+                params[key] = value
+        return params
+
+    def _find_workflow(self, app_name, workflow_name):
+        """查找工作流，不存在时打印提示并返回 None"""
+        # 检查 app 是否存在
+        if app_name not in self.available_apps:
+            print(f"✗ 应用 '{app_name}' 不存在\n")
+            print("使用 'list' 命令查看所有可用应用\n")
+            return None
+
+        # 检查 workflow 是否存在
+        workflows = self.available_apps[app_name]
+        if workflow_name not in workflows:
+            print(f"✗ 工作流 '{workflow_name}' 不存在\n")
+            print(f"应用 {app_name} 可用的工作流:")
+            for name in workflows.keys():
+                print(f"  - {name}")
+            print()
+            return None
+        return workflows[workflow_name]
+
     # ==================== 工作流管理 ====================
 
     def do_list(self, arg):
@@ -152,35 +229,11 @@ class AutomationCLI(cmd.Cmd):
         app_name = parts[0]
         workflow_name = parts[1]
 
-        # 解析参数
-        params = {}
-        for param in parts[2:]:
-            if "=" in param:
-                key, value = param.split("=", 1)
-                # 尝试转换为数字
-                try:
-                    value = int(value)
-                except ValueError:
-                    try:
-                        value = float(value)
-                    except ValueError:
-                        pass  # 保持字符串
-                params[key] = value
-
-        # 检查 app 是否存在
-        if app_name not in self.available_apps:
-            print(f"✗ 应用 '{app_name}' 不存在\n")
-            print("使用 'list' 命令查看所有可用应用\n")
-            return
+        params = self._parse_params(parts[2:])
 
-        # 检查 workflow 是否存在
-        workflows = self.available_apps[app_name]
-        if workflow_name not in workflows:
-            print(f"✗ 工作流 '{workflow_name}' 不存在\n")
-            print(f"应用 {app_name} 可用的工作流:")
-            for name in workflows.keys():
-                print(f"  - {name}")
-            print()
+        workflow_func = self._find_workflow(app_name, workflow_name)
+        if workflow_func is None:
+            self.last_result = {"success": False, "error": "工作流不存在"}
             return
 
         # 执行工作流
@@ -190,8 +243,8 @@ class AutomationCLI(cmd.Cmd):
                 print(f"   参数: {params}")
             print()
 
-            workflow_func = workflows[workflow_name]
             result = workflow_func(self.actions, **params)
+            self.last_result = result
 
             # 显示结果
             print("\n" + "=" * 60)
@@ -202,6 +255,7 @@ class AutomationCLI(cmd.Cmd):
             print("=" * 60 + "\n")
 
         except Exception as e:
+            self.last_result = {"success": False, "error": str(e)}
             print(f"\n❌ 执行失败: {e}\n")
             import traceback
             traceback.print_exc()
@@ -247,20 +301,7 @@ class AutomationCLI(cmd.Cmd):
         app_name = parts[0]
         step_name = parts[1]
 
-        # 解析参数
-        params = {}
-        for param in parts[2:]:
-            if "=" in param:
-                key, value = param.split("=", 1)
-                # 尝试转换为数字
-                try:
-                    value = int(value)
-                except ValueError:
-                    try:
-                        value = float(value)
-                    except ValueError:
-                        pass  # 保持字符串
-                params[key] = value
+        params = self._parse_params(parts[2:])
 
         # 检查 app 是否存在
         if app_name not in self.available_steps:
@@ -605,6 +646,142 @@ class AutomationCLI(cmd.Cmd):
         except Exception as e:
             print(f"✗ 检查失败: {e}\n")
 
+    # ==================== 批量执行 ====================
+
+    def do_bench(self, arg):
+        """重复执行工作流，输出每次执行和每个步骤的耗时（毫秒）
+        用法: bench <app> <workflow> [-n 次数] [参数]
+        示例: bench sunlogin execute -n 50
+        示例: bench wechat scan_from_album -n 20 image_index=0
+        """
+        parts = arg.split()
+        iterations = 10
+        if "-n" in parts:
+            index = parts.index("-n")
+            try:
+                iterations = int(parts[index + 1])
+            except (IndexError, ValueError):
+                iterations = 0
+            del parts[index:index + 2]
+        if len(parts) < 2 or iterations < 1:
+            print("✗ 用法: bench <app> <workflow> [-n 次数] [参数]\n")
+            print("示例: bench sunlogin execute -n 50\n")
+            return
+
+        app_name, workflow_name = parts[0], parts[1]
+        params = self._parse_params(parts[2:])
+        workflow_func = self._find_workflow(app_name, workflow_name)
+        if workflow_func is None:
+            self.last_result = {"success": False, "error": "工作流不存在"}
+            return
+
+        print(f"\n⏱️  {app_name}.{workflow_name} × {iterations}" + (f"  参数: {params}" if params else ""))
+        print("=" * 72)
+        print(f"{'#':>4}  {'结果':<4}{'总耗时':>10}{'固定等待':>10}{'设备调用':>8}  错误")
+        print("-" * 72)
+
+        # 工作流每一步都会写日志，统计期间只输出警告和错误
+        root = logging.getLogger()
+        level = root.level
+        root.setLevel(logging.WARNING)
+        runs = []
+        try:
+            for i in range(1, iterations + 1):
+                timer = StepTimer()
+                instrumentation.add_handler(timer)
+                start = time.perf_counter()
+                try:
+                    result = workflow_func(self.actions, **params)
+                except Exception as e:
+                    result = {"success": False, "error": f"{type(e).__name__}: {e}"}
+                finally:
+                    instrumentation.remove_handler(timer)
+                total = time.perf_counter() - start
+                runs.append({"total": total, "timer": timer, "result": result})
+                mark = "✓" if result.get("success") else "✗"
+                error = "" if result.get("success") else result.get("error", "未知错误")
+                print(f"{i:>4}  {mark:<4}{total * 1000:>12.1f}{timer.sleep * 1000:>12.1f}"
+                      f"{timer.rpc_calls:>12}  {error}")
+        except KeyboardInterrupt:
+            print("\n⚠️  已中断，只统计已完成的执行")
+        finally:
+            root.setLevel(level)
+
+        if not runs:
+            return
+        successes = sum(1 for run in runs if run["result"].get("success"))
+        self.last_result = {"success": successes == len(runs), "error": f"成功 {successes}/{len(runs)}"}
+
+        # 每个步骤的耗时（没有执行到的步骤按 0 计入，以免分位数只反映成功的执行）
+        step_names = []
+        for run in runs:
+            for name in run["timer"].steps:
+                if name not in step_names:
+                    step_names.append(name)
+
+        def fmt(stats):
+            return f"{stats['p50']:>10.1f}{stats['p95']:>10.1f}{stats['p99']:>10.1f}{stats['mean']:>10.1f}"
+
+        print("\n" + "=" * 72)
+        print(f"{'步骤':<30}{'p50':>10}{'p95':>10}{'p99':>10}{'平均':>10}")
+        print("-" * 72)
+        for name in step_names:
+            stats = summarize([run["timer"].steps.get(name, 0.0) for run in runs])
+            print(f"{name[:30]:<32}{fmt(stats)}")
+        print("-" * 72)
+        print(f"{'总耗时':<29}{fmt(summarize([run['total'] for run in runs]))}")
+        print(f"{'固定等待':<28}{fmt(summarize([run['timer'].sleep for run in runs]))}")
+        print("=" * 72)
+        print(f"成功 {successes}/{len(runs)}，单位: 毫秒\n")
+
+    def do_script(self, arg):
+        """依次执行文件中的命令（每行一条，空行和 # 开头的行忽略），最后输出每条命令的耗时
+        用法: script <文件>
+        示例: script scripts/new_phone.txt
+        """
+        path = arg.strip()
+        if not path:
+            print("✗ 请提供脚本文件\n")
+            return
+        try:
+            with open(path, encoding="utf-8") as f:
+                lines = [line.strip() for line in f]
+        except OSError as e:
+            print(f"✗ 读取脚本失败: {e}\n")
+            return
+
+        commands = [(number, line) for number, line in enumerate(lines, 1) if line and not line.startswith("#")]
+        records = []
+        for number, line in commands:
+            print(f"\n▶️  [{number}] {line}")
+            self.last_result = None
+            start = time.perf_counter()
+            stop = self.onecmd(line)
+            elapsed = time.perf_counter() - start
+            records.append((number, line, elapsed, self.last_result))
+            if stop:
+                break
+
+        print("\n" + "=" * 72)
+        print(f"📜 脚本: {path}")
+        print("=" * 72)
+        print(f"{'行':>4}  {'结果':<4}{'耗时(ms)':>10}  命令")
+        print("-" * 72)
+        failed = 0
+        for number, line, elapsed, result in records:
+            if result is None:
+                mark = "-"
+            elif result.get("success"):
+                mark = "✓"
+            else:
+                mark = "✗"
+                failed += 1
+            print(f"{number:>4}  {mark:<4}{elapsed * 1000:>12.1f}  {line}")
+        print("-" * 72)
+        total = sum(elapsed for _, _, elapsed, _ in records)
+        print(f"共 {len(records)} 条命令，失败 {failed} 条，总耗时 {total * 1000:.1f} ms\n")
+        self.last_result = {"success": failed == 0, "error": f"失败 {failed} 条命令"}
+
     # ==================== 交互式菜单 ====================
 
     def do_menu(self, arg):
@@ -938,6 +1115,22 @@ class AutomationCLI(cmd.Cmd):
 
 def main():
     """主函数"""
+    log.setup()
+
+    # 批量模式：cli.py bench ... / cli.py script ...，执行完直接退出
+    if len(sys.argv) > 1:
+        if sys.argv[1] not in ("bench", "script"):
+            print("用法: cli.py [bench <app> <workflow> [-n 次数] [参数] | script <文件>]")
+            sys.exit(2)
+        cli = AutomationCLI()
+        cli.preloop()
+        try:
+            cli.onecmd(" ".join(sys.argv[1:]))
+        except KeyboardInterrupt:
+            print("\n已中断\n")
+            sys.exit(130)
+        sys.exit(0 if cli.last_result and cli.last_result.get("success") else 1)
+
     try:
         cli = AutomationCLI()
         # 直接进入菜单模式，而不是命令行模式
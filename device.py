@@ -1,30 +1,54 @@
-"""设备管理模块"""
+"""设备管理模块
+
+设备后端通过 backend 参数或环境变量 QRCODE_DEVICE_BACKEND 选择：
+    - u2（默认）：通过 uiautomator2 连接真实设备
+    - fake：模拟设备（fake_device.py），不需要连接手机，用于基准测试和回归测试
+
+DeviceProbe 在后台线程中定期探测设备，健康检查直接读取缓存结果，不会与工作流争用设备。
+"""
+import logging
+import os
+import threading
+import time
 import uiautomator2 as u2
+from contextlib import contextmanager
 from typing import Optional
 
+BACKENDS = ("u2", "fake")
+
+logger = logging.getLogger(__name__)
+
 
 class DeviceManager:
     """Android 设备管理器"""
 
-    def __init__(self, device_id: Optional[str] = None):
+    def __init__(self, device_id: Optional[str] = None, backend: Optional[str] = None):
         """
         初始化设备管理器
 
         Args:
             device_id: 设备 ID，如果为 None 则自动连接第一个设备
+            backend: 设备后端（u2 / fake），默认读取环境变量 QRCODE_DEVICE_BACKEND，未设置时为 u2
         """
         self.device_id = device_id
+        self.backend = backend or os.environ.get("QRCODE_DEVICE_BACKEND", "u2")
+        if self.backend not in BACKENDS:
+            raise ValueError(f"未知的设备后端: {self.backend}（可选: {', '.join(BACKENDS)}）")
         self.device: Optional[u2.Device] = None
+        self._lease_lock = threading.Lock()  # 同一时间只允许一个工作流操作设备
 
     def connect(self) -> u2.Device:
         """连接设备"""
         try:
-            if self.device_id:
+            if self.backend == "fake":
+                from fake_device import FakeDevice
+                self.device = FakeDevice.from_env()
+            elif self.device_id:
                 self.device = u2.connect(self.device_id)
             else:
                 self.device = u2.connect()  # 连接第一个可用设备
 
-            print(f"设备已连接: {self.device.info}")
+            logger.info("设备已连接: %s", self.device.info)
             return self.device
         except Exception as e:
             raise Exception(f"连接设备失败: {e}")
@@ -33,7 +57,7 @@ class DeviceManager:
         """断开设备连接"""
         if self.device:
             self.device = None
-            print("设备已断开")
+            logger.info("设备已断开")
 
     def get_device(self) -> u2.Device:
         """获取设备对象"""
@@ -41,6 +65,31 @@ class DeviceManager:
             return self.connect()
         return self.device
 
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """
+        独占设备（多线程服务中同一时间只有一个工作流操作设备）
+
+        Args:
+            timeout: 最长等待时间（秒），None 表示一直等待
+
+        Returns:
+            是否获取成功
+        """
+        return self._lease_lock.acquire(timeout=-1 if timeout is None else timeout)
+
+    def release(self):
+        """释放设备"""
+        self._lease_lock.release()
+
+    @contextmanager
+    def lease(self):
+        """独占设备的上下文管理器，返回设备对象"""
+        self.acquire()
+        try:
+            yield self.get_device()
+        finally:
+            self.release()
+
     def is_connected(self) -> bool:
         """检查设备是否已连接"""
         try:
@@ -52,13 +101,119 @@ class DeviceManager:
         return False
 
 
+class DeviceProbe:
+    """后台设备探测：定期检查设备连接，健康检查只读取缓存的结果"""
+
+    def __init__(self, device_manager: DeviceManager, interval: Optional[float] = None,
+                 stale_after: Optional[float] = None):
+        """
+        初始化设备探测
+
+        Args:
+            device_manager: 设备管理器
+            interval: 探测间隔（秒），默认读取环境变量 QRCODE_HEALTH_INTERVAL，未设置时为 10
+            stale_after: 探测结果超过多久视为过期（秒），默认为 3 个探测间隔
+        """
+        self.device_manager = device_manager
+        self.interval = interval if interval is not None else float(os.environ.get("QRCODE_HEALTH_INTERVAL", "10"))
+        self.stale_after = stale_after if stale_after is not None else self.interval * 3
+        self._status = {
+            "connected": False,
+            "checked_at": None,  # 最近一次完成探测的时间
+            "latency": None,     # 最近一次探测的耗时（秒）
+            "error": None,
+            "busy": False,       # 最近一次探测时设备正在执行工作流
+        }
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """启动后台探测线程（已启动时直接返回）"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="device-probe", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """停止后台探测线程"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval + 1)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.probe()
+            except Exception as e:
+                logger.warning("⚠️  设备探测异常: %s", e)
+            self._stop.wait(self.interval)
+
+    def probe(self) -> dict:
+        """
+        探测一次设备
+
+        工作流正在使用设备时跳过本次探测，避免与工作流争用 uiautomator2 通道。
+
+        Returns:
+            探测后的状态（同 status()）
+        """
+        if not self.device_manager.acquire(timeout=0):
+            with self._lock:
+                self._status["busy"] = True
+            return self.status()
+
+        try:
+            start = time.perf_counter()
+            try:
+                self.device_manager.get_device().info
+                connected, error = True, None
+            except Exception as e:
+                connected, error = False, str(e)
+            latency = time.perf_counter() - start
+        finally:
+            self.device_manager.release()
+
+        with self._lock:
+            self._status.update(
+                connected=connected, checked_at=time.time(), latency=latency, error=error, busy=False
+            )
+        return self.status()
+
+    def status(self) -> dict:
+        """
+        获取缓存的探测结果
+
+        Returns:
+            包含 connected、age（距上次探测的秒数）、latency、error、busy 的字典
+        """
+        with self._lock:
+            status = dict(self._status)
+        checked_at = status.pop("checked_at")
+        status["age"] = None if checked_at is None else time.time() - checked_at
+        return status
+
+    def is_alive(self) -> bool:
+        """存活检查：后台探测线程仍在运行"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def is_ready(self) -> bool:
+        """就绪检查：最近一次探测时设备已连接，且结果未过期（设备正被工作流占用时不算过期）"""
+        status = self.status()
+        if not status["connected"]:
+            return False
+        return status["busy"] or status["age"] <= self.stale_after
+
+
 # 全局设备管理器实例
 _device_manager: Optional[DeviceManager] = None
 
 
-def get_device_manager(device_id: Optional[str] = None) -> DeviceManager:
+def get_device_manager(device_id: Optional[str] = None, backend: Optional[str] = None) -> DeviceManager:
     """获取全局设备管理器实例"""
     global _device_manager
     if _device_manager is None:
-        _device_manager = DeviceManager(device_id)
+        _device_manager = DeviceManager(device_id, backend)
     return _device_manager
@@ -0,0 +1,691 @@
+"""模拟设备 - 不连接手机运行工作流（用于基准测试和回归测试）
+
+FakeDevice 实现了本项目用到的 uiautomator2 接口子集：
+
+    - d.app_start / app_stop / app_current
+    - d(text=..., resourceId=..., className=..., instance=...) 选择器：wait / wait_gone / exists / click / child
+    - d.click / swipe / swipe_points / swipe_ext / press / send_keys / clear_text / set_clipboard
+    - d.shell（只支持手势宏用到的 input 命令，见 gestures.py）
+    - d.info / window_size / screenshot / dump_hierarchy
+
+界面由"脚本"驱动：脚本是一个字典，描述每个页面上的元素，以及点击元素后跳转到哪个页面。
+默认脚本 DEFAULT_SCRIPT 覆盖 apps/ 下各应用的工作流，所有工作流都可以在模拟设备上完整执行。
+
+每次调用都会按 rpc_latency 模拟一次设备 RPC 的耗时，并记录调用次数和耗时（见 rpc_stats）。
+
+使用方法：
+    from fake_device import FakeDevice
+    from actions import Actions
+    from apps.sunlogin import WORKFLOWS
+
+    device = FakeDevice(rpc_latency=0.05)
+    WORKFLOWS["execute"](Actions(device))
+
+    # 或通过环境变量让 DeviceManager 返回模拟设备
+    QRCODE_DEVICE_BACKEND=fake uv run cli.py
+"""
+import copy
+import os
+import random
+import time
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from uiautomator2.exceptions import UiObjectNotFoundError
+except ImportError:  # 未安装 uiautomator2 时也可以使用模拟设备
+    class UiObjectNotFoundError(Exception):
+        """元素不存在"""
+
+
+# 支持的选择器参数
+_SELECTOR_KEYS = {
+    "text", "textContains", "textStartsWith",
+    "resourceId", "className",
+    "description", "descriptionContains",
+    "focused",
+    "instance",
+}
+
+
+# shell 的返回值（与 uiautomator2 的 ShellResponse 字段一致）
+ShellResponse = namedtuple("ShellResponse", ["output", "exit_code"])
+
+# shell 中 input keyevent 的按键代码 -> press 的按键名
+_KEYS = {3: "home", 4: "back"}
+
+
+# ==================== 默认脚本 ====================
+
+def _el(text: str = "", bounds: Tuple[float, float, float, float] = (0, 0, 1, 1), **fields) -> dict:
+    """脚本元素（bounds 为相对屏幕宽高的比例：左、上、右、下）"""
+    element = {"text": text, "bounds": bounds, "className": "android.widget.TextView"}
+    element.update(fields)
+    return element
+
+
+def _album_grid(package: str, rows: int = 10, cols: int = 3, visible_rows: int = 4) -> dict:
+    """系统相册选择器的图片网格（与 apps/sunlogin/config.py 中的 album_grid 一致）
+
+    一屏显示 visible_rows 行，其余的行需要滚动（网格是可滚动元素，子元素的 bounds 为未滚动时的位置）
+    """
+    top = 1 / 6  # 第一行图片从屏幕 1/6 处开始，每行高 1/6
+    children = []
+    for row in range(rows):
+        for col in range(cols):
+            children.append(_el(
+                className="android.widget.LinearLayout",
+                description=f"图片 {row * cols + col}",
+                bounds=(col / cols, top + row / 6, (col + 1) / cols, top + (row + 1) / 6),
+                goto="scan_result",
+                delay=0.3,
+            ))
+    return _el(
+        className="android.widget.GridView",
+        resourceId="com.google.android.documentsui:id/dir_list",
+        bounds=(0, top, 1, top + visible_rows / 6),
+        package=package,
+        scrollable=True,
+        children=children,
+    )
+
+
+_SUNLOGIN_TABS = [
+    _el("设备", (0, 0.92, 1 / 3, 1), goto="sunlogin.device"),
+    _el("发现", (1 / 3, 0.92, 2 / 3, 1)),
+    _el("我的", (2 / 3, 0.92, 1, 1), resourceId="com.oray.sunlogin:id/btn_host_list_set", goto="sunlogin.my"),
+]
+
+_WECHAT_TABS = [
+    _el("微信", (0, 0.92, 0.25, 1), goto="wechat.home"),
+    _el("通讯录", (0.25, 0.92, 0.5, 1)),
+    _el("发现", (0.5, 0.92, 0.75, 1), goto="wechat.discover"),
+    _el("我", (0.75, 0.92, 1, 1)),
+]
+
+DEFAULT_SCRIPT = {
+    "start": "launcher",
+    # app_start(包名) 后进入的页面
+    "apps": {
+        "com.oray.sunlogin": "sunlogin.device",
+        "com.tencent.mm": "wechat.home",
+        "com.eg.android.AlipayGphone": "alipay.home",
+    },
+    "screens": {
+        "launcher": {
+            "package": "com.android.launcher3",
+            "elements": [_el("桌面", (0, 0, 1, 0.1))],
+        },
+        # ---------- 向日葵 ----------
+        "sunlogin.device": {
+            "package": "com.oray.sunlogin",
+            "elements": [_el("开机设备", (0, 0.1, 0.5, 0.15)), _el("排序", (0.8, 0.04, 1, 0.1))] + _SUNLOGIN_TABS,
+        },
+        "sunlogin.my": {
+            "package": "com.oray.sunlogin",
+            "elements": [
+                # 左上角扫码按钮没有文本和 ID，工作流按坐标点击
+                _el(className="android.widget.ImageView", bounds=(0.02, 0.04, 0.18, 0.12),
+                    goto="sunlogin.scan", delay=0.5),
+                _el("我的福利", (0, 0.3, 0.5, 0.35)),
+                _el("我的订单", (0.5, 0.3, 1, 0.35)),
+                _el("阳光小店", (0, 0.4, 0.5, 0.45)),
+            ] + _SUNLOGIN_TABS,
+        },
+        "sunlogin.scan": {
+            "package": "com.oray.sunlogin",
+            "elements": [
+                _el(className="android.view.View", resourceId="com.oray.sunlogin:id/scan_view", bounds=(0, 0.1, 1, 0.8)),
+                _el(className="android.widget.ImageView", resourceId="com.oray.sunlogin:id/iv_scan_pic",
+                    bounds=(0.8, 0.85, 0.95, 0.92), goto="album", delay=0.5),
+            ],
+        },
+        # ---------- 微信 ----------
+        "wechat.home": {
+            "package": "com.tencent.mm",
+            "elements": [
+                _el(className="android.widget.EditText", resourceId="com.tencent.mm:id/f8y",
+                    bounds=(0.05, 0.08, 0.95, 0.13), goto="wechat.search"),
+            ] + _WECHAT_TABS,
+        },
+        "wechat.discover": {
+            "package": "com.tencent.mm",
+            "elements": [_el("朋友圈", (0, 0.1, 1, 0.17)), _el("扫一扫", (0, 0.2, 1, 0.27), goto="wechat.scan", delay=0.5)]
+            + _WECHAT_TABS,
+        },
+        "wechat.scan": {
+            "package": "com.tencent.mm",
+            # 相册图标（带 content-desc，坐标校准按 description 查找）
+            "elements": [_el("相册", (0.8, 0.05, 1, 0.15), description="相册", goto="album", delay=0.5)],
+        },
+        "wechat.search": {
+            "package": "com.tencent.mm",
+            "elements": [
+                _el(className="android.widget.EditText", bounds=(0.05, 0.05, 0.95, 0.1), focus=True),
+                # 显示输入框中的文字（搜索结果），点击进入聊天页面
+                _el(bounds=(0, 0.15, 1, 0.22), echo_input=True, goto="wechat.chat"),
+            ],
+        },
+        "wechat.chat": {
+            "package": "com.tencent.mm",
+            "elements": [
+                _el(className="android.widget.EditText", bounds=(0, 0.9, 0.8, 1), focus=True),
+                _el("发送", (0.8, 0.9, 1, 1), className="android.widget.Button"),
+            ],
+        },
+        # ---------- 支付宝 ----------
+        "alipay.home": {
+            "package": "com.eg.android.AlipayGphone",
+            "elements": [_el("扫一扫", (0, 0.15, 0.25, 0.22), goto="alipay.scan", delay=0.5)],
+        },
+        "alipay.scan": {
+            "package": "com.eg.android.AlipayGphone",
+            # 相册图标（带 content-desc，坐标校准按 description 查找）
+            "elements": [_el("相册", (0.8, 0.05, 1, 0.15), description="相册", goto="album", delay=0.5)],
+        },
+        # ---------- 公共页面 ----------
+        "album": {
+            "package": "com.google.android.documentsui",
+            "elements": [_el("最近", (0, 0.05, 0.5, 0.12)), _album_grid("com.google.android.documentsui")],
+        },
+        "scan_result": {
+            "package": "com.android.launcher3",
+            "elements": [_el("识别成功", (0, 0.4, 1, 0.5))],
+        },
+    },
+}
+
+
+# ==================== 选择器 ====================
+
+class FakeSelector:
+    """模拟 uiautomator2 的 UiObject"""
+
+    def __init__(self, device: "FakeDevice", selector: dict, parent: Optional["FakeSelector"] = None):
+        unknown = set(selector) - _SELECTOR_KEYS
+        if unknown:
+            raise ValueError(f"模拟设备不支持的选择器参数: {sorted(unknown)}")
+        self.device = device
+        self.selector = selector
+        self.parent = parent
+
+    def _find_all(self) -> List[dict]:
+        """在当前页面中查找匹配的元素"""
+        if self.parent is None:
+            roots = self.device._screen()["elements"]
+        else:
+            roots = [child for element in self.parent._find_all() for child in element.get("children", [])]
+
+        matches = [element for element in _walk(roots) if self.device._matches(element, self.selector)]
+        instance = self.selector.get("instance")
+        if instance is not None:
+            return matches[instance:instance + 1]
+        return matches
+
+    def _find(self) -> Optional[dict]:
+        matches = self._find_all()
+        return matches[0] if matches else None
+
+    @property
+    def exists(self) -> bool:
+        """元素是否存在"""
+        self.device._rpc("exists")
+        return self._find() is not None
+
+    @property
+    def count(self) -> int:
+        """匹配的元素数量"""
+        self.device._rpc("count")
+        return len(self._find_all())
+
+    def __len__(self) -> int:
+        return self.count
+
+    def wait(self, exists: bool = True, timeout: Optional[float] = None) -> bool:
+        """等待元素出现（exists=False 时等待消失）"""
+        self.device._rpc("wait")
+        deadline = time.monotonic() + (self.device.wait_timeout if timeout is None else timeout)
+        while True:
+            if (self._find() is not None) == exists:
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(self.device.poll_interval, remaining))
+
+    def wait_gone(self, timeout: Optional[float] = None) -> bool:
+        """等待元素消失"""
+        return self.wait(exists=False, timeout=timeout)
+
+    def click(self, timeout: Optional[float] = None):
+        """点击元素（元素不存在时抛出 UiObjectNotFoundError）"""
+        if timeout:
+            self.wait(timeout=timeout)
+        self.device._rpc("click")
+        element = self._find()
+        if element is None:
+            raise UiObjectNotFoundError(f"元素不存在: {self.selector}")
+        self.device._tap(element)
+
+    def child(self, **selector) -> "FakeSelector":
+        """在匹配元素的子孙元素中查找"""
+        return FakeSelector(self.device, selector, parent=self)
+
+    def get_text(self, timeout: Optional[float] = None) -> str:
+        """元素文本（输入框为输入的文字）"""
+        if timeout:
+            self.wait(timeout=timeout)
+        element = self._find()
+        if element is not None and element.get("focus"):
+            self.device._rpc("info")
+            return self.device._input_text
+        return self.info["text"]
+
+    def set_text(self, text: str, timeout: Optional[float] = None):
+        """设置输入框文字"""
+        self.click(timeout)
+        self.device.send_keys(text or "", clear=True)
+
+    def clear_text(self, timeout: Optional[float] = None):
+        """清空输入框"""
+        self.set_text("", timeout)
+
+    @property
+    def info(self) -> dict:
+        """元素信息（字段与 uiautomator2 一致）"""
+        self.device._rpc("info")
+        element = self._find()
+        if element is None:
+            raise UiObjectNotFoundError(f"元素不存在: {self.selector}")
+        left, top, right, bottom = self.device._pixels(element["bounds"])
+        return {
+            "text": self.device._text(element),
+            "resourceName": element.get("resourceId"),
+            "className": element.get("className"),
+            "contentDescription": element.get("description"),
+            "bounds": {"left": left, "top": top, "right": right, "bottom": bottom},
+            "clickable": "goto" in element or element.get("focus", False),
+        }
+
+    def center(self) -> Tuple[int, int]:
+        """元素中心坐标"""
+        bounds = self.info["bounds"]
+        return (bounds["left"] + bounds["right"]) // 2, (bounds["top"] + bounds["bottom"]) // 2
+
+
+def _walk(elements: List[dict]):
+    """深度优先遍历元素树（跳过滚动到可见区域之外的元素）"""
+    for element in elements:
+        if element.get("hidden"):
+            continue
+        yield element
+        yield from _walk(element.get("children", []))
+
+
+# ==================== 设备 ====================
+
+class FakeDevice:
+    """模拟 uiautomator2 的 Device"""
+
+    def __init__(
+        self,
+        script: Optional[dict] = None,
+        width: int = 1080,
+        height: int = 2400,
+        rpc_latency: float = 0.0,
+        rpc_jitter: float = 0.0,
+        seed: Optional[int] = None,
+        rpc_latencies: Optional[Dict[str, float]] = None,
+    ):
+        """
+        初始化模拟设备
+
+        Args:
+            script: 界面脚本，默认为 DEFAULT_SCRIPT
+            width: 屏幕宽度（像素）
+            height: 屏幕高度（像素）
+            rpc_latency: 每次设备调用的模拟耗时（秒）
+            rpc_jitter: 耗时的随机波动（秒），实际耗时在 rpc_latency ± rpc_jitter 之间
+            seed: 随机数种子（固定后耗时波动可复现）
+            rpc_latencies: 按调用名指定耗时（秒），如 {"dump_hierarchy": 0.4}，未指定的调用使用 rpc_latency
+        """
+        self.script = copy.deepcopy(script or DEFAULT_SCRIPT)
+        self.width = width
+        self.height = height
+        self.rpc_latency = rpc_latency
+        self.rpc_jitter = rpc_jitter
+        self.rpc_latencies = dict(rpc_latencies or {})
+        self.wait_timeout = 20.0  # 与 uiautomator2 的默认等待时间一致
+        self.poll_interval = 0.05
+        self.delay_scale = 1.0  # 页面加载时间的缩放比例（基准测试缩短固定等待时同步缩短）
+        self.rpc_stats: Dict[str, dict] = {}  # 调用名 -> {"count", "time"}
+        self._random = random.Random(seed)
+        self._current = self.script["start"]
+        self._history: List[str] = []  # 返回键使用的页面栈
+        self._pending: Optional[Tuple[float, str]] = None  # (生效时间, 页面)，用于模拟页面加载
+        self._input_text = ""
+        self._clipboard = ""
+        for screen in self.script["screens"].values():
+            self._reset_scroll(screen)
+
+    @classmethod
+    def from_env(cls) -> "FakeDevice":
+        """根据环境变量创建模拟设备
+
+        QRCODE_FAKE_LATENCY: 每次设备调用的耗时（秒），默认 0
+        QRCODE_FAKE_JITTER: 耗时随机波动（秒），默认 0
+        QRCODE_FAKE_SCREEN: 屏幕分辨率，如 1080x2400
+        """
+        width, height = os.environ.get("QRCODE_FAKE_SCREEN", "1080x2400").lower().split("x")
+        return cls(
+            width=int(width),
+            height=int(height),
+            rpc_latency=float(os.environ.get("QRCODE_FAKE_LATENCY", 0)),
+            rpc_jitter=float(os.environ.get("QRCODE_FAKE_JITTER", 0)),
+        )
+
+    # ==================== 内部实现 ====================
+
+    def _rpc(self, name: str):
+        """模拟一次设备 RPC 的耗时并记录"""
+        delay = self.rpc_latencies.get(name, self.rpc_latency)
+        if self.rpc_jitter:
+            delay += self._random.uniform(-self.rpc_jitter, self.rpc_jitter)
+        delay = max(0.0, delay)
+        if delay:
+            time.sleep(delay)
+        stats = self.rpc_stats.setdefault(name, {"count": 0, "time": 0.0})
+        stats["count"] += 1
+        stats["time"] += delay
+
+    def _screen(self) -> dict:
+        """当前页面（页面切换的加载时间到达后生效）"""
+        if self._pending is not None and time.monotonic() >= self._pending[0]:
+            self._history.append(self._current)
+            self._current = self._pending[1]
+            self._pending = None
+            self._input_text = ""
+            self._reset_scroll(self.script["screens"][self._current])
+        return self.script["screens"][self._current]
+
+    def _goto(self, screen: str, delay: float = 0.0):
+        """切换页面（delay 秒后生效，期间仍显示原页面）"""
+        if screen not in self.script["screens"]:
+            raise KeyError(f"脚本中不存在页面: {screen}")
+        self._screen()  # 先让之前的切换生效
+        self._pending = (time.monotonic() + delay * self.delay_scale, screen)
+        if delay <= 0:
+            self._screen()
+
+    # ---------- 滚动 ----------
+
+    # 手指按下后移动这么多（屏幕高度的比例）才开始滚动，与真机的 touch slop 类似
+    TOUCH_SLOP = 0.005
+
+    # 松手时仍在移动会惯性滑动（fling），多滚动的比例
+    FLING = 0.3
+
+    def _reset_scroll(self, screen: dict):
+        """页面中的可滚动元素回到顶部"""
+        for element in _walk(screen["elements"]):
+            if element.get("scrollable"):
+                self._scroll_to(element, 0.0)
+
+    def _scroll_to(self, element: dict, offset: float):
+        """滚动到 offset（屏幕高度的比例），重新计算子元素的可见区域"""
+        children = element.get("children", [])
+        for child in children:
+            child.setdefault("content_bounds", child["bounds"])
+        left, top, right, bottom = element["bounds"]
+        content_bottom = max((child["content_bounds"][3] for child in children), default=bottom)
+        offset = min(max(0.0, offset), max(0.0, content_bottom - bottom))
+        element["offset"] = offset
+        for child in children:
+            c_left, c_top, c_right, c_bottom = child["content_bounds"]
+            c_top, c_bottom = max(top, c_top - offset), min(bottom, c_bottom - offset)
+            child["hidden"] = c_bottom <= c_top
+            child["bounds"] = (c_left, c_top, c_right, c_bottom)
+
+    def _scroll_at(self, x: int, y: int, distance: int, fling: bool):
+        """在 (x, y) 处向上滑动 distance 像素：滚动该处的可滚动元素"""
+        target = None
+        for element in _walk(self._screen()["elements"]):
+            left, top, right, bottom = self._pixels(element["bounds"])
+            if element.get("scrollable") and left <= x < right and top <= y < bottom:
+                target = element
+        if target is None:
+            return
+        delta = max(0.0, abs(distance) / self.height - self.TOUCH_SLOP)
+        if fling:
+            delta *= 1 + self.FLING
+        self._scroll_to(target, target["offset"] + (delta if distance > 0 else -delta))
+
+    def _text(self, element: dict) -> str:
+        if element.get("echo_input"):
+            return self._input_text
+        return element.get("text", "")
+
+    def _matches(self, element: dict, selector: dict) -> bool:
+        """元素是否匹配选择器"""
+        if element.get("echo_input") and not self._input_text:
+            return False  # 还没有输入内容时不显示
+        text = self._text(element)
+        description = element.get("description", "")
+        for key, value in selector.items():
+            if key == "instance":
+                continue
+            if key == "text" and text != value:
+                return False
+            if key == "textContains" and value not in text:
+                return False
+            if key == "textStartsWith" and not text.startswith(value):
+                return False
+            if key == "resourceId" and element.get("resourceId") != value:
+                return False
+            if key == "className" and element.get("className") != value:
+                return False
+            if key == "description" and description != value:
+                return False
+            if key == "descriptionContains" and value not in description:
+                return False
+            if key == "focused" and bool(element.get("focus")) != value:
+                return False
+        return True
+
+    def _pixels(self, bounds: Tuple[float, float, float, float]) -> Tuple[int, int, int, int]:
+        """相对坐标转为像素坐标"""
+        left, top, right, bottom = bounds
+        return int(left * self.width), int(top * self.height), int(right * self.width), int(bottom * self.height)
+
+    def _tap(self, element: dict):
+        """点击元素：输入框获得焦点，有 goto 的元素切换页面"""
+        if element.get("focus"):
+            return
+        if "goto" in element:
+            self._goto(element["goto"], element.get("delay", 0.0))
+
+    # ==================== uiautomator2 接口 ====================
+
+    def __call__(self, **selector) -> FakeSelector:
+        return FakeSelector(self, selector)
+
+    @property
+    def info(self) -> dict:
+        self._rpc("info")
+        return {
+            "currentPackageName": self._screen()["package"],
+            "displayWidth": self.width,
+            "displayHeight": self.height,
+            "displayRotation": 0,
+            "naturalOrientation": True,
+            "screenOn": True,
+            "sdkInt": 33,
+            "productName": "fake",
+            "brand": "Fake",
+            "model": "FakeDevice",
+            "version": "13",
+        }
+
+    def window_size(self) -> Tuple[int, int]:
+        self._rpc("window_size")
+        return self.width, self.height
+
+    def app_start(self, package_name: str, activity: Optional[str] = None, wait: bool = False, stop: bool = False):
+        self._rpc("app_start")
+        screen = self.script["apps"].get(package_name)
+        if screen is None:
+            raise RuntimeError(f"应用未安装: {package_name}")
+        self._history.clear()
+        self._goto(screen, self.script.get("launch_delay", 0.0))
+
+    def app_stop(self, package_name: str):
+        self._rpc("app_stop")
+        if self._screen()["package"] == package_name:
+            self._history.clear()
+            self._goto(self.script["start"])
+
+    def app_current(self) -> dict:
+        self._rpc("app_current")
+        return {"package": self._screen()["package"], "activity": self._current}
+
+    def click(self, x: int, y: int):
+        """按坐标点击：命中区域内最深层的可点击元素"""
+        self._rpc("click")
+        self._click_at(x, y)
+
+    def _click_at(self, x: int, y: int):
+        target = None
+        for element in _walk(self._screen()["elements"]):
+            left, top, right, bottom = self._pixels(element["bounds"])
+            if left <= x < right and top <= y < bottom and ("goto" in element or element.get("focus")):
+                target = element
+        if target is not None:
+            self._tap(target)
+
+    def swipe(self, fx: int, fy: int, tx: int, ty: int, duration: Optional[float] = None, steps: Optional[int] = None):
+        self._rpc("swipe")
+        self._scroll_at(fx, fy, fy - ty, fling=True)
+
+    def swipe_points(self, points: List[Tuple[int, int]], duration: float = 0.5):
+        """按顺序经过各点滑动（最后两个点相同时松手前停住，不会惯性滑动）"""
+        self._rpc("swipe_points")
+        if len(points) >= 2:
+            (fx, fy), (_, ty) = points[0], points[-1]
+            self._scroll_at(fx, fy, fy - ty, fling=tuple(points[-2]) != tuple(points[-1]))
+
+    def swipe_ext(self, direction: str, scale: float = 0.9, box=None, **kwargs):
+        self._rpc("swipe_ext")
+
+    def press(self, key):
+        self._rpc("press")
+        self._press(key)
+
+    def _press(self, key):
+        if key == 279:  # KEYCODE_PASTE
+            self._input_text += self._clipboard
+        elif key == "back":
+            self._screen()
+            if self._history:
+                self._current = self._history.pop()
+                self._input_text = ""
+        elif key == "home":
+            self._history.clear()
+            self._goto(self.script["start"])
+
+    def shell(self, cmdargs, timeout: float = 60) -> ShellResponse:
+        """执行 shell 命令：只支持手势宏用到的 input tap / swipe / keyevent、sleep 和时间标记（见 gestures.py）"""
+        self._rpc("shell")
+        command = cmdargs if isinstance(cmdargs, str) else " ".join(cmdargs)
+        output = []
+        for part in command.split(";"):
+            args = part.split()
+            if not args:
+                continue
+            if args[0] == "echo" and "/proc/uptime)" in part:
+                output.append(f"{args[1]} {time.monotonic():.2f}")
+            elif args[:2] == ["input", "tap"]:
+                self._click_at(int(args[2]), int(args[3]))
+            elif args[:2] == ["input", "swipe"]:
+                if len(args) > 6:
+                    time.sleep(int(args[6]) / 1000)
+                self._scroll_at(int(args[2]), int(args[3]), int(args[3]) - int(args[5]), fling=True)
+            elif args[:2] == ["input", "keyevent"]:
+                self._press(_KEYS.get(int(args[2]), args[2]))
+            elif args[0] == "sleep":
+                time.sleep(float(args[1]) * self.delay_scale)
+            else:
+                return ShellResponse(f"/system/bin/sh: {args[0]}: not supported by FakeDevice\n", 127)
+        return ShellResponse("\n".join(output) + "\n", 0)
+
+    def set_clipboard(self, text: str, label: Optional[str] = None):
+        self._rpc("set_clipboard")
+        self._clipboard = text
+
+    def send_keys(self, text: str, clear: bool = False):
+        self._rpc("send_keys")
+        self._input_text = text if clear else self._input_text + text
+
+    def clear_text(self):
+        self._rpc("clear_text")
+        self._input_text = ""
+
+    def dump_hierarchy(self, compressed: bool = False, pretty: bool = False, max_depth: Optional[int] = None) -> str:
+        """导出当前页面的界面结构（uiautomator 的 XML 格式）"""
+        self._rpc("dump_hierarchy")
+        screen = self._screen()
+        root = ET.Element("hierarchy", rotation="0")
+
+        def add(parent: ET.Element, elements: List[dict]):
+            for index, element in enumerate(elements):
+                if (element.get("echo_input") and not self._input_text) or element.get("hidden"):
+                    continue
+                left, top, right, bottom = self._pixels(element["bounds"])
+                node = ET.SubElement(
+                    parent,
+                    "node",
+                    index=str(index),
+                    text=self._text(element),
+                    **{
+                        "resource-id": element.get("resourceId") or "",
+                        "class": element.get("className", ""),
+                        "package": screen["package"],
+                        "content-desc": element.get("description", ""),
+                        "clickable": "true" if "goto" in element or element.get("focus") else "false",
+                        "scrollable": "true" if element.get("scrollable") else "false",
+                        "bounds": f"[{left},{top}][{right},{bottom}]",
+                    },
+                )
+                add(node, element.get("children", []))
+
+        add(root, screen["elements"])
+        if pretty:
+            ET.indent(root)
+        return ET.tostring(root, encoding="unicode")
+
+    def screenshot(self, filename: Optional[str] = None, format: str = "pillow"):
+        """截图：绘制当前页面各元素的边框（需要 Pillow）"""
+        self._rpc("screenshot")
+        from PIL import Image, ImageDraw
+
+        image = Image.new("RGB", (self.width, self.height), "white")
+        draw = ImageDraw.Draw(image)
+        for element in _walk(self._screen()["elements"]):
+            draw.rectangle(self._pixels(element["bounds"]), outline="gray")
+
+        if filename:
+            image.save(filename)
+            return filename
+        return image
+
+    # ==================== 统计 ====================
+
+    def reset_stats(self):
+        """清空 RPC 统计"""
+        self.rpc_stats.clear()
+
+    @property
+    def current_screen(self) -> str:
+        """当前页面名称（用于测试断言）"""
+        self._screen()
+        return self._current
@@ -0,0 +1,161 @@
+"""原始截图 - 通过 adb 读取 screencap 的原始像素，直接得到 numpy 数组，不经过 PNG 编解码
+
+uiautomator2 的截图在设备上编码 PNG、在本机解码，1080x2400 的屏幕每帧要几百毫秒。
+`screencap` 不加 -p 时输出原始像素：头部（宽、高、像素格式，Android 9 起多 4 字节色彩空间）之后是
+逐行的 RGBA 数据。这里通过 exec: 服务读取（不经过终端转换），写入复用的缓冲区，返回其上的 numpy 视图：
+
+    raw = framebuffer.RawScreencap(device)
+    pixels = raw.capture()                          # 高 x 宽 x 4（RGBA）的视图，下次 capture 时会被覆盖
+    roi = raw.capture(region=(0.5, 0, 1, 0.3))      # 只取右上角（同样是视图，不复制）
+    gray = framebuffer.gray(roi)                    # 只对关注区域做灰度转换
+
+没有 adb 连接的设备（如模拟设备）退回为普通截图再转成数组，接口相同。需要 numpy。
+"""
+import struct
+from typing import Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # 未安装 numpy 时不能使用原始截图
+    np = None
+
+import instrumentation
+
+# 支持的 Android PixelFormat（只支持每像素 4 字节的格式，其余退回普通截图）
+PIXEL_FORMATS = {
+    1: "RGBA_8888",
+    2: "RGBX_8888",
+    5: "BGRA_8888",
+}
+
+HEADER_SIZE = 12  # 宽、高、像素格式（各 4 字节，小端）
+COLORSPACE_SIZE = 4  # Android 9 起头部之后的色彩空间字段
+
+Region = Tuple[float, float, float, float]
+
+
+def crop(pixels: "np.ndarray", region: Optional[Region]) -> "np.ndarray":
+    """按屏幕比例 (左, 上, 右, 下) 截取区域（返回视图，不复制）"""
+    if not region:
+        return pixels
+    height, width = pixels.shape[:2]
+    return pixels[int(region[1] * height):int(region[3] * height), int(region[0] * width):int(region[2] * width)]
+
+
+def gray(pixels: "np.ndarray") -> "np.ndarray":
+    """RGB(A) 数组 -> float32 灰度图（权重与 PIL 的 L 模式一致）"""
+    return pixels[..., 0] * np.float32(0.299) + pixels[..., 1] * np.float32(0.587) + pixels[..., 2] * np.float32(0.114)
+
+
+def to_image(pixels: "np.ndarray"):
+    """RGB(A) 数组 -> PIL 图像（复制像素，可以在下次截图后继续使用）"""
+    from PIL import Image
+
+    return Image.fromarray(np.ascontiguousarray(pixels[..., :3]))
+
+
+def difference(previous: "np.ndarray", current: "np.ndarray", step: int = 4) -> float:
+    """
+    两帧的差异程度（每隔 step 个像素取样，RGB 平均绝对差 / 255，0 表示完全相同）
+
+    Args:
+        previous: 上一帧（RGB(A) 数组，区域相同）
+        current: 当前帧
+        step: 取样间隔，越大越快
+
+    Returns:
+        0 ~ 1 之间的差异值
+    """
+    a = previous[::step, ::step, :3].astype(np.int16)
+    b = current[::step, ::step, :3].astype(np.int16)
+    return float(np.abs(a - b).mean() / 255)
+
+
+class RawScreencap:
+    """读取设备的原始截图（复用同一块缓冲区）"""
+
+    def __init__(self, device, timeout: float = 10.0):
+        """
+        初始化
+
+        Args:
+            device: uiautomator2 设备（通过其 adb_device 读取），没有 adb 连接的设备退回普通截图
+            timeout: 读取超时时间（秒）
+        """
+        if np is None:
+            raise RuntimeError("原始截图需要 numpy，请执行: uv pip install numpy")
+        self.device = device
+        self.timeout = timeout
+        self.adb = getattr(device, "adb_device", None)
+        self._buffer = bytearray()
+        self._unsupported_format = None  # 遇到不支持的像素格式后不再尝试原始截图
+
+    @property
+    def raw(self) -> bool:
+        """是否使用原始截图（否则为普通截图）"""
+        return self.adb is not None and self._unsupported_format is None
+
+    def _read(self) -> Tuple[int, int, int, Optional[memoryview]]:
+        """读取一帧原始数据，返回 (宽, 高, 像素格式, 像素数据)，格式不支持时像素数据为 None"""
+        conn = self.adb.open_transport(timeout=self.timeout)
+        try:
+            conn.send_command("exec:screencap")
+            conn.check_okay()
+            sock = conn.conn
+            header = bytearray(HEADER_SIZE)
+            self._recv_into(sock, memoryview(header))
+            width, height, pixel_format = struct.unpack("<III", header)
+            if pixel_format not in PIXEL_FORMATS:
+                return width, height, pixel_format, None
+
+            # 按最大可能的长度（带色彩空间字段）准备缓冲区，读到连接关闭为止
+            size = width * height * 4
+            if len(self._buffer) < size + COLORSPACE_SIZE:
+                self._buffer = bytearray(size + COLORSPACE_SIZE)
+            view = memoryview(self._buffer)
+            received = self._recv_into(sock, view[:size + COLORSPACE_SIZE], until_close=True)
+        finally:
+            conn.close()
+
+        offset = received - size  # 0（旧版本）或 4（带色彩空间字段）
+        if offset not in (0, COLORSPACE_SIZE):
+            raise RuntimeError(f"原始截图长度不正确: {received}（{width}x{height}，格式 {pixel_format}）")
+        return width, height, pixel_format, view[offset:offset + size]
+
+    @staticmethod
+    def _recv_into(sock, view: memoryview, until_close: bool = False) -> int:
+        """读满 view（until_close 时读到连接关闭），返回读取的字节数"""
+        received = 0
+        while received < len(view):
+            count = sock.recv_into(view[received:])
+            if count == 0:
+                if until_close:
+                    break
+                raise ConnectionError("读取原始截图时连接断开")
+            received += count
+        return received
+
+    def capture(self, region: Optional[Region] = None) -> "np.ndarray":
+        """
+        截图
+
+        Args:
+            region: 只返回该区域，(左, 上, 右, 下) 为屏幕宽高的比例
+
+        Returns:
+            高 x 宽 x 4 的 uint8 数组（RGBA 顺序）。原始截图时是缓冲区上的视图，下次 capture 会被覆盖，
+            需要保留时请 copy()
+        """
+        with instrumentation.span("rpc", "screencap"):
+            if self.raw:
+                width, height, pixel_format, data = self._read()
+                if data is not None:
+                    pixels = np.frombuffer(data, dtype=np.uint8).reshape(height, width, 4)
+                    if PIXEL_FORMATS[pixel_format] == "BGRA_8888":
+                        pixels = pixels[..., [2, 1, 0, 3]]  # 调整为 RGBA（会复制）
+                    return crop(pixels, region)
+                # 16 位等格式的设备很少见，记下后改用普通截图
+                self._unsupported_format = pixel_format
+
+            image = self.device.screenshot(format="pillow")
+            return crop(np.asarray(image.convert("RGBA")), region)
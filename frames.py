@@ -0,0 +1,160 @@
+"""截图帧 - 只在内存中处理的截图，以及每台设备最近几帧的环形缓冲区
+
+截图在内存中完成裁剪、缩放和 JPEG 压缩，不写磁盘（除非指定文件名）：
+    image = frames.process(device.screenshot(format="pillow"), scale=0.5, region=(0, 0, 1, 0.3))
+    jpeg = frames.encode_jpeg(image)
+
+每台设备有一个环形缓冲区，保存最近 QRCODE_FRAME_BUFFER 帧（JPEG），工作流失败时把执行期间的帧附加到结果中，
+便于事后排查（见 Actions.capture / Actions.capture_failure）：
+    buffer = frames.buffer_for(actions.device_key)
+    buffer.add(image, label="click_album")
+    buffer.export(since=start_time)  # [{"time", "label", "width", "height", "jpeg_base64"}, ...]
+
+环境变量：
+    QRCODE_FRAME_BUFFER    每台设备保留的帧数（默认 5）
+    QRCODE_FAILURE_FRAMES  失败结果最多附带的帧数（默认 3，0 表示不附带）
+"""
+import base64
+import io
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # 未安装 numpy 时不能返回数组格式
+    np = None
+
+BUFFER_SIZE = int(os.environ.get("QRCODE_FRAME_BUFFER", "5"))
+FAILURE_FRAMES = int(os.environ.get("QRCODE_FAILURE_FRAMES", "3"))
+
+# 缓冲区中的帧统一缩放到的比例和 JPEG 质量（只用于排查，够看清界面即可）
+BUFFER_SCALE = 0.5
+BUFFER_QUALITY = 60
+
+Region = Tuple[float, float, float, float]
+
+
+def process(image, scale: float = 1.0, region: Optional[Region] = None):
+    """
+    裁剪并缩放截图
+
+    Args:
+        image: PIL 图像
+        scale: 缩放比例（1 为原始分辨率）
+        region: 裁剪区域，(左, 上, 右, 下) 为屏幕宽高的比例
+
+    Returns:
+        PIL 图像
+    """
+    if region:
+        width, height = image.size
+        image = image.crop((int(region[0] * width), int(region[1] * height),
+                            int(region[2] * width), int(region[3] * height)))
+    if abs(scale - 1.0) > 1e-3:
+        width, height = image.size
+        image = image.resize((max(1, int(width * scale)), max(1, int(height * scale))))
+    return image
+
+
+def encode_jpeg(image, quality: int = 70) -> bytes:
+    """PIL 图像 -> JPEG 字节"""
+    buffer = io.BytesIO()
+    image.convert("RGB").save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def to_array(image) -> "np.ndarray":
+    """PIL 图像 -> RGB uint8 数组（高 x 宽 x 3）"""
+    if np is None:
+        raise RuntimeError("返回数组格式需要 numpy，请执行: uv pip install numpy")
+    return np.asarray(image.convert("RGB"))
+
+
+class FrameBuffer:
+    """一台设备最近 N 帧截图（JPEG）"""
+
+    def __init__(self, size: int = BUFFER_SIZE):
+        """
+        初始化缓冲区
+
+        Args:
+            size: 保留的帧数，超出时丢弃最早的帧
+        """
+        self._frames: deque = deque(maxlen=max(1, size))
+        self._lock = threading.Lock()
+
+    def add(self, image, label: str = "", scale: float = BUFFER_SCALE) -> dict:
+        """
+        添加一帧（缩放后压缩为 JPEG）
+
+        Args:
+            image: PIL 图像
+            label: 标签（如截图时所在的操作）
+            scale: 缩放比例，默认按 BUFFER_SCALE 缩小原始截图
+
+        Returns:
+            帧字典
+        """
+        image = process(image, scale)
+        frame = {"time": time.time(), "label": label, "width": image.width, "height": image.height,
+                 "jpeg": encode_jpeg(image, BUFFER_QUALITY)}
+        with self._lock:
+            self._frames.append(frame)
+        return frame
+
+    def frames(self, since: Optional[float] = None) -> List[dict]:
+        """按时间顺序返回缓冲区中的帧（since 之后的）"""
+        with self._lock:
+            frames = list(self._frames)
+        if since is not None:
+            frames = [frame for frame in frames if frame["time"] >= since]
+        return frames
+
+    def export(self, since: Optional[float] = None, limit: Optional[int] = None) -> List[dict]:
+        """
+        导出为可以放入 JSON 结果的形式
+
+        Args:
+            since: 只导出该时间（time.time()）之后的帧
+            limit: 最多导出最近的几帧
+
+        Returns:
+            [{"time", "label", "width", "height", "jpeg_base64"}, ...]
+        """
+        frames = self.frames(since)
+        if limit is not None:
+            frames = frames[-limit:] if limit > 0 else []
+        return [
+            {
+                "time": round(frame["time"], 3),
+                "label": frame["label"],
+                "width": frame["width"],
+                "height": frame["height"],
+                "jpeg_base64": base64.b64encode(frame["jpeg"]).decode("ascii"),
+            }
+            for frame in frames
+        ]
+
+    def clear(self):
+        """清空缓冲区"""
+        with self._lock:
+            self._frames.clear()
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+
+_buffers: Dict[object, FrameBuffer] = {}
+_buffers_lock = threading.Lock()
+
+
+def buffer_for(key) -> FrameBuffer:
+    """获取设备的帧缓冲区（key 为 Actions.device_key）"""
+    with _buffers_lock:
+        buffer = _buffers.get(key)
+        if buffer is None:
+            buffer = _buffers[key] = FrameBuffer()
+        return buffer
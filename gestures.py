@@ -0,0 +1,179 @@
+"""手势宏 - 把一串点击、滑动、按键和短暂等待合成一个 shell 脚本，一次设备调用执行完
+
+按坐标操作时，每次点击、滑动都是一次单独的设备调用，之后还要固定等待 0.5 秒。
+手势宏把整串操作编译为一条 `input` 命令组成的 shell 脚本，在设备上连续执行：
+
+    result = (
+        actions.macro()
+        .tap(972, 240)                # 点击
+        .sleep(2)                     # 等待页面打开（在设备上等待，不占用设备调用）
+        .swipe(540, 1800, 540, 600, duration=0.3)
+        .key("back")
+        .run()
+    )
+    result["gestures"]                # [{"gesture": "tap 972 240", "duration": 0.31}, ...]
+
+每个手势前后读取 /proc/uptime 记录时间（精度 10 毫秒），返回每个手势在设备上的耗时。
+注意 `input` 命令每次都要启动一个进程（约 100~300 毫秒），宏节省的是往返和固定等待，不是单个手势的耗时。
+
+设备不支持 shell 时（如录制回放用的设备）按顺序逐个执行，返回格式相同。
+"""
+import re
+import time
+from typing import List, Optional, Union
+
+# 常用按键 -> Android KeyEvent 代码
+KEYCODES = {
+    "home": 3,
+    "back": 4,
+    "enter": 66,
+    "delete": 67,
+    "menu": 82,
+    "recent": 187,
+}
+
+# 时间标记的输出前缀
+_MARK = "@@"
+_MARK_LINE = re.compile(rf"^{_MARK} (\d+(?:\.\d+)?)", re.MULTILINE)
+
+
+def _keycode(key: Union[str, int]) -> int:
+    """按键名或代码 -> KeyEvent 代码"""
+    if isinstance(key, int):
+        return key
+    if key.isdigit():
+        return int(key)
+    if key not in KEYCODES:
+        raise ValueError(f"不支持的按键: {key}（可选: {', '.join(KEYCODES)}，或直接使用 KeyEvent 代码）")
+    return KEYCODES[key]
+
+
+class Macro:
+    """手势宏：链式添加手势，run() 时一次执行"""
+
+    def __init__(self, actions=None):
+        """
+        初始化
+
+        Args:
+            actions: 执行宏的操作对象（Actions.macro() 创建时传入）
+        """
+        self.actions = actions
+        self.gestures: List[dict] = []
+
+    def tap(self, x: int, y: int) -> "Macro":
+        """点击坐标"""
+        self.gestures.append({"type": "tap", "x": int(x), "y": int(y)})
+        return self
+
+    def swipe(self, fx: int, fy: int, tx: int, ty: int, duration: float = 0.3) -> "Macro":
+        """从 (fx, fy) 滑动到 (tx, ty)，duration 为滑动时间（秒）"""
+        self.gestures.append({"type": "swipe", "fx": int(fx), "fy": int(fy), "tx": int(tx), "ty": int(ty),
+                              "duration": duration})
+        return self
+
+    def key(self, key: Union[str, int]) -> "Macro":
+        """按键（back / home / enter 等，或 KeyEvent 代码）"""
+        self.gestures.append({"type": "key", "key": key, "code": _keycode(key)})
+        return self
+
+    def sleep(self, seconds: float) -> "Macro":
+        """在设备上等待"""
+        if seconds > 0:
+            self.gestures.append({"type": "sleep", "seconds": seconds})
+        return self
+
+    def run(self) -> dict:
+        """执行宏（见 Actions.run_macro）"""
+        if self.actions is None:
+            raise RuntimeError("手势宏没有关联的操作对象，请通过 actions.macro() 创建")
+        return self.actions.run_macro(self)
+
+    def __len__(self) -> int:
+        return len(self.gestures)
+
+    # ---------- 编译 ----------
+
+    def compile(self) -> str:
+        """
+        编译为一行 shell 脚本：每个手势之前和最后一个手势之后输出一个时间标记
+
+        Returns:
+            shell 脚本
+        """
+        mark = f"echo {_MARK} $(cut -d' ' -f1 /proc/uptime)"
+        commands = [mark]
+        for gesture in self.gestures:
+            commands.append(command(gesture))
+            commands.append(mark)
+        return "; ".join(commands)
+
+
+def command(gesture: dict) -> str:
+    """单个手势对应的 shell 命令"""
+    kind = gesture["type"]
+    if kind == "tap":
+        return f"input tap {gesture['x']} {gesture['y']}"
+    if kind == "swipe":
+        return (f"input swipe {gesture['fx']} {gesture['fy']} {gesture['tx']} {gesture['ty']} "
+                f"{int(gesture['duration'] * 1000)}")
+    if kind == "key":
+        return f"input keyevent {gesture['code']}"
+    if kind == "sleep":
+        return f"sleep {gesture['seconds']:g}"
+    raise ValueError(f"未知的手势: {kind}")
+
+
+def describe(gesture: dict) -> str:
+    """手势的简短描述（用于报告）"""
+    return command(gesture).replace("input ", "", 1)
+
+
+def parse_marks(output: str) -> List[float]:
+    """从脚本输出中取出时间标记（秒）"""
+    return [float(value) for value in _MARK_LINE.findall(output)]
+
+
+def timings(macro: Macro, marks: List[float]) -> List[dict]:
+    """
+    按时间标记计算每个手势的耗时
+
+    Args:
+        macro: 手势宏
+        marks: 时间标记（比手势数多一个，执行中断时可能更少）
+
+    Returns:
+        [{"gesture": 描述, "duration": 秒（没有执行完时为 None）}, ...]
+    """
+    result = []
+    for index, gesture in enumerate(macro.gestures):
+        duration: Optional[float] = None
+        if index + 1 < len(marks):
+            duration = round(marks[index + 1] - marks[index], 3)
+        result.append({"gesture": describe(gesture), "duration": duration})
+    return result
+
+
+def run_local(device, macro: Macro) -> List[dict]:
+    """
+    逐个执行手势（设备不支持 shell 时使用），返回每个手势的耗时
+
+    Args:
+        device: 设备对象
+        macro: 手势宏
+    """
+    result = []
+    for gesture in macro.gestures:
+        start = time.perf_counter()
+        kind = gesture["type"]
+        if kind == "tap":
+            device.click(gesture["x"], gesture["y"])
+        elif kind == "swipe":
+            device.swipe(gesture["fx"], gesture["fy"], gesture["tx"], gesture["ty"], duration=gesture["duration"])
+        elif kind == "key":
+            key = gesture["key"]
+            device.press(key if isinstance(key, str) and not key.isdigit() else gesture["code"])
+        elif kind == "sleep":
+            time.sleep(gesture["seconds"])
+        result.append({"gesture": describe(gesture), "duration": round(time.perf_counter() - start, 3)})
+    return result
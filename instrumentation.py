@@ -0,0 +1,415 @@
+"""操作埋点 - 记录 Actions 方法和设备调用的耗时
+
+Actions 的每个方法以及它触发的每次设备调用（uiautomator2 RPC）、每次固定等待都会产生一个事件，
+分发给已注册的处理器（handler）。没有注册处理器时只多一次列表判断，开销可以忽略。
+
+事件是一个字典：
+    kind       action（Actions 方法）/ rpc（设备调用）/ sleep（固定等待）/ task（服务端任务重新排队）
+    name       方法名或设备调用名，如 click_by_text、wait、app_start
+    parent     所在的 Actions 方法（rpc / sleep 事件），没有时为 None
+    app        所在的应用（在 workflow_context() 中执行时），没有时为 None
+    workflow   所在的工作流
+    locator    定位方式：text / resourceId / coordinate / image（只有定位元素的方法有）
+    start      开始时间（time.time()）
+    duration   耗时（秒，on_end 时才有）
+    ok         是否成功：抛出异常、元素等待超时、方法返回 False（查询类方法除外）都记为 False
+    timeout    是否等待超时（wait 返回 False）
+    retries    重试次数（由调用方通过 record_retry() 记录：等待元素时关闭弹窗后重新等待、输入文字换一种方式、
+               服务端任务按重试策略重新排队）
+    error      异常信息
+
+使用方法：
+    import instrumentation
+
+    histogram = instrumentation.HistogramHandler()
+    instrumentation.add_handler(histogram)
+    instrumentation.add_handler(instrumentation.JSONLHandler("trace.jsonl"))
+    ...
+    print(histogram.summary())
+"""
+import functools
+import inspect
+import json
+import logging
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Union
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+_handlers: List["Handler"] = []
+_local = threading.local()  # 每个线程当前正在执行的事件栈
+
+
+# ==================== 处理器注册 ====================
+
+def add_handler(handler: "Handler"):
+    """注册处理器"""
+    if handler not in _handlers:
+        _handlers.append(handler)
+
+
+def remove_handler(handler: "Handler"):
+    """移除处理器"""
+    if handler in _handlers:
+        _handlers.remove(handler)
+
+
+def clear_handlers():
+    """移除所有处理器"""
+    _handlers.clear()
+
+
+def enabled() -> bool:
+    """是否有处理器（没有时不产生任何事件）"""
+    return bool(_handlers)
+
+
+# ==================== 事件 ====================
+
+def _stack() -> list:
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def current() -> Optional[dict]:
+    """当前线程正在执行的最内层事件"""
+    stack = _stack()
+    return stack[-1] if stack else None
+
+
+def record_retry(count: int = 1):
+    """给当前正在执行的 Actions 方法（或服务端的 task 事件）记重试次数"""
+    stack = _stack()
+    for event in reversed(stack):
+        if event["kind"] in ("action", "task"):
+            event["retries"] += count
+            return
+
+
+class workflow_context:
+    """标记当前线程正在执行的工作流，期间产生的事件带上 app / workflow 字段"""
+
+    def __init__(self, app: str, workflow: str):
+        self.context = (app, workflow)
+
+    def __enter__(self):
+        self._previous = getattr(_local, "workflow", None)
+        _local.workflow = self.context
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _local.workflow = self._previous
+        return False
+
+
+def _emit(method: str, event: dict):
+    for handler in list(_handlers):
+        try:
+            getattr(handler, method)(event)
+        except Exception as e:  # 处理器出错不能影响自动化流程
+            logger.warning("⚠️ 埋点处理器 %s 出错: %s", type(handler).__name__, e)
+
+
+class span:
+    """记录一段操作的上下文管理器（没有处理器时什么都不做）"""
+
+    __slots__ = ("event", "_started")
+
+    def __init__(self, kind: str, name: str, locator: Optional[str] = None):
+        self.event = None
+        if not _handlers:
+            return
+        stack = _stack()
+        parent = next((e["name"] for e in reversed(stack) if e["kind"] == "action"), None)
+        app, workflow = getattr(_local, "workflow", None) or (None, None)
+        self.event = {
+            "kind": kind,
+            "name": name,
+            "parent": parent,
+            "app": app,
+            "workflow": workflow,
+            "locator": locator,
+            "start": time.time(),
+            "duration": None,
+            "ok": True,
+            "timeout": False,
+            "retries": 0,
+            "error": None,
+        }
+
+    def __enter__(self) -> Optional[dict]:
+        if self.event is not None:
+            _stack().append(self.event)
+            _emit("on_start", self.event)
+            self._started = time.perf_counter()
+        return self.event
+
+    def __exit__(self, exc_type, exc, tb):
+        event = self.event
+        if event is None:
+            return False
+        event["duration"] = time.perf_counter() - self._started
+        if exc is not None:
+            event["ok"] = False
+            event["error"] = f"{exc_type.__name__}: {exc}"
+        stack = _stack()
+        if stack and stack[-1] is event:
+            stack.pop()
+        if event["timeout"] and event["parent"]:
+            # 方法内的等待超时同时记在方法上
+            for outer in reversed(stack):
+                if outer["kind"] == "action":
+                    outer["timeout"] = True
+                    break
+        _emit("on_end", event)
+        return False
+
+
+def instrumented(
+    locator: Union[str, Callable[[dict], Optional[str]], None] = None,
+    kind: str = "action",
+    name: Optional[str] = None,
+    false_is_failure: bool = True,
+):
+    """
+    Actions 方法装饰器
+
+    Args:
+        locator: 定位方式，或根据调用参数返回定位方式的函数
+        kind: 事件类型
+        name: 事件名称，默认为方法名
+        false_is_failure: 方法返回 False 时是否记为失败（查询类方法返回 False 是正常结果）
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        event_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _handlers:
+                return func(*args, **kwargs)
+
+            strategy = locator
+            if callable(locator):
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                strategy = locator(bound.arguments)
+
+            with span(kind, event_name, strategy) as event:
+                result = func(*args, **kwargs)
+                if result is False and false_is_failure:
+                    event["ok"] = False
+                return result
+
+        return wrapper
+
+    return decorator
+
+
+# ==================== 设备代理 ====================
+
+class InstrumentedObject:
+    """设备 / 选择器代理：把每次设备调用记为 rpc 事件
+
+    uiautomator2 中属性访问也会产生设备调用（info、exists 等），同样记录。
+    exists 会直接转为 bool（uiautomator2 在转换时才真正查询）。
+    """
+
+    # 只构造选择器、不产生设备调用的方法
+    _BUILDERS = ("child", "sibling")
+
+    def __init__(self, target):
+        object.__setattr__(self, "_target", target)
+
+    def __call__(self, *args, **kwargs):
+        return InstrumentedObject(self._target(*args, **kwargs))
+
+    def __getattr__(self, name: str):
+        target = self._target
+        if name.startswith("_"):
+            return getattr(target, name)
+        if name in self._BUILDERS:
+            builder = getattr(target, name)
+            return lambda *args, **kwargs: InstrumentedObject(builder(*args, **kwargs))
+
+        if isinstance(getattr(type(target), name, None), property):
+            with span("rpc", name):
+                value = getattr(target, name)
+                return bool(value) if name == "exists" else value
+
+        value = getattr(target, name)
+        if not callable(value):
+            return value
+
+        def call(*args, **kwargs):
+            with span("rpc", name) as call_event:
+                result = value(*args, **kwargs)
+                if name in ("wait", "wait_gone") and result is False and call_event is not None:
+                    call_event["ok"] = False
+                    call_event["timeout"] = True
+                return result
+
+        return call
+
+    def __setattr__(self, name: str, value):
+        setattr(self._target, name, value)
+
+
+# ==================== 处理器 ====================
+
+class Handler:
+    """处理器基类"""
+
+    def on_start(self, event: dict):
+        """事件开始"""
+
+    def on_end(self, event: dict):
+        """事件结束（event["duration"] 已填写）"""
+
+
+def _percentile(ordered: List[float], p: float) -> float:
+    index = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class HistogramHandler(Handler):
+    """内存中的耗时统计（每个 kind.name 保留最近 max_samples 个样本）"""
+
+    def __init__(self, max_samples: int = 10000):
+        self.max_samples = max_samples
+        self._samples: Dict[str, deque] = {}
+        self._counts: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def on_end(self, event: dict):
+        key = f"{event['kind']}.{event['name']}"
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.max_samples)
+                self._counts[key] = {"count": 0, "failures": 0, "timeouts": 0, "retries": 0, "locators": {}}
+            samples.append(event["duration"])
+            counts = self._counts[key]
+            counts["count"] += 1
+            counts["failures"] += 0 if event["ok"] else 1
+            counts["timeouts"] += 1 if event["timeout"] else 0
+            counts["retries"] += event["retries"]
+            if event["locator"]:
+                counts["locators"][event["locator"]] = counts["locators"].get(event["locator"], 0) + 1
+
+    def summary(self) -> Dict[str, dict]:
+        """各操作的次数、失败 / 超时 / 重试次数和耗时分位数（毫秒）"""
+        with self._lock:
+            result = {}
+            for key, samples in sorted(self._samples.items()):
+                ordered = sorted(samples)
+                result[key] = dict(
+                    self._counts[key],
+                    p50_ms=round(_percentile(ordered, 50) * 1000, 2),
+                    p95_ms=round(_percentile(ordered, 95) * 1000, 2),
+                    p99_ms=round(_percentile(ordered, 99) * 1000, 2),
+                    max_ms=round(ordered[-1] * 1000, 2),
+                )
+            return result
+
+    def reset(self):
+        """清空统计"""
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+
+
+class JSONLHandler(Handler):
+    """把每个结束的事件写成一行 JSON"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def on_end(self, event: dict):
+        line = json.dumps(event, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        """关闭文件"""
+        with self._lock:
+            self._file.close()
+
+
+class PrometheusHandler(Handler):
+    """Prometheus 指标：按操作（及所在的应用 / 工作流）统计耗时直方图、超时和重试次数"""
+
+    RPC_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+    def __init__(self, registry: Optional[metrics.Registry] = None, prefix: str = "qrcode_helper_"):
+        """
+        初始化
+
+        Args:
+            registry: 指标注册表，默认新建一个独立的注册表（HTTP 服务使用 metrics.REGISTRY）
+            prefix: 新建注册表时的指标名前缀
+        """
+        self.registry = registry or metrics.Registry(prefix=prefix)
+        labels = ["kind", "name", "app", "workflow", "status"]
+        self.duration = self.registry.histogram(
+            "operation_duration_seconds",
+            "Duration of Actions methods, device RPCs and fixed sleeps.",
+            labels,
+            buckets=self.RPC_BUCKETS,
+        )
+        self.timeouts = self.registry.counter(
+            "operation_timeouts_total", "Element waits that timed out.", labels[:4]
+        )
+        self.retries = self.registry.counter(
+            "operation_retries_total", "Retries recorded by Actions methods.", labels[:4]
+        )
+
+    def on_end(self, event: dict):
+        labels = {
+            "kind": event["kind"],
+            "name": event["name"],
+            "app": event["app"] or "",
+            "workflow": event["workflow"] or "",
+        }
+        self.duration.observe(event["duration"], status="ok" if event["ok"] else "error", **labels)
+        if event["timeout"]:
+            self.timeouts.inc(**labels)
+        if event["retries"]:
+            self.retries.inc(event["retries"], **labels)
+
+    def render(self) -> str:
+        """导出为 Prometheus 文本格式"""
+        return self.registry.render()
+
+    def serve(self, port: int = 9100, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+        """在后台线程启动 /metrics 服务（已有 HTTP 服务时直接返回 render() 即可）"""
+        handler = self
+
+        class MetricsRequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = handler.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", metrics.CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
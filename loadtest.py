@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+"""TaskServer 压力测试 - 在本机模拟大量客户端
+
+架构说明：
+    主进程：TaskServer + 任务提交 + 内存采样（进程内存即服务端内存）
+    子进程：模拟客户端集群，按 WEBSOCKET_PROTOCOL.md 注册、心跳、执行任务并返回结果
+
+模拟客户端不连接手机，任务执行用 sleep 代替，可配置耗时、失败率、设备忙碌率和执行中断线的概率。
+
+统计指标：
+    - 注册延迟：连接建立到收到 register_ack
+    - 下发延迟：提交任务到客户端收到 task 消息
+    - 端到端延迟：提交任务到拿到结果，以及扣除任务执行时间后的服务端开销
+    - 吞吐量、结果错误码分布、服务端内存
+
+使用方法：
+    python loadtest.py --clients 2000 --tasks 20000 --rate 500
+    python loadtest.py --clients 500 --tasks 5000 --fail-rate 0.05 --disconnect-rate 0.01 --json report.json
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import websockets
+
+import log
+from server_example import TaskServer
+
+
+# ==================== 统计工具 ====================
+
+def percentiles(samples: List[float]) -> dict:
+    """计算延迟分位数（毫秒）"""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def rank(p: float) -> float:
+        index = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))
+        return round(ordered[index] * 1000, 2)
+
+    return {
+        "count": len(ordered),
+        "p50": rank(50),
+        "p90": rank(90),
+        "p99": rank(99),
+        "max": round(ordered[-1] * 1000, 2),
+        "mean": round(sum(ordered) / len(ordered) * 1000, 2),
+    }
+
+
+def rss_mb() -> float:
+    """当前进程常驻内存（MB）"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # 非 Linux 平台只能取峰值（macOS 单位为字节，Linux 为 KB）
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def raise_fd_limit(needed: int):
+    """每个连接占用一个文件描述符，按需提高软限制"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != resource.RLIM_INFINITY and soft < needed:
+        target = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+
+
+# ==================== 模拟客户端 ====================
+
+class SimClient:
+    """模拟客户端（协议与 ws_client.TaskClient 一致，任务执行用 sleep 代替）"""
+
+    def __init__(self, url: str, client_id: str, config: dict, stats: dict, stop: asyncio.Event):
+        """
+        初始化模拟客户端
+
+        Args:
+            url: 服务端地址
+            client_id: 客户端 ID
+            config: 压测参数（见 parse_args）
+            stats: 客户端集群共享的统计数据
+            stop: 停止信号
+        """
+        self.url = url
+        self.client_id = client_id
+        self.config = config
+        self.stats = stats
+        self.stop = stop
+        self.ws = None
+        self.is_busy = False
+        self.current_app = None
+
+    async def run(self, connect_slots: asyncio.Semaphore):
+        """连接、注册并处理任务，断线后自动重连"""
+        while not self.stop.is_set():
+            try:
+                async with connect_slots:
+                    ws = await websockets.connect(self.url, ping_interval=30, ping_timeout=10)
+                    if not await self._register(ws):
+                        await ws.close()
+                        return
+
+                self.ws = ws
+                heartbeat = asyncio.create_task(self._heartbeat())
+                try:
+                    async for message in ws:
+                        data = json.loads(message)
+                        if data.get("type") == "task":
+                            await self._on_task(data)
+                        elif data.get("type") == "ping":
+                            await ws.send(json.dumps({"type": "pong"}))
+                finally:
+                    heartbeat.cancel()
+                    await ws.close()
+            except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException):
+                self.stats["connect_errors"] += 1
+
+            self.ws = None
+            self.is_busy = False
+            if self.stop.is_set():
+                break
+            self.stats["reconnects"] += 1
+            await asyncio.sleep(self.config["reconnect_delay"])
+
+    async def _register(self, ws) -> bool:
+        """注册客户端，记录注册延迟"""
+        start = time.perf_counter()
+        await ws.send(json.dumps({
+            "type": "register",
+            "client_id": self.client_id,
+            "timestamp": int(time.time()),
+            "device_info": {
+                "brand": "LoadTest",
+                "model": "SimClient",
+                "android_version": "13",
+                "screen_size": "1080x2400",
+            },
+        }))
+        ack = json.loads(await asyncio.wait_for(ws.recv(), timeout=30))
+        self.stats["register_latency"].append(time.perf_counter() - start)
+        if not ack.get("success"):
+            self.stats["register_errors"][ack.get("code")] = self.stats["register_errors"].get(ack.get("code"), 0) + 1
+            return False
+        return True
+
+    async def _heartbeat(self):
+        """心跳保活（随机错开首次心跳，避免所有客户端同时发送）"""
+        interval = self.config["heartbeat_interval"]
+        await asyncio.sleep(random.uniform(0, interval))
+        while True:
+            await self.ws.send(json.dumps({
+                "type": "heartbeat",
+                "client_id": self.client_id,
+                "is_busy": self.is_busy,
+                "current_app": self.current_app,
+                "timestamp": int(time.time()),
+            }))
+            await asyncio.sleep(interval)
+
+    async def _on_task(self, task: dict):
+        """收到任务：记录下发延迟，忙碌时拒绝，否则在后台执行"""
+        params = task.get("params") or {}
+        seq = params.get("lt_seq")
+        if seq is not None:
+            latency = time.time() - params["lt_sent"]
+            # 重试的任务只记录第一次下发
+            self.stats["dispatch_latency"].setdefault(seq, latency)
+        self.stats["received"] += 1
+
+        if self.is_busy:
+            await self._send_result(task, False, code="DEVICE_BUSY", error="设备忙碌，正在执行其他任务")
+            return
+        self.is_busy = True
+        asyncio.create_task(self._execute(task))
+
+    async def _execute(self, task: dict):
+        """模拟执行任务"""
+        config = self.config
+        ws = self.ws
+        try:
+            duration = max(0.0, random.uniform(
+                config["task_duration"] * (1 - config["duration_jitter"]),
+                config["task_duration"] * (1 + config["duration_jitter"]),
+            ))
+            await asyncio.sleep(duration)
+
+            roll = random.random()
+            if roll < config["disconnect_rate"]:
+                # 执行中断线：服务端应以 CLIENT_LOST 结束或重新排队该任务
+                self.stats["disconnects"] += 1
+                await ws.close()
+                return
+            roll -= config["disconnect_rate"]
+            if roll < config["busy_rate"]:
+                await self._send_result(task, False, code="DEVICE_BUSY", error="设备忙碌，正在执行其他任务", ws=ws)
+            elif roll - config["busy_rate"] < config["fail_rate"]:
+                await self._send_result(task, False, code="EXECUTION_ERROR", error="模拟执行失败", ws=ws)
+            else:
+                self.current_app = task.get("app")
+                await self._send_result(task, True, duration=round(duration, 3), ws=ws)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            if self.ws is ws:
+                self.is_busy = False
+
+    async def _send_result(self, task: dict, success: bool, ws=None, **fields):
+        """返回任务结果"""
+        result = {
+            "type": "result",
+            "task_id": task.get("task_id"),
+            "success": success,
+            "app": task.get("app"),
+            "workflow": task.get("workflow"),
+        }
+        if success:
+            result["message"] = "模拟任务完成"
+        result.update(fields)
+        await (ws or self.ws).send(json.dumps(result))
+
+
+async def _run_fleet(url: str, config: dict, stop_flag, conn):
+    """运行模拟客户端集群，停止后把统计数据发回主进程"""
+    stats = {
+        "register_latency": [],
+        "register_errors": {},
+        "dispatch_latency": {},  # lt_seq -> 秒
+        "received": 0,
+        "reconnects": 0,
+        "connect_errors": 0,
+        "disconnects": 0,
+    }
+    stop = asyncio.Event()
+    connect_slots = asyncio.Semaphore(config["connect_concurrency"])
+    clients = [
+        SimClient(url, f"sim-{i:05d}", config, stats, stop)
+        for i in range(config["clients"])
+    ]
+    tasks = [asyncio.create_task(client.run(connect_slots)) for client in clients]
+
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, stop_flag.wait)
+    stop.set()
+    await asyncio.gather(
+        *(client.ws.close() for client in clients if client.ws is not None),
+        return_exceptions=True,
+    )
+    await asyncio.wait(tasks, timeout=10)
+
+    stats["dispatch_latency"] = list(stats["dispatch_latency"].values())
+    conn.send(stats)
+    conn.close()
+
+
+def fleet_process(url: str, config: dict, stop_flag, conn):
+    """子进程入口"""
+    raise_fd_limit(config["clients"] + 256)
+    asyncio.run(_run_fleet(url, config, stop_flag, conn))
+
+
+# ==================== 压测流程 ====================
+
+async def run_loadtest(config: dict) -> dict:
+    """启动服务端和模拟客户端，按速率提交任务并汇总统计"""
+    raise_fd_limit(config["clients"] + 256)
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    server = TaskServer(
+        host="127.0.0.1",
+        port=config["port"],
+        queue_path=os.path.join(workdir, "tasks.db"),
+        dispatch_interval=config["dispatch_interval"],
+    )
+    url = f"ws://127.0.0.1:{config['port']}/ws"
+
+    ws_server = await websockets.serve(server.handle_client, "127.0.0.1", config["port"], backlog=4096)
+    background = server.start_background_tasks()
+    memory = {"baseline_mb": round(rss_mb(), 1)}
+
+    # 启动客户端集群并等待全部注册
+    # spawn：不把运行中的事件循环和服务端监听 socket 复制到子进程
+    ctx = multiprocessing.get_context("spawn")
+    stop_flag = ctx.Event()
+    parent_conn, child_conn = ctx.Pipe(duplex=False)
+    fleet = ctx.Process(target=fleet_process, args=(url, config, stop_flag, child_conn), daemon=True)
+    fleet.start()
+
+    ramp_start = time.perf_counter()
+    while len(server.clients) < config["clients"] and time.perf_counter() - ramp_start < config["ramp_timeout"]:
+        await asyncio.sleep(0.05)
+    ramp_seconds = time.perf_counter() - ramp_start
+    memory["connected_mb"] = round(rss_mb(), 1)
+    connected = len(server.clients)
+
+    # 按速率提交任务（泊松到达）
+    e2e_latency = []
+    overhead = []
+    codes: Dict[str, int] = {}
+    peak = {"rss": rss_mb()}
+
+    async def submit_one(seq: int):
+        sent = time.time()
+        start = time.perf_counter()
+        result = await server.submit(
+            config["app"],
+            config["workflow"],
+            {"lt_seq": seq, "lt_sent": sent},
+            timeout=config["task_timeout"],
+            idempotent=config["idempotent"],
+            wait_timeout=config["wait_timeout"],
+        )
+        elapsed = time.perf_counter() - start
+        code = "OK" if result.get("success") else result.get("code", "UNKNOWN")
+        codes[code] = codes.get(code, 0) + 1
+        if result.get("success"):
+            e2e_latency.append(elapsed)
+            overhead.append(max(0.0, elapsed - (result.get("duration") or 0)))
+
+    async def sample_memory():
+        while True:
+            peak["rss"] = max(peak["rss"], rss_mb())
+            await asyncio.sleep(0.5)
+
+    sampler = asyncio.create_task(sample_memory())
+    load_start = time.perf_counter()
+    submitters = []
+    for seq in range(config["tasks"]):
+        submitters.append(asyncio.create_task(submit_one(seq)))
+        if config["rate"] > 0:
+            await asyncio.sleep(random.expovariate(config["rate"]))
+    await asyncio.gather(*submitters)
+    load_seconds = time.perf_counter() - load_start
+    sampler.cancel()
+    memory["peak_mb"] = round(max(peak["rss"], rss_mb()), 1)
+
+    # 停止客户端集群并收集客户端侧统计
+    # 子进程关闭连接时需要服务端完成关闭握手，等待期间不能阻塞事件循环
+    stop_flag.set()
+    loop = asyncio.get_running_loop()
+    has_stats = await loop.run_in_executor(None, parent_conn.poll, 30)
+    fleet_stats = parent_conn.recv() if has_stats else {}
+    await loop.run_in_executor(None, fleet.join, 10)
+
+    for task in background:
+        task.cancel()
+    ws_server.close()
+    await ws_server.wait_closed()
+    server.queue.close()
+
+    completed = codes.get("OK", 0)
+    if connected:
+        memory["per_client_kb"] = round((memory["connected_mb"] - memory["baseline_mb"]) * 1024 / connected, 1)
+
+    return {
+        "config": config,
+        "clients": {
+            "target": config["clients"],
+            "connected": connected,
+            "ramp_seconds": round(ramp_seconds, 2),
+            "register_latency_ms": percentiles(fleet_stats.get("register_latency", [])),
+            "register_errors": fleet_stats.get("register_errors", {}),
+            "reconnects": fleet_stats.get("reconnects", 0),
+            "connect_errors": fleet_stats.get("connect_errors", 0),
+            "simulated_disconnects": fleet_stats.get("disconnects", 0),
+        },
+        "tasks": {
+            "submitted": config["tasks"],
+            "completed": completed,
+            "results": codes,
+            "deliveries": fleet_stats.get("received", 0),
+            "seconds": round(load_seconds, 2),
+            "throughput_per_sec": round(completed / load_seconds, 1) if load_seconds else 0,
+            "dispatch_latency_ms": percentiles(fleet_stats.get("dispatch_latency", [])),
+            "end_to_end_latency_ms": percentiles(e2e_latency),
+            "server_overhead_ms": percentiles(overhead),
+        },
+        "server_memory": memory,
+    }
+
+
+def print_report(report: dict):
+    """打印压测报告"""
+    clients = report["clients"]
+    tasks = report["tasks"]
+    memory = report["server_memory"]
+
+    def fmt(stats: dict) -> str:
+        if not stats.get("count"):
+            return "无数据"
+        return (f"p50 {stats['p50']} / p90 {stats['p90']} / p99 {stats['p99']} / "
+                f"max {stats['max']} ms（{stats['count']} 个样本）")
+
+    print(f"\n{'='*60}")
+    print(f"📊 压测报告")
+    print(f"{'='*60}")
+    print(f"👥 客户端: {clients['connected']}/{clients['target']} 已连接，用时 {clients['ramp_seconds']} 秒")
+    print(f"   注册延迟: {fmt(clients['register_latency_ms'])}")
+    print(f"   重连 {clients['reconnects']} 次，连接错误 {clients['connect_errors']} 次，"
+          f"模拟断线 {clients['simulated_disconnects']} 次")
+    if clients["register_errors"]:
+        print(f"   注册失败: {clients['register_errors']}")
+    print(f"📦 任务: 完成 {tasks['completed']}/{tasks['submitted']}，用时 {tasks['seconds']} 秒，"
+          f"吞吐量 {tasks['throughput_per_sec']} 个/秒")
+    print(f"   结果: {tasks['results']}（客户端共收到 {tasks['deliveries']} 次下发）")
+    print(f"   下发延迟: {fmt(tasks['dispatch_latency_ms'])}")
+    print(f"   端到端延迟: {fmt(tasks['end_to_end_latency_ms'])}")
+    print(f"   服务端开销: {fmt(tasks['server_overhead_ms'])}")
+    print(f"💾 服务端内存: 启动 {memory['baseline_mb']} MB，全部连接 {memory['connected_mb']} MB，"
+          f"峰值 {memory['peak_mb']} MB，每客户端 {memory.get('per_client_kb', '-')} KB")
+    print(f"{'='*60}\n")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> dict:
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="TaskServer 压力测试（本机模拟客户端集群）")
+    parser.add_argument("--clients", type=int, default=1000, help="模拟客户端数量")
+    parser.add_argument("--tasks", type=int, default=5000, help="提交的任务总数")
+    parser.add_argument("--rate", type=float, default=200, help="每秒提交的任务数（0 = 一次性全部提交）")
+    parser.add_argument("--task-duration", type=float, default=0.5, help="模拟任务平均耗时（秒）")
+    parser.add_argument("--duration-jitter", type=float, default=0.5, help="耗时随机波动比例（0-1）")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="返回 EXECUTION_ERROR 的概率")
+    parser.add_argument("--busy-rate", type=float, default=0.0, help="返回 DEVICE_BUSY 的概率（会被服务端重试）")
+    parser.add_argument("--disconnect-rate", type=float, default=0.0, help="执行任务时断线的概率")
+    parser.add_argument("--reconnect-delay", type=float, default=1.0, help="断线后重连间隔（秒）")
+    parser.add_argument("--heartbeat-interval", type=float, default=30, help="心跳间隔（秒）")
+    parser.add_argument("--connect-concurrency", type=int, default=200, help="同时进行的连接握手数")
+    parser.add_argument("--ramp-timeout", type=float, default=120, help="等待客户端全部注册的最长时间（秒）")
+    parser.add_argument("--task-timeout", type=float, default=30, help="单次执行超时（秒）")
+    parser.add_argument("--wait-timeout", type=float, default=300, help="提交方等待结果的最长时间（秒）")
+    parser.add_argument("--idempotent", action="store_true", help="任务标记为幂等（断线后重新排队而不是失败）")
+    parser.add_argument("--dispatch-interval", type=float, default=1.0, help="服务端调度循环间隔（秒）")
+    parser.add_argument("--app", default="loadtest", help="任务的应用名称")
+    parser.add_argument("--workflow", default="sleep", help="任务的工作流名称")
+    parser.add_argument("--port", type=int, default=18765, help="本机监听端口")
+    parser.add_argument("--json", dest="json_path", default=None, help="报告另存为 JSON 文件")
+    parser.add_argument("--verbose", action="store_true", help="显示服务端日志")
+    return vars(parser.parse_args(argv))
+
+
+def main():
+    config = parse_args()
+    print(f"🚀 压测开始: {config['clients']} 个客户端，{config['tasks']} 个任务，"
+          f"速率 {config['rate'] or '不限'} 个/秒")
+
+    # 服务端每条消息都会写日志，压测时默认只输出错误
+    log.setup(level=None if config["verbose"] else "ERROR")
+    report = asyncio.run(run_loadtest(config))
+
+    print_report(report)
+    if config["json_path"]:
+        with open(config["json_path"], "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 报告已保存: {config['json_path']}")
+
+
+if __name__ == "__main__":
+    main()
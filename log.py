@@ -0,0 +1,205 @@
+"""日志模块 - 带上下文的结构化日志，通过队列异步写出
+
+各模块直接使用标准库 logging：
+    import logging
+    logger = logging.getLogger(__name__)
+    logger.info("点击文本: %s", text)
+
+入口脚本调用 log.setup() 后，日志记录只放入内存队列，由后台线程写到控制台和按大小轮转的 JSONL 文件，
+工作流线程和事件循环不会因为终端或磁盘慢而阻塞（队列满时丢弃并计数）。
+
+通过 log.context() 为一段代码内的所有日志附加上下文（基于 contextvars，线程和 asyncio 任务之间互不影响）：
+    with log.context(task_id="uuid-1234", device="emulator-5554", app="wechat"):
+        ...
+
+工作流的步骤函数用 @log.step 装饰后，步骤内的日志会带上 step=函数名。
+
+环境变量：
+    QRCODE_LOG_LEVEL  日志级别（默认 INFO）
+    QRCODE_LOG_FILE   JSONL 日志文件路径（默认不写文件）
+"""
+import atexit
+import contextvars
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional
+
+# 附加到每条日志的上下文字段
+CONTEXT_FIELDS = ("task_id", "device", "app", "workflow", "step")
+
+_context: contextvars.ContextVar = contextvars.ContextVar("log_context", default={})
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional["NonBlockingQueueHandler"] = None
+
+
+@contextmanager
+def context(**fields):
+    """
+    为代码块内的日志附加上下文（可以嵌套，内层覆盖外层的同名字段）
+
+    Args:
+        **fields: 上下文字段（task_id / device / app / workflow / step），值为 None 的字段忽略
+    """
+    token = _context.set({**_context.get(), **{k: v for k, v in fields.items() if v is not None}})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+def step(func):
+    """装饰工作流步骤函数：执行期间把函数名作为 step 写入日志上下文"""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with context(step=func.__name__):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def current_context() -> dict:
+    """当前的日志上下文"""
+    return dict(_context.get())
+
+
+class ContextFilter(logging.Filter):
+    """把当前上下文写入日志记录（必须在产生日志的线程中执行）"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        ctx = _context.get()
+        for field in CONTEXT_FIELDS:
+            if not hasattr(record, field):
+                setattr(record, field, ctx.get(field))
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """放入有界队列，队列满时丢弃日志而不是阻塞调用方"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self.addFilter(ContextFilter())
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 在调用方线程中完成参数格式化和异常文本，后台线程只负责写出
+        record = logging.makeLogRecord(record.__dict__)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class ConsoleFormatter(logging.Formatter):
+    """控制台格式：时间 级别 消息 [上下文]"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(message)s", datefmt="%H:%M:%S")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        ctx = " ".join(f"{field}={getattr(record, field)}" for field in CONTEXT_FIELDS
+                       if getattr(record, field, None) is not None)
+        return f"{line} [{ctx}]" if ctx else line
+
+
+class JSONFormatter(logging.Formatter):
+    """每条日志一行 JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "func": record.funcName,
+            "message": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup(
+    level: Optional[str] = None,
+    path: Optional[str] = None,
+    max_bytes: int = 10 * 1024 * 1024,
+    backup_count: int = 5,
+    console: bool = True,
+    queue_size: int = 10000,
+):
+    """
+    配置根日志（重复调用时直接返回）
+
+    Args:
+        level: 日志级别，默认读取环境变量 QRCODE_LOG_LEVEL，未设置时为 INFO
+        path: JSONL 日志文件路径，默认读取环境变量 QRCODE_LOG_FILE，未设置时不写文件
+        max_bytes: 单个日志文件的最大字节数，超过后轮转
+        backup_count: 保留的历史日志文件数
+        console: 是否输出到控制台
+        queue_size: 内存队列容量，写出跟不上时超出的日志被丢弃
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    level = (level or os.environ.get("QRCODE_LOG_LEVEL", "INFO")).upper()
+    path = path or os.environ.get("QRCODE_LOG_FILE")
+
+    handlers = []
+    if console:
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(ConsoleFormatter())
+        handlers.append(console_handler)
+    if path:
+        file_handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+        )
+        file_handler.setFormatter(JSONFormatter())
+        handlers.append(file_handler)
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger()
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+    atexit.register(shutdown)
+
+
+def shutdown():
+    """写出队列中剩余的日志并停止后台线程"""
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    _listener.stop()
+    logging.getLogger().removeHandler(_queue_handler)
+    if _queue_handler.dropped:
+        print(f"⚠️  日志队列已满，丢弃了 {_queue_handler.dropped} 条日志", file=sys.stderr)
+    _listener = None
+    _queue_handler = None
@@ -1,12 +1,61 @@
 """HTTP 服务入口"""
-from flask import Flask, request, jsonify
-from device import get_device_manager
+from flask import Flask, Response, request, jsonify
+from device import DeviceProbe, get_device_manager
 from actions import Actions
+from result_cache import IdempotencyGuard, request_fingerprint
 import importlib
+import instrumentation
+import log
+import logging
+import metrics
 import os
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
+# 按 idempotency_key 合并重复请求、缓存成功结果
+idempotency = IdempotencyGuard()
+
+# ==================== 指标 ====================
+
+HTTP_REQUESTS = metrics.REGISTRY.counter(
+    "http_requests_total", "HTTP requests by endpoint and status code.", ["endpoint", "status"]
+)
+WORKFLOW_REQUESTS = metrics.REGISTRY.counter(
+    "workflow_requests_total",
+    "Workflow requests by outcome (success / failure / cached / conflict / error) and error code.",
+    ["app", "workflow", "outcome", "code"],
+)
+WORKFLOW_DURATION = metrics.REGISTRY.histogram(
+    "workflow_duration_seconds",
+    "Workflow execution time on the device (excluding lease wait).",
+    ["app", "workflow"],
+    buckets=(0.5, 1, 2.5, 5, 10, 15, 20, 30, 45, 60, 120),
+)
+QUEUE_DEPTH = metrics.REGISTRY.gauge("device_queue_depth", "Requests waiting for the device lease.")
+IN_PROGRESS = metrics.REGISTRY.gauge("workflows_in_progress", "Workflows currently running on the device.")
+LEASE_WAIT = metrics.REGISTRY.histogram(
+    "device_lease_wait_seconds",
+    "Time requests waited for exclusive use of the device.",
+    buckets=(0.01, 0.1, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120),
+)
+
+# 每个步骤（Actions 方法）和设备调用的耗时
+instrumentation.add_handler(instrumentation.PrometheusHandler(metrics.REGISTRY))
+
+# 后台探测设备连接，健康检查只读缓存（探测间隔见 QRCODE_HEALTH_INTERVAL，在 main() 中启动）
+device_probe = DeviceProbe(get_device_manager())
+
+
+@app.after_request
+def count_request(response):
+    """统计 HTTP 请求"""
+    HTTP_REQUESTS.inc(endpoint=request.endpoint or "unknown", status=str(response.status_code))
+    return response
+
 
 @app.route("/")
 def index():
@@ -17,8 +66,9 @@ def index():
             "status": "running",
             "endpoints": {
                 "execute": "/execute - 执行自动化工作流",
-                "health": "/health - 健康检查",
+                "health": "/health - 健康检查（/health/live 存活，/health/ready 就绪）",
                 "apps": "/apps - 查看支持的应用列表",
+                "metrics": "/metrics - Prometheus 指标",
             },
         }
     )
@@ -26,13 +76,45 @@ def index():
 
 @app.route("/health")
 def health():
-    """健康检查"""
-    try:
-        device_manager = get_device_manager()
-        is_connected = device_manager.is_connected()
-        return jsonify({"status": "ok", "device_connected": is_connected})
-    except Exception as e:
-        return jsonify({"status": "error", "message": str(e)}), 500
+    """健康检查（返回后台探测缓存的设备状态，不访问设备）"""
+    status = device_probe.status()
+    ready = device_probe.is_ready()
+    return jsonify(
+        {
+            "status": "ok" if ready else "degraded",
+            "live": device_probe.is_alive(),
+            "ready": ready,
+            "device_connected": status["connected"],
+            "device_busy": status["busy"],
+            "last_probe_age": status["age"],
+            "probe_latency": status["latency"],
+            "probe_interval": device_probe.interval,
+            "error": status["error"],
+        }
+    )
+
+
+@app.route("/health/live")
+def health_live():
+    """存活检查：服务和后台探测线程在运行"""
+    if not device_probe.is_alive():
+        return jsonify({"status": "error", "message": "设备探测线程未运行"}), 503
+    return jsonify({"status": "ok"})
+
+
+@app.route("/health/ready")
+def health_ready():
+    """就绪检查：设备已连接，可以执行工作流"""
+    if not device_probe.is_ready():
+        status = device_probe.status()
+        return jsonify({"status": "not_ready", "error": status["error"], "last_probe_age": status["age"]}), 503
+    return jsonify({"status": "ok"})
+
+
+@app.route("/metrics")
+def prometheus_metrics():
+    """Prometheus 指标（请求数、工作流 / 步骤 / 设备调用耗时、排队、进程内存和 GC）"""
+    return Response(metrics.REGISTRY.render(), headers={"Content-Type": metrics.CONTENT_TYPE})
 
 
 @app.route("/apps")
@@ -72,8 +154,12 @@ def execute():
         "workflow": "scan_from_album",
         "params": {
             "image_index": 0
-        }
+        },
+        "idempotency_key": "order-1234"  // 可选，也可以通过 Idempotency-Key 请求头传递
     }
+
+    带 idempotency_key 的请求：相同 key 的请求正在执行时等待同一个结果；
+    已成功的结果在缓存有效期内直接返回（带 "cached": true），不会在设备上重复执行。
     """
     try:
         data = request.get_json()
@@ -85,6 +171,7 @@ def execute():
         app_name = data.get("app")
         workflow_name = data.get("workflow")
         params = data.get("params", {})
+        idempotency_key = data.get("idempotency_key") or request.headers.get("Idempotency-Key")
 
         if not app_name:
             return jsonify({"success": False, "error": "缺少 app 参数"}), 400
@@ -92,13 +179,6 @@ def execute():
         if not workflow_name:
             return jsonify({"success": False, "error": "缺少 workflow 参数"}), 400
 
-        # 连接设备
-        device_manager = get_device_manager()
-        device = device_manager.get_device()
-
-        # 创建 Actions 对象
-        actions = Actions(device)
-
         # 动态导入 app 模块
         try:
             module = importlib.import_module(f"apps.{app_name}")
@@ -119,10 +199,58 @@ def execute():
                 404,
             )
 
-        # 执行工作流
         workflow_func = workflows[workflow_name]
-        result = workflow_func(actions, **params)
 
+        def run_workflow() -> dict:
+            # 等待独占设备（同一时间只有一个工作流操作设备）
+            device_manager = get_device_manager()
+            queued_at = time.perf_counter()
+            with QUEUE_DEPTH.track():
+                device_manager.acquire()
+            LEASE_WAIT.observe(time.perf_counter() - queued_at)
+
+            try:
+                # 连接设备
+                device = device_manager.get_device()
+
+                # 创建 Actions 对象
+                actions = Actions(device)
+
+                # 执行工作流（失败时附带执行期间的截图帧）
+                started = time.time()
+                with IN_PROGRESS.track(), WORKFLOW_DURATION.time(app=app_name, workflow=workflow_name), \
+                        instrumentation.workflow_context(app_name, workflow_name):
+                    result = workflow_func(actions, **params)
+                return actions.capture_failure(result, since=started)
+            finally:
+                device_manager.release()
+
+        # 请求内的日志都带上 task_id（幂等 key 或随机生成）
+        task_id = idempotency_key or uuid.uuid4().hex[:12]
+        with log.context(task_id=task_id, device=get_device_manager().device_id, app=app_name,
+                         workflow=workflow_name):
+            try:
+                if not idempotency_key:
+                    result = run_workflow()
+                else:
+                    fingerprint = request_fingerprint(app_name, workflow_name, params)
+                    result = idempotency.run(idempotency_key, fingerprint, run_workflow)
+            except Exception:
+                WORKFLOW_REQUESTS.inc(app=app_name, workflow=workflow_name, outcome="error", code="EXCEPTION")
+                logger.exception("❌ 工作流执行异常")
+                raise
+
+        if result.get("code") == "IDEMPOTENCY_KEY_CONFLICT":
+            outcome = "conflict"
+        elif result.get("cached"):
+            outcome = "cached"
+        else:
+            outcome = "success" if result.get("success") else "failure"
+        code = result.get("code") or ("" if result.get("success") else "WORKFLOW_FAILED")
+        WORKFLOW_REQUESTS.inc(app=app_name, workflow=workflow_name, outcome=outcome, code=code)
+
+        if outcome == "conflict":
+            return jsonify(result), 409
         return jsonify(result)
 
     except Exception as e:
@@ -140,13 +268,19 @@ def main():
     print("  3. 已安装 UIAutomator2 服务 (python -m uiautomator2 init)")
     print("\n🌐 API 文档:")
     print("  - GET  /          - 服务信息")
-    print("  - GET  /health    - 健康检查")
+    print("  - GET  /health    - 健康检查（/health/live、/health/ready）")
+    print("  - GET  /metrics   - Prometheus 指标")
     print("  - GET  /apps      - 查看支持的应用")
     print("  - POST /execute   - 执行工作流")
     print("\n🔗 服务地址: http://0.0.0.0:8000")
     print("\n" + "=" * 60)
 
-    app.run(host="0.0.0.0", port=8000, debug=True)
+    log.setup()
+    debug = True
+    # debug 模式下重载器的监视进程不处理请求，只在实际提供服务的子进程中探测设备
+    if not debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        device_probe.start()
+    app.run(host="0.0.0.0", port=8000, debug=debug)
 
 
 if __name__ == "__main__":
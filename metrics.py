@@ -0,0 +1,306 @@
+"""指标模块 - Prometheus 文本格式的计数器、仪表和直方图
+
+指标在内存中增量维护（每次记录只更新对应的计数），抓取 /metrics 时只做格式化，开销很小。
+进程内存、CPU 和 GC 统计在抓取时读取。
+
+使用方法：
+    import metrics
+
+    REQUESTS = metrics.REGISTRY.counter("requests_total", "处理的请求数", ["app", "status"])
+    REQUESTS.inc(app="wechat", status="ok")
+
+    LATENCY = metrics.REGISTRY.histogram("latency_seconds", "请求耗时", ["app"])
+    LATENCY.observe(1.2, app="wechat")
+
+    print(metrics.REGISTRY.render())
+"""
+import bisect
+import gc
+import os
+import resource
+import sys
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """指标基类：按标签值保存数据"""
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[tuple, object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"指标 {self.name} 的标签应为 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple(labels[name] for name in self.labelnames)
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Gauge(_Metric):
+    """可增可减的当前值"""
+
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def track(self, **labels) -> "_GaugeTracker":
+        """进入时加一、退出时减一（统计正在进行 / 排队中的数量）"""
+        return _GaugeTracker(self, labels)
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class _GaugeTracker:
+    def __init__(self, gauge: Gauge, labels: dict):
+        self.gauge = gauge
+        self.labels = labels
+
+    def __enter__(self):
+        self.gauge.inc(**self.labels)
+
+    def __exit__(self, exc_type, exc, tb):
+        self.gauge.dec(**self.labels)
+        return False
+
+
+class Histogram(_Metric):
+    """直方图（每个桶单独计数，输出时累加为 Prometheus 的累计桶）"""
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)  # value <= bucket 的第一个桶，超出时为 +Inf
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0}
+            data["counts"][index] += 1
+            data["sum"] += value
+
+    def time(self, **labels) -> "_HistogramTimer":
+        """记录代码块耗时"""
+        return _HistogramTimer(self, labels)
+
+    def render(self) -> List[str]:
+        lines = self._header()
+        with self._lock:
+            for key, data in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, data["counts"]):
+                    cumulative += count
+                    labels = _format_labels(self.labelnames, key, ("le", repr(float(bound))))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                total = cumulative + data["counts"][-1]
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', '+Inf'))} {total}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {data['sum']:.6f}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {total}")
+        return lines
+
+
+class _HistogramTimer:
+    def __init__(self, histogram: Histogram, labels: dict):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+# ==================== 进程指标 ====================
+
+class ProcessCollector:
+    """进程内存、CPU、线程数和 GC 统计（内存和 CPU 在抓取时读取，GC 耗时通过回调增量记录）"""
+
+    def __init__(self, prefix: str = ""):
+        self.prefix = prefix
+        self.gc_duration = Histogram(
+            f"{prefix}python_gc_duration_seconds", "Time spent in garbage collection.",
+            ["generation"], buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1),
+        )
+        self._gc_start: Optional[float] = None
+        gc.callbacks.append(self._on_gc)
+
+    def _on_gc(self, phase: str, info: dict):
+        if phase == "start":
+            self._gc_start = time.perf_counter()
+        elif self._gc_start is not None:
+            self.gc_duration.observe(time.perf_counter() - self._gc_start, generation=str(info["generation"]))
+            self._gc_start = None
+
+    def _rss_bytes(self) -> Optional[int]:
+        try:
+            with open("/proc/self/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        return None
+
+    def render(self) -> List[str]:
+        p = self.prefix
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        # macOS 的 ru_maxrss 单位为字节，Linux 为 KB
+        max_rss = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+        rss = self._rss_bytes()
+
+        lines = [
+            f"# HELP {p}process_resident_memory_bytes Resident memory size in bytes.",
+            f"# TYPE {p}process_resident_memory_bytes gauge",
+            f"{p}process_resident_memory_bytes {rss if rss is not None else max_rss}",
+            f"# HELP {p}process_max_resident_memory_bytes Peak resident memory size in bytes.",
+            f"# TYPE {p}process_max_resident_memory_bytes gauge",
+            f"{p}process_max_resident_memory_bytes {max_rss}",
+            f"# HELP {p}process_cpu_seconds_total Total user and system CPU time in seconds.",
+            f"# TYPE {p}process_cpu_seconds_total counter",
+            f"{p}process_cpu_seconds_total {usage.ru_utime + usage.ru_stime:.3f}",
+            f"# HELP {p}process_threads Number of Python threads.",
+            f"# TYPE {p}process_threads gauge",
+            f"{p}process_threads {threading.active_count()}",
+            f"# HELP {p}process_pid Process id.",
+            f"# TYPE {p}process_pid gauge",
+            f"{p}process_pid {os.getpid()}",
+        ]
+
+        stats = gc.get_stats()
+        for metric, field, help_text in (
+            ("python_gc_collections_total", "collections", "Number of garbage collections."),
+            ("python_gc_objects_collected_total", "collected", "Objects collected during garbage collection."),
+            ("python_gc_objects_uncollectable_total", "uncollectable", "Uncollectable objects found during GC."),
+        ):
+            lines.append(f"# HELP {p}{metric} {help_text}")
+            lines.append(f"# TYPE {p}{metric} counter")
+            for generation, generation_stats in enumerate(stats):
+                lines.append(f'{p}{metric}{{generation="{generation}"}} {generation_stats[field]}')
+
+        lines.append(f"# HELP {p}python_gc_objects_tracked Objects currently tracked per generation.")
+        lines.append(f"# TYPE {p}python_gc_objects_tracked gauge")
+        for generation, count in enumerate(gc.get_count()):
+            lines.append(f'{p}python_gc_objects_tracked{{generation="{generation}"}} {count}')
+
+        return lines + self.gc_duration.render()
+
+
+# ==================== 注册表 ====================
+
+class Registry:
+    """指标注册表"""
+
+    def __init__(self, prefix: str = ""):
+        """
+        初始化注册表
+
+        Args:
+            prefix: 指标名前缀（如 "qrcode_helper_"）
+        """
+        self.prefix = prefix
+        self._collectors: List = []
+        self._lock = threading.Lock()
+
+    def register(self, collector):
+        """注册指标或采集器（需要提供 render() -> List[str]）"""
+        with self._lock:
+            self._collectors.append(collector)
+        return collector
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(self.prefix + name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self.register(Gauge(self.prefix + name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(self.prefix + name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """导出为 Prometheus 文本格式"""
+        with self._lock:
+            collectors = list(self._collectors)
+        lines = []
+        for collector in collectors:
+            lines.extend(collector.render())
+        return "\n".join(lines) + "\n"
+
+
+# 全局注册表（HTTP 服务的 /metrics 使用）
+REGISTRY = Registry(prefix="qrcode_helper_")
+REGISTRY.register(ProcessCollector(prefix=REGISTRY.prefix))
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""页面识别 - 一次调用判断当前在应用的哪个页面
+
+以前判断页面要对每个特征元素各发一次 exists 请求（不在该页面时要全部问一遍）。
+这里只导出一次界面结构（dump_hierarchy），在本地计算指纹后与页面库比对：
+
+    1. 特征元素：应用 config.py 中 PAGES 声明的文本 / resource-id，出现任意一个即为该页面（以此为准）
+    2. 结构哈希：所有节点 (类名, resource-id) 组合的哈希，与录制时完全相同的页面直接命中。
+       哈希不含文本，由同样几种控件组成的页面（如向日葵的"我的"和"设备"）哈希相同，
+       页面库中有多个页面的样本哈希相同时不按哈希识别
+    3. 相似度：resource-id 和短文本集合与录制样本的 Jaccard 相似度，超过阈值时取最相似的页面
+
+页面库保存在 apps/<app>/pages.json，由录制结果（recorder.py）学习得到：能用特征元素识别的页面用其名称，
+其余页面命名为 page_<哈希>，可以手动改名。
+
+另外可以用截图的感知哈希（dHash）加速：use_frame=True 时先用 Actions.grab() 取原始截图计算哈希，
+与本进程内已识别过的画面比对，命中时不再导出界面结构；未命中时按上面的方式识别，并记住该画面的哈希。
+画面哈希与分辨率、主题有关，只在内存中保存。
+
+使用方法：
+    classifier = pages.PageClassifier.for_app("sunlogin")
+    classifier.classify(actions)                   # "my" / "device" / "scan" / None
+
+    # 从录制结果学习页面库
+    python pages.py learn sunlogin recordings/sunlogin-1 recordings/sunlogin-2
+
+    # 查看界面结构快照被识别为哪个页面
+    python pages.py classify sunlogin recordings/sunlogin-1/screens/s2.xml
+"""
+import argparse
+import hashlib
+import importlib
+import json
+import os
+import threading
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional
+
+import framebuffer
+
+LIBRARY_FILE = "pages.json"
+
+# 相似度阈值（Jaccard）
+SIMILARITY_THRESHOLD = 0.6
+
+# 画面哈希（64 位）的最大汉明距离
+FRAME_HASH_DISTANCE = 6
+
+# 计入特征的文本最大长度（长文本多为动态内容，如聊天消息、设备名）
+MAX_TEXT_LENGTH = 12
+
+
+def fingerprint(xml: str) -> dict:
+    """
+    计算界面结构的指纹
+
+    Args:
+        xml: dump_hierarchy 返回的 XML
+
+    Returns:
+        {"packages": 包名集合, "structure": 结构哈希, "features": 特征集合（id:... / text:...）}
+    """
+    root = ET.fromstring(xml)
+    packages, skeleton, features = set(), set(), set()
+    for node in root.iter("node"):
+        if node.get("package"):
+            packages.add(node.get("package"))
+        resource_id = node.get("resource-id") or ""
+        skeleton.add(f"{node.get('class', '')}|{resource_id}")
+        if resource_id:
+            features.add(f"id:{resource_id}")
+        text = (node.get("text") or "").strip()
+        if text and len(text) <= MAX_TEXT_LENGTH:
+            features.add(f"text:{text}")
+    structure = hashlib.sha1("\n".join(sorted(skeleton)).encode("utf-8")).hexdigest()[:16]
+    return {"packages": packages, "structure": structure, "features": features}
+
+
+def frame_hash(pixels) -> int:
+    """
+    截图的差值哈希（dHash，64 位）：缩小到 9x8 灰度图，比较相邻像素的明暗
+
+    Args:
+        pixels: RGB(A) numpy 数组（Actions.grab() 的返回值）
+    """
+    from PIL import Image
+
+    small = Image.fromarray(framebuffer.gray(pixels)).resize((9, 8), Image.Resampling.BOX)
+    values = list(small.getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (values[row * 9 + col] > values[row * 9 + col + 1])
+    return bits
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a and not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class PageClassifier:
+    """一个应用的页面识别器"""
+
+    _instances: Dict[str, "PageClassifier"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, package: Optional[str] = None, markers: Optional[dict] = None,
+                 pages: Optional[dict] = None):
+        """
+        初始化识别器
+
+        Args:
+            package: 应用包名（界面不属于该应用时不识别）
+            markers: 页面名 -> {"texts": [...], "ids": [...]}，出现任意一个即为该页面
+            pages: 页面库，页面名 -> {"samples": [{"structure": 结构哈希, "features": [...]}, ...]}
+        """
+        self.package = package
+        self.markers = markers or {}
+        self.pages = pages or {}
+        self._frame_hashes: Dict[int, str] = {}  # 画面哈希 -> 页面名（本进程内识别过的画面）
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_app(cls, app: str) -> "PageClassifier":
+        """加载应用的识别器（config.py 中的 PACKAGE_NAME、PAGES 和 pages.json，每个应用只加载一次）"""
+        with cls._instances_lock:
+            classifier = cls._instances.get(app)
+            if classifier is None:
+                config = importlib.import_module(f"apps.{app}.config")
+                path = library_path(app)
+                pages = {}
+                if os.path.exists(path):
+                    with open(path, encoding="utf-8") as f:
+                        pages = json.load(f).get("pages", {})
+                classifier = cls._instances[app] = cls(
+                    getattr(config, "PACKAGE_NAME", None), getattr(config, "PAGES", {}), pages
+                )
+            return classifier
+
+    # ---------- 识别 ----------
+
+    def match_hierarchy(self, xml: str) -> Optional[dict]:
+        """
+        根据界面结构识别页面
+
+        Args:
+            xml: dump_hierarchy 返回的 XML
+
+        Returns:
+            {"page": 页面名, "method": marker / structure / similarity, "score": 相似度}，无法识别时返回 None
+        """
+        current = fingerprint(xml)
+        if self.package and self.package not in current["packages"]:
+            return None
+
+        for name, marker in self.markers.items():
+            if any(f"text:{text}" in current["features"] for text in marker.get("texts", [])) or \
+                    any(f"id:{resource_id}" in current["features"] for resource_id in marker.get("ids", [])):
+                return {"page": name, "method": "marker", "score": 1.0}
+
+        # 结构哈希不含文本，只有一个页面有该哈希的样本时才按哈希识别
+        names = [name for name, page in self.pages.items()
+                 if any(sample["structure"] == current["structure"] for sample in page.get("samples", []))]
+        if len(names) == 1:
+            return {"page": names[0], "method": "structure", "score": 1.0}
+
+        best = None
+        for name, page in self.pages.items():
+            for sample in page.get("samples", []):
+                score = _jaccard(current["features"], set(sample["features"]))
+                if best is None or score > best["score"]:
+                    best = {"page": name, "method": "similarity", "score": round(score, 3)}
+        if best and best["score"] >= SIMILARITY_THRESHOLD:
+            return best
+        return None
+
+    def match(self, actions, use_frame: bool = False) -> Optional[dict]:
+        """
+        识别当前页面
+
+        Args:
+            actions: 操作对象
+            use_frame: 先用截图的感知哈希比对本进程内识别过的画面（命中时不导出界面结构）
+
+        Returns:
+            {"page", "method", "score"}，无法识别时返回 None
+        """
+        digest = None
+        if use_frame:
+            digest = frame_hash(actions.grab())
+            with self._lock:
+                known = list(self._frame_hashes.items())
+            for known_digest, name in known:
+                distance = (known_digest ^ digest).bit_count()
+                if distance <= FRAME_HASH_DISTANCE:
+                    return {"page": name, "method": "frame", "score": round(1 - distance / 64, 3)}
+
+        xml = actions.device.dump_hierarchy()
+        result = self.match_hierarchy(xml)
+        if result is None and getattr(actions, "watchers", None) and actions.dismiss_popups(xml):
+            # 无法识别时可能是被弹窗挡住了，用同一份界面结构检查弹窗，关闭后重新识别
+            result = self.match_hierarchy(actions.device.dump_hierarchy())
+        if result and digest is not None:
+            with self._lock:
+                self._frame_hashes[digest] = result["page"]
+        return result
+
+    def classify(self, actions, use_frame: bool = False) -> Optional[str]:
+        """识别当前页面，返回页面名（无法识别时返回 None）"""
+        result = self.match(actions, use_frame)
+        return result["page"] if result else None
+
+    # ---------- 学习 ----------
+
+    def learn(self, xml: str, name: Optional[str] = None) -> str:
+        """
+        把一个界面结构样本加入页面库
+
+        Args:
+            xml: dump_hierarchy 返回的 XML
+            name: 页面名，默认按特征元素识别，无法识别时为 page_<结构哈希前 8 位>
+
+        Returns:
+            页面名
+        """
+        current = fingerprint(xml)
+        if name is None:
+            matched = self.match_hierarchy(xml)
+            name = matched["page"] if matched else f"page_{current['structure'][:8]}"
+        samples = self.pages.setdefault(name, {"samples": []})["samples"]
+        if not any(sample["structure"] == current["structure"] for sample in samples):
+            samples.append({"structure": current["structure"], "features": sorted(current["features"])})
+        return name
+
+    def save(self, path: str):
+        """保存页面库"""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"version": 1, "pages": self.pages}, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+
+def library_path(app: str) -> str:
+    """应用的页面库文件路径"""
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "apps", app, LIBRARY_FILE)
+
+
+# ==================== 命令行 ====================
+
+def main():
+    parser = argparse.ArgumentParser(description="页面识别")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    learn = subparsers.add_parser("learn", help="从录制结果学习页面库")
+    learn.add_argument("app", help="应用名称")
+    learn.add_argument("recordings", nargs="+", help="录制目录（recorder.py record 的输出）")
+
+    classify = subparsers.add_parser("classify", help="识别界面结构快照")
+    classify.add_argument("app", help="应用名称")
+    classify.add_argument("xml", nargs="+", help="界面结构文件（.xml）")
+    args = parser.parse_args()
+
+    classifier = PageClassifier.for_app(args.app)
+
+    if args.command == "classify":
+        for path in args.xml:
+            with open(path, encoding="utf-8") as f:
+                result = classifier.match_hierarchy(f.read())
+            if result:
+                print(f"{path}: {result['page']}（{result['method']}，{result['score']}）")
+            else:
+                print(f"{path}: 无法识别")
+        return
+
+    learned: Dict[str, List[str]] = {}
+    for directory in args.recordings:
+        with open(os.path.join(directory, "recording.json"), encoding="utf-8") as f:
+            recording = json.load(f)
+        if recording["app"] != args.app:
+            print(f"⚠️  跳过 {directory}（应用为 {recording['app']}）")
+            continue
+        for screen, path in recording["screens"].items():
+            with open(os.path.join(directory, path), encoding="utf-8") as f:
+                xml = f.read()
+            if classifier.package and classifier.package not in fingerprint(xml)["packages"]:
+                continue  # 启动前的桌面等其他应用的页面
+            name = classifier.learn(xml)
+            learned.setdefault(name, []).append(f"{os.path.basename(directory.rstrip('/'))}/{screen}")
+
+    path = library_path(args.app)
+    classifier.save(path)
+    for name, screens in learned.items():
+        samples = len(classifier.pages[name]["samples"])
+        print(f"  {name:<20} 样本 {samples}  ← {', '.join(screens)}")
+    print(f"💾 页面库已保存: {path}（page_ 开头的页面可以在文件中改名）")
+
+
+if __name__ == "__main__":
+    main()
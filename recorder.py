@@ -0,0 +1,473 @@
+#!/usr/bin/env python3
+"""工作流录制与回放 - 录制真机上的一次执行，离线在模拟设备上重现
+
+录制时记录：
+    - 工作流对 Actions 的每次调用：参数、返回值、耗时、其中的设备调用（rpc）及各自耗时
+    - 界面结构快照：每次会改变界面的设备调用（点击、启动应用、按键、输入……）之前导出一次，
+      即上一次操作之后最终停留的页面（相同的页面只保存一份）
+    - 截图：开始、结束和操作失败时（--screenshots all 时每次操作之后都截图）
+
+录制结果保存在一个目录中：
+    recording.json     调用记录、页面时间线、各设备调用的耗时
+    screens/s0.xml     界面结构快照
+    screenshots/*.png  截图
+
+回放时用快照构造 ReplayDevice（基于模拟设备）：每次改变界面的设备调用按录制时的顺序切换到下一个页面，
+切换的加载时间取录制时随后第一次等待元素成功的耗时，各类设备调用的耗时取录制时的中位数。
+因此录制时的慢操作和失败（元素没有出现、等待超时）在回放时会同样出现，可以作为回归和基准测试的语料。
+
+使用方法：
+    # 在真机上录制
+    python recorder.py record sunlogin execute --params '{"image_index": 0}' --out recordings/sunlogin-1
+
+    # 在模拟设备上回放，逐个调用对比耗时和结果
+    python recorder.py replay recordings/sunlogin-1
+"""
+import argparse
+import hashlib
+import importlib
+import inspect
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import instrumentation
+import log
+from actions import Actions
+from fake_device import FakeDevice
+
+# 会改变界面的设备调用（回放时按顺序切换页面）
+MUTATING_RPCS = (
+    "app_start", "app_stop", "click", "long_click", "swipe", "swipe_ext", "drag",
+    "press", "send_keys", "clear_text", "set_text",
+)
+
+SCREENSHOT_MODES = ("none", "key", "all")
+
+
+def _jsonable(value):
+    """参数和返回值转为可以写入 JSON 的形式"""
+    try:
+        return json.loads(json.dumps(value))  # 元组等转为 JSON 中的形式，回放对比时才一致
+    except (TypeError, ValueError):
+        return repr(value)
+
+
+# ==================== 录制 ====================
+
+class Recorder(instrumentation.Handler):
+    """录制一次工作流执行（同时作为埋点处理器接收设备调用事件）"""
+
+    def __init__(self, device, out_dir: Optional[str] = None, screenshots: str = "key"):
+        """
+        初始化录制器
+
+        Args:
+            device: 设备对象（真机或模拟设备）
+            out_dir: 输出目录，为 None 时只记录调用和耗时，不导出快照和截图（回放时使用）
+            screenshots: 截图时机：none / key（开始、结束和失败时）/ all（每次操作之后）
+        """
+        if screenshots not in SCREENSHOT_MODES:
+            raise ValueError(f"未知的截图模式: {screenshots}（可选: {', '.join(SCREENSHOT_MODES)}）")
+        self.device = device
+        self.out_dir = out_dir
+        self.screenshots = screenshots if out_dir else "none"
+        self.calls: List[dict] = []
+        self.screens: Dict[str, str] = {}  # 页面名 -> 快照文件（相对 out_dir）
+        self.timeline: List[dict] = []  # 每次改变界面的设备调用之后停留的页面
+        self._screen_names: Dict[str, str] = {}  # 快照哈希 -> 页面名
+        self._rpc_samples: Dict[str, List[float]] = {}
+        self._pending: Optional[dict] = None  # 还没有得到结果页面的时间线条目
+        self._call: Optional[dict] = None  # 正在执行的 Actions 调用
+        self._thread_id = None
+        self._started = 0.0
+        self.start_screen: Optional[str] = None
+
+    # ---------- 快照和截图 ----------
+
+    def _snapshot(self) -> Optional[str]:
+        """导出当前界面结构，返回页面名（只录制调用时返回 None）"""
+        if not self.out_dir:
+            return None
+        start = time.perf_counter()
+        xml = self.device.dump_hierarchy()
+        digest = hashlib.sha1(xml.encode("utf-8")).hexdigest()
+        name = self._screen_names.get(digest)
+        if name is None:
+            name = self._screen_names[digest] = f"s{len(self._screen_names)}"
+            path = os.path.join("screens", f"{name}.xml")
+            with open(os.path.join(self.out_dir, path), "w", encoding="utf-8") as f:
+                f.write(xml)
+            self.screens[name] = path
+        self._add_overhead(time.perf_counter() - start)
+        return name
+
+    def _screenshot(self, label: str) -> Optional[str]:
+        """截图，返回文件路径（相对 out_dir）"""
+        if self.screenshots == "none":
+            return None
+        start = time.perf_counter()
+        path = os.path.join("screenshots", f"{label}.png")
+        self.device.screenshot(os.path.join(self.out_dir, path))
+        self._add_overhead(time.perf_counter() - start)
+        return path
+
+    def _add_overhead(self, seconds: float):
+        """快照和截图的耗时计入当前调用的 overhead，对比时从调用耗时中扣除"""
+        if self._call is not None:
+            self._call["overhead"] += seconds
+
+    # ---------- 埋点事件 ----------
+
+    def on_start(self, event: dict):
+        if event["kind"] != "rpc" or threading.get_ident() != self._thread_id:
+            return
+        if event["name"] in MUTATING_RPCS:
+            # 改变界面之前的页面就是上一次改变界面之后最终停留的页面
+            screen = self._snapshot()
+            if self._pending is not None:
+                self._pending["screen"] = screen
+            self._pending = {"rpc": event["name"], "screen": None, "wait": None,
+                             "call": self._call["index"] if self._call else None}
+            self.timeline.append(self._pending)
+
+    def on_end(self, event: dict):
+        if event["kind"] != "rpc" or threading.get_ident() != self._thread_id:
+            return
+        self._rpc_samples.setdefault(event["name"], []).append(event["duration"])
+        if self._call is not None:
+            self._call["rpcs"].append({"name": event["name"], "duration": round(event["duration"], 6),
+                                       "ok": event["ok"]})
+        # 页面切换后第一次等待成功的耗时，近似为页面加载时间
+        if event["name"] == "wait" and event["ok"] and self._pending is not None and self._pending["wait"] is None:
+            self._pending["wait"] = event["duration"]
+
+    # ---------- Actions 调用 ----------
+
+    def _invoke(self, actions: Actions, name: str, args: tuple, kwargs: dict):
+        """执行并记录一次 Actions 调用"""
+        call = {
+            "index": len(self.calls),
+            "method": name,
+            "args": [_jsonable(arg) for arg in args],
+            "kwargs": {key: _jsonable(value) for key, value in kwargs.items()},
+            "start": round(time.perf_counter() - self._started, 6),
+            "duration": None,
+            "overhead": 0.0,
+            "result": None,
+            "error": None,
+            "rpcs": [],
+            "screenshot": None,
+        }
+        self.calls.append(call)
+        previous, self._call = self._call, call
+        start = time.perf_counter()
+        try:
+            result = getattr(actions, name)(*args, **kwargs)
+            call["result"] = _jsonable(result)
+            return result
+        except Exception as e:
+            call["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            call["duration"] = round(time.perf_counter() - start, 6)
+            failed = call["error"] or (call["result"] is False and name != "element_exists")
+            if failed or self.screenshots == "all":
+                call["screenshot"] = self._screenshot(f"{call['index']:03d}_{name}")
+            call["overhead"] = round(call["overhead"], 6)
+            self._call = previous
+
+    def run(self, app: str, workflow: str, params: Optional[dict] = None) -> dict:
+        """
+        执行工作流并录制
+
+        Args:
+            app: 应用名称
+            workflow: 工作流名称
+            params: 工作流参数
+
+        Returns:
+            录制结果（out_dir 不为 None 时同时写入 out_dir/recording.json）
+        """
+        params = params or {}
+        workflow_func = getattr(importlib.import_module(f"apps.{app}"), "WORKFLOWS")[workflow]
+        if self.out_dir:
+            os.makedirs(os.path.join(self.out_dir, "screens"), exist_ok=True)
+            os.makedirs(os.path.join(self.out_dir, "screenshots"), exist_ok=True)
+
+        info = self.device.info
+        self._thread_id = threading.get_ident()
+        self._started = time.perf_counter()
+        self.start_screen = self._snapshot()
+        first_screenshot = self._screenshot("start")
+
+        actions = Actions(self.device)
+        instrumentation.add_handler(self)
+        start = time.perf_counter()
+        try:
+            result = workflow_func(_RecordingActions(actions, self), **params)
+        except Exception as e:
+            result = {"success": False, "error": f"{type(e).__name__}: {e}"}
+        finally:
+            duration = time.perf_counter() - start
+            instrumentation.remove_handler(self)
+
+        if self._pending is not None:
+            self._pending["screen"] = self._snapshot()
+        last_screenshot = self._screenshot("end")
+
+        wait_latency = min(self._rpc_samples.get("wait", [0.0]))
+        recording = {
+            "version": 1,
+            "app": app,
+            "workflow": workflow,
+            "params": params,
+            "recorded_at": datetime.now().isoformat(timespec="seconds"),
+            "device": {key: info.get(key) for key in ("brand", "model", "version", "displayWidth", "displayHeight")},
+            "result": _jsonable(result),
+            "duration": round(duration, 6),
+            "overhead": round(sum(call["overhead"] for call in self.calls), 6),
+            "calls": self.calls,
+            "start_screen": self.start_screen,
+            "screens": self.screens,
+            "timeline": [
+                {
+                    "rpc": entry["rpc"],
+                    "screen": entry["screen"],
+                    "call": entry["call"],
+                    # 等待耗时减去最快一次等待（纯调用开销）即为页面加载时间
+                    "delay": round(max(0.0, (entry["wait"] or 0.0) - wait_latency), 6),
+                }
+                for entry in self.timeline
+            ],
+            "rpc_latencies": {name: round(statistics.median(samples), 6)
+                              for name, samples in self._rpc_samples.items()},
+            "screenshots": {"start": first_screenshot, "end": last_screenshot},
+        }
+        if self.out_dir:
+            with open(os.path.join(self.out_dir, "recording.json"), "w", encoding="utf-8") as f:
+                json.dump(recording, f, ensure_ascii=False, indent=2)
+        return recording
+
+
+class _RecordingActions:
+    """传给工作流的 Actions 代理：公开方法的调用经过 Recorder 记录，其余属性（如 device）直接转发"""
+
+    def __init__(self, actions: Actions, recorder: Recorder):
+        self._actions = actions
+        self._recorder = recorder
+
+    def __getattr__(self, name: str):
+        member = getattr(type(self._actions), name, None)
+        if name.startswith("_") or not inspect.isfunction(member):
+            return getattr(self._actions, name)
+        return lambda *args, **kwargs: self._recorder._invoke(self._actions, name, args, kwargs)
+
+
+# ==================== 回放 ====================
+
+def _parse_bounds(bounds: str, width: int, height: int) -> tuple:
+    """[l,t][r,b] 转为相对屏幕宽高的比例"""
+    left, top, right, bottom = (int(v) for v in bounds.replace("][", ",").strip("[]").split(","))
+    return left / width, top / height, right / width, bottom / height
+
+
+def screen_from_hierarchy(xml: str, width: int, height: int) -> dict:
+    """
+    把 dump_hierarchy 的 XML 转为模拟设备的页面
+
+    Args:
+        xml: 界面结构
+        width: 屏幕宽度
+        height: 屏幕高度
+
+    Returns:
+        模拟设备脚本中的页面（package、elements）
+    """
+    root = ET.fromstring(xml)
+    package = ""
+
+    def convert(node: ET.Element) -> dict:
+        nonlocal package
+        package = package or node.get("package", "")
+        element = {
+            "text": node.get("text", ""),
+            "className": node.get("class", ""),
+            "bounds": _parse_bounds(node.get("bounds", "[0,0][0,0]"), width, height),
+            "children": [convert(child) for child in node if child.tag == "node"],
+        }
+        if node.get("resource-id"):
+            element["resourceId"] = node.get("resource-id")
+        if node.get("content-desc"):
+            element["description"] = node.get("content-desc")
+        return element
+
+    elements = [convert(child) for child in root if child.tag == "node"]
+    return {"package": package, "elements": elements}
+
+
+class ReplayDevice(FakeDevice):
+    """按录制的页面时间线回放的模拟设备"""
+
+    def __init__(self, recording: dict, recording_dir: str):
+        """
+        初始化回放设备
+
+        Args:
+            recording: recording.json 的内容
+            recording_dir: 录制目录（读取页面快照）
+        """
+        width = recording["device"]["displayWidth"]
+        height = recording["device"]["displayHeight"]
+        screens = {}
+        for name, path in recording["screens"].items():
+            with open(os.path.join(recording_dir, path), encoding="utf-8") as f:
+                screens[name] = screen_from_hierarchy(f.read(), width, height)
+        script = {"start": recording["start_screen"], "apps": {}, "screens": screens}
+        super().__init__(script=script, width=width, height=height, rpc_latencies=recording["rpc_latencies"])
+        self.timeline = recording["timeline"]
+        self.step = 0
+        self.divergences: List[str] = []  # 与录制顺序不一致的设备调用
+        self._deferred = None  # (生效时间, 页面)：当前调用结束后才开始的页面切换
+
+    def _rpc(self, name: str):
+        # 上一次界面操作的页面切换从下一次设备调用开始计入，避免点击的调用本身在新页面上查找元素
+        if self._deferred is not None:
+            self._screen()
+            self._pending, self._deferred = self._deferred, None
+        super()._rpc(name)
+        if name not in MUTATING_RPCS:
+            return
+        if self.step >= len(self.timeline):
+            self.divergences.append(f"录制结束后多出的调用: {name}")
+            return
+        expected = self.timeline[self.step]
+        if expected["rpc"] != name:
+            self.divergences.append(f"第 {self.step} 次界面操作应为 {expected['rpc']}，实际为 {name}")
+            return
+        self.step += 1
+        if expected["screen"]:
+            self._deferred = (time.monotonic() + expected["delay"] * self.delay_scale, expected["screen"])
+
+    # 页面切换完全由时间线决定，不再按元素、应用或按键跳转
+    def _tap(self, element: dict):
+        pass
+
+    def app_start(self, package_name: str, activity: Optional[str] = None, wait: bool = False, stop: bool = False):
+        self._rpc("app_start")
+
+    def app_stop(self, package_name: str):
+        self._rpc("app_stop")
+
+    def press(self, key: str):
+        self._rpc("press")
+
+
+def replay(recording_dir: str) -> dict:
+    """
+    在模拟设备上回放录制的工作流
+
+    Args:
+        recording_dir: 录制目录
+
+    Returns:
+        回放报告：录制和回放的调用记录、耗时和差异
+    """
+    with open(os.path.join(recording_dir, "recording.json"), encoding="utf-8") as f:
+        recording = json.load(f)
+    device = ReplayDevice(recording, recording_dir)
+    replayed = Recorder(device).run(recording["app"], recording["workflow"], recording["params"])
+
+    mismatches = []
+    for index in range(max(len(recording["calls"]), len(replayed["calls"]))):
+        recorded = recording["calls"][index] if index < len(recording["calls"]) else None
+        actual = replayed["calls"][index] if index < len(replayed["calls"]) else None
+        if recorded is None or actual is None or recorded["method"] != actual["method"] \
+                or recorded["result"] != actual["result"] or bool(recorded["error"]) != bool(actual["error"]):
+            mismatches.append(index)
+
+    return {
+        "recording": recording,
+        "replay": replayed,
+        "divergences": device.divergences,
+        "mismatches": mismatches,
+        "timeline_consumed": f"{device.step}/{len(device.timeline)}",
+    }
+
+
+def print_report(report: dict):
+    """打印录制和回放的逐个调用对比（耗时单位: 毫秒，录制耗时已扣除快照和截图的开销）"""
+    recording, replayed = report["recording"], report["replay"]
+    print(f"\n{'='*78}")
+    print(f"🎬 回放 {recording['app']}.{recording['workflow']}（录制于 {recording['recorded_at']}，"
+          f"{recording['device']['brand']} {recording['device']['model']}）")
+    print(f"{'='*78}")
+    print(f"  {'#':>3}  {'调用':<22}{'录制':>10}{'回放':>10}  结果")
+    calls = max(len(recording["calls"]), len(replayed["calls"]))
+    for index in range(calls):
+        recorded = recording["calls"][index] if index < len(recording["calls"]) else None
+        actual = replayed["calls"][index] if index < len(replayed["calls"]) else None
+        name = (recorded or actual)["method"]
+        recorded_ms = f"{(recorded['duration'] - recorded['overhead']) * 1000:.1f}" if recorded else "-"
+        actual_ms = f"{actual['duration'] * 1000:.1f}" if actual else "-"
+        mark = "✗" if index in report["mismatches"] else "✓"
+        outcome = (actual or recorded)["error"] or (actual or recorded)["result"]
+        print(f"  {index:>3}  {name:<22}{recorded_ms:>10}{actual_ms:>10}  {mark} {outcome}")
+    print(f"  {'-'*60}")
+    print(f"  总耗时: 录制 {(recording['duration'] - recording['overhead']) * 1000:.1f} ms，"
+          f"回放 {replayed['duration'] * 1000:.1f} ms")
+    print(f"  结果: 录制 {recording['result'].get('success')}，回放 {replayed['result'].get('success')}")
+    print(f"  页面时间线: {report['timeline_consumed']}")
+    for divergence in report["divergences"]:
+        print(f"  ⚠️  {divergence}")
+    print(f"{'='*78}\n")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="工作流录制与回放")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser("record", help="在设备上执行工作流并录制")
+    record_parser.add_argument("app", help="应用名称")
+    record_parser.add_argument("workflow", help="工作流名称")
+    record_parser.add_argument("--params", default="{}", help='工作流参数（JSON），如 \'{"image_index": 0}\'')
+    record_parser.add_argument("--out", default=None, help="输出目录（默认 recordings/<app>.<workflow>-<时间>）")
+    record_parser.add_argument("--screenshots", choices=SCREENSHOT_MODES, default="key",
+                               help="截图时机：none / key（开始、结束和失败时）/ all（每次操作之后）")
+    record_parser.add_argument("--serial", default=None, help="设备序列号（默认第一个设备）")
+
+    replay_parser = subparsers.add_parser("replay", help="在模拟设备上回放录制结果")
+    replay_parser.add_argument("recording", help="录制目录")
+    replay_parser.add_argument("--json", dest="json_path", default=None, help="回放报告保存为 JSON 文件")
+
+    args = parser.parse_args(argv)
+    log.setup()
+
+    if args.command == "record":
+        from device import DeviceManager
+        device = DeviceManager(args.serial).connect()
+        out_dir = args.out or os.path.join(
+            "recordings", f"{args.app}.{args.workflow}-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+        )
+        recording = Recorder(device, out_dir, args.screenshots).run(args.app, args.workflow, json.loads(args.params))
+        print(f"💾 已录制 {len(recording['calls'])} 次调用、{len(recording['screens'])} 个页面: {out_dir}")
+        return
+
+    report = replay(args.recording)
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 回放报告已保存: {args.json_path}")
+    if report["mismatches"] or report["divergences"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
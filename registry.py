@@ -0,0 +1,242 @@
+"""客户端注册表 - 支持多个服务端节点共享
+
+单个服务端进程能保持的 WebSocket 连接数有限。多节点模式下，多个 TaskServer 进程
+共享同一个注册表和任务队列：
+
+    - 注册表记录每个客户端连接在哪个节点上，保证 client_id 在集群内唯一
+    - 任务写入共享队列，由持有该客户端连接的节点领取并下发
+    - 执行结果写回共享队列，提交任务的节点从队列读取结果
+
+ClientRegistry 是单进程内存实现（默认），SQLiteRegistry 是同一台机器上多个进程
+共享的实现；其他后端（如 Redis）实现相同的方法即可接入。
+"""
+import json
+import sqlite3
+import time
+from typing import Dict, List, Optional
+
+
+class ClientRegistry:
+    """单进程内存注册表"""
+
+    # 是否在多个进程间共享（共享时服务端需要从任务队列读取其他节点写入的结果）
+    shared = False
+
+    def __init__(self, node_timeout: float = 30):
+        """
+        初始化注册表
+
+        Args:
+            node_timeout: 节点心跳超时时间（秒），超时节点上的客户端和已下发任务会被其他节点接管
+        """
+        self.node_timeout = node_timeout
+        self._nodes: Dict[str, float] = {}  # node_id -> 最近一次心跳时间
+        self._clients: Dict[str, dict] = {}  # client_id -> 客户端记录
+
+    # ==================== 节点 ====================
+
+    def heartbeat_node(self, node_id: str):
+        """节点心跳（注册节点也使用该方法）"""
+        self._nodes[node_id] = time.time()
+
+    def dead_nodes(self, timeout: float) -> List[str]:
+        """超过 timeout 秒没有心跳的节点"""
+        now = time.time()
+        return [node_id for node_id, seen in self._nodes.items() if now - seen > timeout]
+
+    def live_nodes(self, timeout: float) -> List[str]:
+        """timeout 秒内有心跳的节点"""
+        now = time.time()
+        return [node_id for node_id, seen in self._nodes.items() if now - seen <= timeout]
+
+    def remove_node(self, node_id: str) -> List[str]:
+        """
+        移除节点及其上的所有客户端
+
+        Returns:
+            被移除的客户端 ID
+        """
+        self._nodes.pop(node_id, None)
+        removed = [cid for cid, record in self._clients.items() if record["node_id"] == node_id]
+        for client_id in removed:
+            del self._clients[client_id]
+        return removed
+
+    # ==================== 客户端 ====================
+
+    def register_client(self, client_id: str, node_id: str, device_info: dict) -> bool:
+        """
+        注册客户端
+
+        Returns:
+            是否注册成功（client_id 已被占用时返回 False）
+        """
+        if client_id in self._clients:
+            return False
+        self._clients[client_id] = {
+            "client_id": client_id,
+            "node_id": node_id,
+            "device_info": device_info,
+            "state": {},
+            "registered_at": time.time(),
+        }
+        return True
+
+    def update_client(self, client_id: str, state: dict):
+        """更新客户端调度状态（用于展示和跨节点查询）"""
+        record = self._clients.get(client_id)
+        if record is not None:
+            record["state"] = state
+
+    def remove_client(self, client_id: str, node_id: str):
+        """移除客户端（只移除登记在该节点上的记录）"""
+        record = self._clients.get(client_id)
+        if record is not None and record["node_id"] == node_id:
+            del self._clients[client_id]
+
+    def get_client(self, client_id: str) -> Optional[dict]:
+        """获取客户端记录"""
+        return self._clients.get(client_id)
+
+    def list_clients(self) -> List[dict]:
+        """获取所有在线客户端"""
+        return list(self._clients.values())
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cluster_nodes (
+    node_id TEXT PRIMARY KEY,
+    last_seen REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cluster_clients (
+    client_id TEXT PRIMARY KEY,
+    node_id TEXT NOT NULL,
+    device_info TEXT NOT NULL,
+    state TEXT NOT NULL,
+    registered_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cluster_clients_node ON cluster_clients (node_id);
+"""
+
+
+class SQLiteRegistry(ClientRegistry):
+    """基于 SQLite 的共享注册表（同一台机器上的多个服务端进程）
+
+    通常与任务队列使用同一个数据库文件：
+
+        TaskServer(port=8001, queue_path="cluster.db", registry=SQLiteRegistry("cluster.db"))
+        TaskServer(port=8002, queue_path="cluster.db", registry=SQLiteRegistry("cluster.db"))
+    """
+
+    shared = True
+
+    def __init__(self, path: str = "cluster.db", node_timeout: float = 30):
+        """
+        初始化注册表
+
+        Args:
+            path: SQLite 数据库文件路径
+            node_timeout: 节点心跳超时时间（秒），超时节点上的客户端和已下发任务会被其他节点接管
+        """
+        self.path = path
+        self.node_timeout = node_timeout
+        # timeout: 多个进程同时写入时等待锁的时间
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=10)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        """关闭数据库连接"""
+        self.conn.close()
+
+    # ==================== 节点 ====================
+
+    def heartbeat_node(self, node_id: str):
+        self.conn.execute(
+            "INSERT INTO cluster_nodes (node_id, last_seen) VALUES (?, ?)"
+            " ON CONFLICT(node_id) DO UPDATE SET last_seen = excluded.last_seen",
+            (node_id, time.time()),
+        )
+
+    def dead_nodes(self, timeout: float) -> List[str]:
+        rows = self.conn.execute(
+            "SELECT node_id FROM cluster_nodes WHERE last_seen < ?", (time.time() - timeout,)
+        ).fetchall()
+        return [row["node_id"] for row in rows]
+
+    def live_nodes(self, timeout: float) -> List[str]:
+        rows = self.conn.execute(
+            "SELECT node_id FROM cluster_nodes WHERE last_seen >= ?", (time.time() - timeout,)
+        ).fetchall()
+        return [row["node_id"] for row in rows]
+
+    def remove_node(self, node_id: str) -> List[str]:
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self.conn.execute(
+                "SELECT client_id FROM cluster_clients WHERE node_id = ?", (node_id,)
+            ).fetchall()
+            self.conn.execute("DELETE FROM cluster_clients WHERE node_id = ?", (node_id,))
+            self.conn.execute("DELETE FROM cluster_nodes WHERE node_id = ?", (node_id,))
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return [row["client_id"] for row in rows]
+
+    # ==================== 客户端 ====================
+
+    def register_client(self, client_id: str, node_id: str, device_info: dict) -> bool:
+        # BEGIN IMMEDIATE：检查和写入在同一个写事务中，避免两个节点同时注册同一个 client_id
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute(
+                "SELECT c.node_id, n.last_seen FROM cluster_clients c"
+                " LEFT JOIN cluster_nodes n ON n.node_id = c.node_id WHERE c.client_id = ?",
+                (client_id,),
+            ).fetchone()
+            if row is not None:
+                node_alive = row["last_seen"] is not None and time.time() - row["last_seen"] <= self.node_timeout
+                if node_alive:
+                    self.conn.execute("ROLLBACK")
+                    return False
+            self.conn.execute(
+                "INSERT OR REPLACE INTO cluster_clients (client_id, node_id, device_info, state, registered_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (client_id, node_id, json.dumps(device_info, ensure_ascii=False), "{}", time.time()),
+            )
+            self.conn.execute("COMMIT")
+            return True
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def update_client(self, client_id: str, state: dict):
+        self.conn.execute(
+            "UPDATE cluster_clients SET state = ? WHERE client_id = ?",
+            (json.dumps(state, ensure_ascii=False), client_id),
+        )
+
+    def remove_client(self, client_id: str, node_id: str):
+        self.conn.execute(
+            "DELETE FROM cluster_clients WHERE client_id = ? AND node_id = ?", (client_id, node_id)
+        )
+
+    def get_client(self, client_id: str) -> Optional[dict]:
+        row = self.conn.execute(
+            "SELECT * FROM cluster_clients WHERE client_id = ?", (client_id,)
+        ).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list_clients(self) -> List[dict]:
+        rows = self.conn.execute("SELECT * FROM cluster_clients ORDER BY registered_at").fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def _to_dict(self, row: sqlite3.Row) -> dict:
+        """数据库行转为字典"""
+        record = dict(row)
+        record["device_info"] = json.loads(record["device_info"])
+        record["state"] = json.loads(record["state"])
+        return record
@@ -0,0 +1,136 @@
+"""幂等请求支持 - 结果缓存与进行中请求合并
+
+上游调用方在超时后会用同一个 idempotency_key 重试：
+    - 同一个 key 的请求仍在执行时，重复请求等待同一个结果，不会再次在手机上执行
+    - 已成功完成的结果在 TTL 内直接从缓存返回
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional, Tuple
+
+
+def request_fingerprint(app: str, workflow: str, params: Optional[dict]) -> str:
+    """计算请求内容的指纹，用于发现同一个 key 被用于不同请求的情况"""
+    payload = json.dumps([app, workflow, params or {}], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def conflict_result(key: str) -> dict:
+    """同一个 idempotency_key 用于不同请求时返回的错误"""
+    return {
+        "success": False,
+        "error": f"idempotency_key '{key}' 已被用于不同的请求",
+        "code": "IDEMPOTENCY_KEY_CONFLICT",
+    }
+
+
+class ResultCache:
+    """带过期时间的 LRU 结果缓存（线程安全）"""
+
+    def __init__(self, max_size: int = 1024, ttl: float = 600):
+        """
+        初始化缓存
+
+        Args:
+            max_size: 最多缓存的结果数，超出时淘汰最久未使用的结果
+            ttl: 结果的有效期（秒）
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items: "OrderedDict[str, Tuple[float, str, dict]]" = OrderedDict()  # key -> (过期时间, 指纹, 结果)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[str, dict]]:
+        """
+        读取缓存
+
+        Returns:
+            (请求指纹, 结果)，不存在或已过期时返回 None
+        """
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            expires_at, fingerprint, result = item
+            if expires_at <= time.time():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return fingerprint, result
+
+    def put(self, key: str, fingerprint: str, result: dict):
+        """写入缓存"""
+        with self._lock:
+            self._items[key] = (time.time() + self.ttl, fingerprint, result)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class IdempotencyGuard:
+    """同步代码中的幂等执行（用于 Flask 等多线程服务）"""
+
+    def __init__(self, cache: Optional[ResultCache] = None):
+        """
+        初始化
+
+        Args:
+            cache: 结果缓存，默认新建一个
+        """
+        self.cache = cache or ResultCache()
+        self._inflight: Dict[str, Tuple[str, Future]] = {}  # key -> (指纹, future)
+        self._lock = threading.Lock()
+
+    def run(self, key: str, fingerprint: str, func: Callable[[], dict]) -> dict:
+        """
+        按 key 幂等地执行 func
+
+        Args:
+            key: idempotency_key
+            fingerprint: 请求指纹（见 request_fingerprint）
+            func: 实际执行请求的函数，返回结果字典
+
+        Returns:
+            结果字典。来自缓存或合并到进行中请求的成功结果带有 "cached": True
+        """
+        cached = self.cache.get(key)
+        if cached is None:
+            with self._lock:
+                # 加锁后再查一次：进行中的请求可能刚好写入缓存并结束
+                cached = self.cache.get(key)
+                inflight = self._inflight.get(key) if cached is None else None
+                owner = cached is None and inflight is None
+                if owner:
+                    future = Future()
+                    self._inflight[key] = (fingerprint, future)
+
+        if cached is not None:
+            if cached[0] != fingerprint:
+                return conflict_result(key)
+            return dict(cached[1], cached=True)
+
+        if not owner:
+            if inflight[0] != fingerprint:
+                return conflict_result(key)
+            result = inflight[1].result()
+            return dict(result, cached=True) if result.get("success") else dict(result)
+
+        try:
+            result = func()
+            if result.get("success"):
+                self.cache.put(key, fingerprint, result)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
@@ -0,0 +1,180 @@
+"""任务调度模块 - 根据客户端实时状态自动选择执行设备
+
+调度依据（均来自心跳和任务结果）：
+    - is_busy: 客户端心跳上报的忙碌状态
+    - inflight: 服务端已下发但尚未返回结果的任务数（队列深度）
+    - latency: 每个客户端上各工作流的近期耗时（指数移动平均）
+    - current_app: 客户端最近一次运行的应用（已在前台，启动更快）
+"""
+import time
+from typing import Dict, Iterable, Optional
+
+
+class LoadAwareScheduler:
+    """负载感知调度器
+
+    为每个客户端维护一份状态字典，并按"预计完成时间"最短的原则选择设备：
+
+        预计完成时间 = 排队等待时间 + 本工作流预计耗时 - 应用已预热的收益
+    """
+
+    def __init__(
+        self,
+        default_latency: float = 10.0,
+        warm_bonus: float = 3.0,
+        ewma_alpha: float = 0.3,
+    ):
+        """
+        初始化调度器
+
+        Args:
+            default_latency: 没有历史数据时假定的工作流耗时（秒）
+            warm_bonus: 目标应用已在前台时节省的时间（秒）
+            ewma_alpha: 耗时指数移动平均的平滑系数（越大越偏向最近的样本）
+        """
+        self.default_latency = default_latency
+        self.warm_bonus = warm_bonus
+        self.ewma_alpha = ewma_alpha
+        self.states: Dict[str, dict] = {}  # client_id -> state
+        self.fleet_latency: Dict[str, float] = {}  # "app.workflow" -> 全体客户端平均耗时
+
+    # ==================== 状态更新 ====================
+
+    def on_register(self, client_id: str):
+        """客户端注册"""
+        self.states[client_id] = {
+            "is_busy": False,
+            "inflight": 0,
+            "current_app": None,
+            "latency": {},  # "app.workflow" -> 该客户端的平均耗时
+            "last_heartbeat": time.time(),
+            "last_dispatch": 0.0,
+        }
+
+    def on_disconnect(self, client_id: str):
+        """客户端断开"""
+        self.states.pop(client_id, None)
+
+    def on_heartbeat(self, client_id: str, data: dict):
+        """收到心跳，更新忙碌状态和前台应用"""
+        state = self.states.get(client_id)
+        if state is None:
+            return
+        state["is_busy"] = bool(data.get("is_busy", False))
+        state["last_heartbeat"] = time.time()
+        if data.get("current_app"):
+            state["current_app"] = data["current_app"]
+
+    def on_dispatch(self, client_id: str):
+        """任务已下发到客户端"""
+        state = self.states.get(client_id)
+        if state is None:
+            return
+        state["inflight"] += 1
+        state["last_dispatch"] = time.time()
+
+    def on_result(self, client_id: str, app: str, workflow: str, result: dict):
+        """收到任务结果，更新队列深度、耗时统计和前台应用"""
+        state = self.states.get(client_id)
+        if state is None:
+            return
+        state["inflight"] = max(0, state["inflight"] - 1)
+
+        # 设备忙碌或超时的结果不代表工作流耗时，不计入统计；
+        # 超时的任务可能仍在设备上执行，等下一次心跳再恢复空闲状态
+        if result.get("code") in ("DEVICE_BUSY", "TIMEOUT"):
+            state["is_busy"] = True
+            return
+        state["is_busy"] = False
+
+        duration = result.get("duration")
+        if result.get("success") and isinstance(duration, (int, float)):
+            key = f"{app}.{workflow}"
+            state["latency"][key] = self._ewma(state["latency"].get(key), duration)
+            self.fleet_latency[key] = self._ewma(self.fleet_latency.get(key), duration)
+            state["current_app"] = app
+
+    def _ewma(self, previous: Optional[float], sample: float) -> float:
+        """指数移动平均"""
+        if previous is None:
+            return float(sample)
+        return self.ewma_alpha * sample + (1 - self.ewma_alpha) * previous
+
+    # ==================== 调度 ====================
+
+    def is_idle(self, client_id: str) -> bool:
+        """客户端是否空闲（心跳未报忙碌且没有在途任务）"""
+        state = self.states.get(client_id)
+        return state is not None and not state["is_busy"] and state["inflight"] == 0
+
+    def estimate(self, client_id: str, app: str, workflow: str) -> float:
+        """估算任务在该客户端上的完成时间（秒）"""
+        state = self.states[client_id]
+        key = f"{app}.{workflow}"
+        latency = state["latency"].get(key)
+        if latency is None:
+            latency = self.fleet_latency.get(key, self.default_latency)
+
+        # 排队等待时间：在途任务按各自的平均耗时估算
+        queued = state["inflight"] + (1 if state["is_busy"] and state["inflight"] == 0 else 0)
+        avg_latency = (
+            sum(state["latency"].values()) / len(state["latency"])
+            if state["latency"]
+            else self.default_latency
+        )
+        wait = queued * avg_latency
+
+        if state["current_app"] == app:
+            latency = max(0.0, latency - self.warm_bonus)
+
+        return wait + latency
+
+    def pick(
+        self,
+        app: str,
+        workflow: str,
+        candidates: Optional[Iterable[str]] = None,
+        idle_only: bool = True,
+    ) -> Optional[str]:
+        """
+        选择最合适的客户端
+
+        Args:
+            app: 应用名称
+            workflow: 工作流名称
+            candidates: 候选客户端 ID，默认为全部已注册客户端
+            idle_only: 是否只选择空闲客户端（客户端同一时间只能执行一个任务）
+
+        Returns:
+            客户端 ID，没有可用客户端时返回 None
+        """
+        if candidates is None:
+            candidates = list(self.states.keys())
+
+        best_id = None
+        best_key = None
+        for client_id in candidates:
+            if client_id not in self.states:
+                continue
+            if idle_only and not self.is_idle(client_id):
+                continue
+            # 预计完成时间相同时，优先选择最久没有下发任务的客户端，让负载均匀分布
+            key = (
+                self.estimate(client_id, app, workflow),
+                self.states[client_id]["last_dispatch"],
+            )
+            if best_key is None or key < best_key:
+                best_id, best_key = client_id, key
+        return best_id
+
+    def snapshot(self, client_id: str) -> dict:
+        """获取客户端调度状态（用于展示）"""
+        state = self.states.get(client_id)
+        if state is None:
+            return {}
+        return {
+            "is_busy": state["is_busy"],
+            "inflight": state["inflight"],
+            "current_app": state["current_app"],
+            "latency": {k: round(v, 2) for k, v in state["latency"].items()},
+        }
@@ -9,57 +9,165 @@
 
 运行方式：
     python server_example.py
+
+多节点模式（多个进程共享客户端注册表和任务队列，任务可以从任意节点提交）：
+    python server_example.py --port 8001 --queue-db cluster.db --cluster
+    python server_example.py --port 8002 --queue-db cluster.db --cluster
 """
+import argparse
 import asyncio
 import websockets
 import json
+import logging
+import math
+import os
 import uuid
 import time
-from datetime import datetime
-from typing import Dict, Set
+from typing import Dict, Optional, Set
+import instrumentation
+import log
+import tracing
+from scheduler import LoadAwareScheduler
+from task_queue import TaskQueue, QUEUED, DONE, FAILED, MAX_BACKOFF, DEFAULT_PATH
+from result_cache import ResultCache, request_fingerprint, conflict_result
+from registry import ClientRegistry, SQLiteRegistry
+
+logger = logging.getLogger(__name__)
+
+# 未指定 wait_timeout 时，在执行时间之外额外等待排队的时间（秒）
+DEFAULT_QUEUE_WAIT = 60.0
 
 
 class TaskServer:
     """WebSocket 任务服务端"""
 
-    def __init__(self, host="0.0.0.0", port=8000):
+    def __init__(
+        self,
+        host="0.0.0.0",
+        port=8000,
+        heartbeat_timeout: float = 90,
+        sweep_interval: float = 10,
+        queue_path: str = DEFAULT_PATH,
+        queue_ttl: float = 600,
+        queue_retention: float = 86400,
+        purge_interval: float = 3600,
+        dispatch_interval: float = 1.0,
+        dispatch_batch: int = 500,
+        result_cache_size: int = 1024,
+        result_cache_ttl: float = 600,
+        registry: Optional[ClientRegistry] = None,
+        node_id: Optional[str] = None,
+        trace_dir: Optional[str] = None,
+    ):
+        """
+        初始化服务端
+
+        Args:
+            host: 监听地址
+            port: 监听端口
+            heartbeat_timeout: 心跳超时时间（秒），超过该时间未收到任何消息的客户端会被剔除
+            sweep_interval: 心跳超时检查间隔（秒）
+            queue_path: 持久化任务队列的 SQLite 文件路径，默认为 task_queue.py 所在目录下的 tasks.db
+            queue_ttl: 任务在队列中最长等待时间（秒）
+            queue_retention: 已结束的任务在队列数据库中保留的时间（秒），不短于 result_cache_ttl
+                （幂等请求在有效期内要从数据库中查到已成功的任务）
+            purge_interval: 删除过期任务的间隔（秒）
+            dispatch_interval: 调度循环的最长间隔（秒），用于检查执行超时和重试退避
+            dispatch_batch: 每轮调度最多扫描的就绪任务数
+            result_cache_size: 按 idempotency_key 缓存的成功结果数
+            result_cache_ttl: 成功结果的缓存时间（秒），期间相同 key 的请求直接返回缓存结果
+            registry: 客户端注册表，默认为单进程内存注册表。多节点模式下各节点使用指向
+                同一个 queue_path 文件的 SQLiteRegistry
+            node_id: 本节点 ID，默认自动生成
+            trace_dir: 链路追踪输出目录。设置后每个任务结束时导出一个 Chrome Trace 文件
+                （服务端排队、下发和客户端执行的 span，见 tracing.py），默认不追踪
+        """
         self.host = host
         self.port = port
+        self.heartbeat_timeout = heartbeat_timeout
+        self.sweep_interval = sweep_interval
+        self.queue_ttl = queue_ttl
+        self.queue_retention = max(queue_retention, result_cache_ttl)
+        self.purge_interval = purge_interval
+        self._last_purge = 0.0
+        self.dispatch_interval = dispatch_interval
+        self.dispatch_batch = dispatch_batch
         self.clients: Dict[str, websockets.WebSocketServerProtocol] = {}  # client_id -> websocket
         self.client_info: Dict[str, dict] = {}  # client_id -> device_info
-        self.pending_tasks: Dict[str, asyncio.Future] = {}  # task_id -> future
+        self.last_seen: Dict[str, float] = {}  # client_id -> 最近一次收到消息的时间
+        self.pending_tasks: Dict[str, asyncio.Future] = {}  # task_id -> 等待结果的 future
+        self.task_assignments: Dict[str, dict] = {}  # task_id -> 本次执行的客户端及截止时间
+        self.queue = TaskQueue(queue_path)  # 持久化任务队列
+        self.result_cache = ResultCache(result_cache_size, result_cache_ttl)  # idempotency_key -> 成功结果
+        self.scheduler = LoadAwareScheduler()  # 负载感知调度（本节点持有连接的客户端）
+        self.registry = registry or ClientRegistry()  # 集群内所有客户端
+        self.node_id = node_id or f"node-{uuid.uuid4().hex[:8]}"
+        self._queue_changed = asyncio.Event()  # 有新任务或客户端变为空闲时唤醒调度循环
+        self.trace_dir = trace_dir
+        self.traces: Dict[str, dict] = {}  # task_id -> {"trace", "root", "attempt", "last_end"}（仅开启追踪时，任务结束后由调度循环清理）
 
     async def start(self):
         """启动服务端"""
-        print(f"{'='*60}")
-        print(f"🚀 WebSocket 服务端启动")
-        print(f"{'='*60}")
-        print(f"📡 监听地址: ws://{self.host}:{self.port}/ws")
-        print(f"⏰ 启动时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        print(f"{'='*60}\n")
-
-        async with websockets.serve(self.handle_client, self.host, self.port):
-            await asyncio.Future()  # 永久运行
-
-    async def handle_client(self, websocket, path):
-        """处理客户端连接"""
+        logger.info("🚀 WebSocket 服务端启动，监听地址: ws://%s:%s/ws", self.host, self.port)
+        logger.info("🗄️ 任务队列: %s", self.queue.path)
+        if self.registry.shared:
+            logger.info("🕸️ 多节点模式: %s", self.node_id)
+
+        background = self.start_background_tasks()
+
+        try:
+            async with websockets.serve(self.handle_client, self.host, self.port):
+                await asyncio.Future()  # 永久运行
+        finally:
+            for task in background:
+                task.cancel()
+
+    def start_background_tasks(self) -> list:
+        """恢复重启前未完成的任务，并启动心跳检查和任务调度
+
+        集成到其他框架（如 FastAPI）时，需要在事件循环启动后调用一次。
+
+        Returns:
+            后台任务列表（停止服务时取消）
+        """
+        self.registry.heartbeat_node(self.node_id)
+        if self.registry.shared:
+            # 其他节点可能仍在运行，只接管已停止节点的任务
+            self._take_over_dead_nodes()
+        else:
+            recovered = self.queue.recover()
+            if recovered["requeued"] or recovered["failed"]:
+                logger.info("♻️ 恢复任务: 重新排队 %s 个，标记失败 %s 个", recovered["requeued"], recovered["failed"])
+        logger.info("📋 队列状态: %s", self.queue.stats())
+
+        return [
+            asyncio.create_task(self._sweep_heartbeats()),
+            asyncio.create_task(self._dispatch_loop()),
+        ]
+
+    async def handle_client(self, websocket, path=None):
+        """处理客户端连接（新版 websockets 调用处理函数时不再传入 path）"""
         client_id = None
 
         try:
-            print(f"📱 新客户端连接: {websocket.remote_address}")
+            logger.info("📱 新客户端连接: %s", websocket.remote_address)
 
             async for message in websocket:
                 try:
                     data = json.loads(message)
                     msg_type = data.get("type")
 
+                    # 任何消息都说明连接仍然存活
+                    if client_id and self.clients.get(client_id) is websocket:
+                        self.last_seen[client_id] = time.time()
+
                     if msg_type == "register":
                         # 注册客户端
                         client_id = data.get("client_id")
                         device_info = data.get("device_info", {})
 
-                        # 检查 client_id 是否已存在
-                        if client_id in self.clients:
+                        # 检查 client_id 是否已存在（多节点模式下在整个集群内检查）
+                        if not self.registry.register_client(client_id, self.node_id, device_info):
                             # 发送冲突响应
                             ack_msg = {
                                 "type": "register_ack",
@@ -69,11 +177,13 @@ class TaskServer:
                                 "server_time": int(time.time())
                             }
                             await websocket.send(json.dumps(ack_msg))
-                            print(f"⚠️ 客户端注册失败: {client_id} (ID 冲突)\n")
+                            logger.warning("⚠️ 客户端注册失败: %s (ID 冲突)", client_id)
                         else:
                             # 注册成功
                             self.clients[client_id] = websocket
                             self.client_info[client_id] = device_info
+                            self.last_seen[client_id] = time.time()
+                            self.scheduler.on_register(client_id)
 
                             # 发送成功响应
                             ack_msg = {
@@ -84,134 +194,545 @@ class TaskServer:
                             }
                             await websocket.send(json.dumps(ack_msg))
 
-                            print(f"✅ 客户端已注册: {client_id}")
-                            print(f"   设备信息: {device_info.get('brand')} {device_info.get('model')}")
-                            print(f"   在线客户端数: {len(self.clients)}\n")
+                            logger.info(
+                                "✅ 客户端已注册: %s 设备信息: %s %s 在线客户端数: %s",
+                                client_id, device_info.get("brand"), device_info.get("model"), len(self.clients),
+                            )
+                            self._queue_changed.set()
 
                     elif msg_type == "heartbeat":
                         # 心跳响应
                         is_busy = data.get("is_busy", False)
-                        print(f"💓 收到心跳: {client_id} [忙碌: {is_busy}]")
+                        logger.debug("💓 收到心跳: %s [忙碌: %s]", client_id, is_busy)
+                        if client_id:
+                            self.scheduler.on_heartbeat(client_id, data)
+                            self.registry.update_client(client_id, self.scheduler.snapshot(client_id))
+                            if not is_busy:
+                                self._queue_changed.set()
 
                     elif msg_type == "result":
                         # 任务结果
                         task_id = data.get("task_id")
                         success = data.get("success")
 
-                        print(f"\n{'='*60}")
-                        print(f"📥 收到任务结果: {task_id}")
-                        print(f"   成功: {success}")
-                        if success:
-                            print(f"   消息: {data.get('message')}")
-                            print(f"   耗时: {data.get('duration')} 秒")
-                        else:
-                            print(f"   错误: {data.get('error')}")
-                        print(f"{'='*60}\n")
+                        with log.context(task_id=task_id, device=client_id):
+                            if success:
+                                logger.info("📥 收到任务结果: %s 成功 消息: %s 耗时: %s 秒",
+                                            task_id, data.get("message"), data.get("duration"))
+                            else:
+                                logger.warning("📥 收到任务结果: %s 失败 错误: %s", task_id, data.get("error"))
 
-                        # 唤醒等待的任务
-                        if task_id in self.pending_tasks:
-                            self.pending_tasks[task_id].set_result(data)
+                            # 记录结果（忽略已超时或已转派给其他客户端的任务的迟到结果）
+                            assignment = self.task_assignments.get(task_id)
+                            if assignment is None or assignment["client_id"] != client_id:
+                                logger.warning("⚠️ 忽略过期的结果: %s", task_id)
+                            else:
+                                await self._finish_attempt(task_id, data)
 
                     elif msg_type == "pong":
                         # ping-pong 响应
                         pass
 
                 except json.JSONDecodeError:
-                    print(f"⚠️ 无效的 JSON 消息: {message}")
+                    logger.warning("⚠️ 无效的 JSON 消息: %s", message)
                 except Exception as e:
-                    print(f"❌ 处理消息失败: {e}")
+                    logger.error("❌ 处理消息失败: %s", e)
 
         except websockets.exceptions.ConnectionClosed:
-            print(f"📴 客户端断开连接: {client_id or websocket.remote_address}")
+            logger.info("📴 客户端断开连接: %s", client_id or websocket.remote_address)
         except Exception as e:
-            print(f"❌ 连接错误: {e}")
+            logger.error("❌ 连接错误: %s", e)
         finally:
             # 清理客户端
-            if client_id and client_id in self.clients:
-                del self.clients[client_id]
-                if client_id in self.client_info:
-                    del self.client_info[client_id]
-                print(f"🗑️ 已清理客户端: {client_id}")
-                print(f"   剩余在线客户端: {len(self.clients)}\n")
-
-    async def send_task(self, client_id: str, app: str, workflow: str, params: dict = None, timeout: int = 30) -> dict:
+            if client_id and self.clients.get(client_id) is websocket:
+                await self._remove_client(client_id)
+                logger.info("🗑️ 已清理客户端: %s 剩余在线客户端: %s", client_id, len(self.clients))
+
+    async def _remove_client(self, client_id: str):
+        """移除客户端，并结束其在途任务的本次执行
+
+        在途任务以 CLIENT_LOST 结束本次执行：幂等任务按重试策略重新排队，由调度器
+        派给其他健康客户端；其余任务立即失败，避免调用方白白等到超时。
+        """
+        self.clients.pop(client_id, None)
+        self.client_info.pop(client_id, None)
+        self.last_seen.pop(client_id, None)
+        self.registry.remove_client(client_id, self.node_id)
+
+        orphaned = [
+            task_id for task_id, assignment in self.task_assignments.items()
+            if assignment["client_id"] == client_id
+        ]
+        for task_id in orphaned:
+            await self._finish_attempt(task_id, {
+                "type": "result",
+                "task_id": task_id,
+                "success": False,
+                "error": f"客户端 '{client_id}' 已断开，任务未完成",
+                "code": "CLIENT_LOST"
+            })
+
+        self.scheduler.on_disconnect(client_id)
+
+    async def _sweep_heartbeats(self):
+        """定期剔除心跳超时的客户端
+
+        半开的 TCP 连接不会触发 ConnectionClosed，只能通过心跳超时发现。
         """
-        向客户端发送任务并等待结果
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            self.registry.heartbeat_node(self.node_id)
+            if self.registry.shared:
+                self._take_over_dead_nodes()
+
+            now = time.time()
+            expired = [
+                client_id for client_id, seen in self.last_seen.items()
+                if now - seen > self.heartbeat_timeout
+            ]
+            for client_id in expired:
+                ws = self.clients.get(client_id)
+                logger.warning("💀 客户端心跳超时，剔除: %s（%s 秒未收到消息）",
+                               client_id, int(now - self.last_seen[client_id]))
+                await self._remove_client(client_id)
+                if ws is not None:
+                    # 半开连接的关闭握手可能一直等不到响应，放到后台进行
+                    asyncio.create_task(ws.close())
+            if expired:
+                logger.info("剩余在线客户端: %s", len(self.clients))
+
+    def _take_over_dead_nodes(self):
+        """多节点模式：清理已停止节点的客户端记录，并恢复它们已下发的任务"""
+        for node_id in self.registry.dead_nodes(self.registry.node_timeout):
+            removed = self.registry.remove_node(node_id)
+            logger.warning("💀 节点心跳超时: %s（移除 %s 个客户端）", node_id, len(removed))
+
+        live = set(self.registry.live_nodes(self.registry.node_timeout))
+        orphaned = [node_id for node_id in self.queue.dispatched_nodes() if node_id not in live]
+        if orphaned:
+            recovered = self.queue.recover(node_ids=orphaned)
+            logger.info("♻️ 接管节点 %s 的任务: 重新排队 %s 个，标记失败 %s 个",
+                        orphaned, recovered["requeued"], recovered["failed"])
+            self._queue_changed.set()
+
+    # ==================== 任务调度 ====================
+
+    async def _dispatch_loop(self):
+        """调度循环：检查执行超时、让排队过久的任务失败、把就绪任务下发给空闲客户端"""
+        while True:
+            try:
+                await asyncio.wait_for(self._queue_changed.wait(), timeout=self.dispatch_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._queue_changed.clear()
+
+            try:
+                await self._check_attempt_timeouts()
+                for task in self.queue.expire():
+                    logger.warning("⌛ 任务排队超时: %s", task["task_id"])
+                    self._resolve(task["task_id"], task["result"])
+                await self._dispatch_ready()
+                if self.registry.shared:
+                    self._collect_remote_results()
+                if self.traces:
+                    self._prune_traces()
+                self._purge_finished()
+            except Exception as e:
+                logger.error("❌ 任务调度失败: %s", e)
+
+    def _purge_finished(self):
+        """按 purge_interval 删除超过保留时间的已结束任务，避免队列数据库无限增长"""
+        now = time.time()
+        if now - self._last_purge < self.purge_interval:
+            return
+        self._last_purge = now
+        purged = self.queue.purge(self.queue_retention)
+        if purged:
+            logger.info("🧹 已删除 %s 个过期任务", purged)
+
+    async def _dispatch_ready(self):
+        """把就绪任务按入队顺序下发给空闲客户端"""
+        idle = [client_id for client_id in self.clients if self.scheduler.is_idle(client_id)]
+        if not idle:
+            return
+
+        for task in self.queue.ready(limit=self.dispatch_batch):
+            if not idle:
+                break
+            target = task["target_client"]
+            if target:
+                # 指定了客户端的任务只能等该客户端空闲
+                client_id = target if target in idle else None
+            else:
+                client_id = self.scheduler.pick(task["app"], task["workflow"], candidates=idle)
+            if not client_id:
+                continue
+
+            # 多节点共享队列时，任务可能已被其他节点领取
+            if not self.queue.mark_dispatched(task["task_id"], client_id, self.node_id):
+                continue
+
+            idle.remove(client_id)
+            await self._send_attempt(task, client_id)
+
+    async def _send_attempt(self, task: dict, client_id: str):
+        """向客户端下发一次任务执行（任务已由本节点领取）"""
+        task_id = task["task_id"]
+        task_msg = {
+            "type": "task",
+            "task_id": task_id,
+            "app": task["app"],
+            "workflow": task["workflow"],
+            "params": task["params"],
+            "timeout": task["timeout"]
+        }
+        if self.trace_dir:
+            task_msg["trace"] = self._trace_attempt(task, client_id)
+
+        self.scheduler.on_dispatch(client_id)
+        self.task_assignments[task_id] = {
+            "client_id": client_id,
+            "app": task["app"],
+            "workflow": task["workflow"],
+            "deadline": time.time() + task["timeout"],
+            "idempotency_key": task["idempotency_key"],
+            "fingerprint": task["fingerprint"],
+        }
+
+        try:
+            await self.clients[client_id].send(json.dumps(task_msg))
+        except Exception as e:
+            await self._finish_attempt(task_id, {
+                "type": "result",
+                "task_id": task_id,
+                "success": False,
+                "error": str(e),
+                "code": "SEND_ERROR"
+            })
+            return
+
+        with log.context(task_id=task_id, device=client_id, app=task["app"], workflow=task["workflow"]):
+            logger.info("📤 已发送任务: %s（第 %s 次）客户端: %s 参数: %s",
+                        task_id, task["attempts"] + 1, client_id, task["params"])
+
+    async def _check_attempt_timeouts(self):
+        """结束超过执行时间仍未返回结果的任务"""
+        now = time.time()
+        timed_out = [
+            task_id for task_id, assignment in self.task_assignments.items()
+            if assignment["deadline"] <= now
+        ]
+        for task_id in timed_out:
+            await self._finish_attempt(task_id, {
+                "type": "result",
+                "task_id": task_id,
+                "success": False,
+                "error": "任务执行超时",
+                "code": "TIMEOUT"
+            })
+
+    async def _finish_attempt(self, task_id: str, result: dict):
+        """记录一次执行结果：按重试策略重新排队，或结束任务并唤醒等待方"""
+        assignment = self.task_assignments.pop(task_id, None)
+        if assignment is None:
+            return  # 本次执行已经结束（如超时后迟到的结果）
+
+        client_id = assignment["client_id"]
+        self.scheduler.on_result(client_id, assignment["app"], assignment["workflow"], result)
+        self.registry.update_client(client_id, self.scheduler.snapshot(client_id))
+
+        client_trace = result.pop("trace", None) if isinstance(result.get("trace"), dict) else None
+        state = self.queue.complete(task_id, result)
+        if task_id in self.traces:
+            self._trace_result(task_id, result, client_trace, final=state != QUEUED)
+        if state == QUEUED:
+            logger.info("🔁 任务 %s 将重试（%s）", task_id, result.get("code"))
+            with instrumentation.workflow_context(assignment["app"], assignment["workflow"]), \
+                    instrumentation.span("task", "redispatch"):
+                instrumentation.record_retry()
+        else:
+            result = dict(result)
+            result.setdefault("client_id", client_id)
+            if state == DONE and assignment["idempotency_key"]:
+                self.result_cache.put(assignment["idempotency_key"], assignment["fingerprint"], result)
+            self._resolve(task_id, result)
+        self._queue_changed.set()
+
+    # ==================== 链路追踪 ====================
+
+    def _trace_attempt(self, task: dict, client_id: str) -> dict:
+        """记录排队 span 并开始本次执行的 attempt span，返回随 task 消息下发的 trace 上下文"""
+        task_id = task["task_id"]
+        state = self.traces.get(task_id)
+        if state is None:
+            trace = tracing.Trace(task_id, process=f"server:{self.node_id}")
+            root = trace.start_span("task", start=task["created_at"], app=task["app"], workflow=task["workflow"])
+            state = self.traces[task_id] = {"trace": trace, "root": root, "last_end": task["created_at"]}
+
+        trace, root = state["trace"], state["root"]
+        now = time.time()
+        trace.add_span("queue", state["last_end"], now, parent_id=root["span_id"])
+        attempt = trace.start_span("attempt", root["span_id"], now, client_id=client_id,
+                                   attempt=task["attempts"] + 1)
+        state["attempt"] = attempt
+        return {"trace_id": task_id, "parent_id": attempt["span_id"], "sent_at": now}
+
+    def _trace_result(self, task_id: str, result: dict, client_trace: Optional[dict], final: bool):
+        """结束 attempt span、合并客户端的 span；任务结束时导出 trace"""
+        state = self.traces[task_id]
+        trace = state["trace"]
+        attempt = state.pop("attempt", None)
+        if attempt is not None:
+            attempt["attributes"]["code"] = result.get("code")
+            trace.end_span(attempt, status="ok" if result.get("success") else "error")
+        if client_trace:
+            trace.merge(client_trace.get("spans") or [])
+        state["last_end"] = time.time()
+
+        if final:
+            self._export_trace(task_id, result)
+
+    def _export_trace(self, task_id: str, result: Optional[dict]):
+        """结束任务的 trace 并导出"""
+        state = self.traces.pop(task_id)
+        trace = state["trace"]
+        trace.end_span(state["root"], status="ok" if (result or {}).get("success") else "error")
+        path = trace.export(os.path.join(self.trace_dir, f"{task_id}.json"))
+        logger.info("🧭 已导出链路追踪: %s", path)
+
+    def _prune_traces(self):
+        """结束不是在本节点执行完的任务的 trace（排队超时、被其他节点接管后结束），避免一直留在内存中"""
+        waiting = [task_id for task_id in self.traces if task_id not in self.task_assignments]
+        if not waiting:
+            return
+        tasks = {task["task_id"]: task for task in self.queue.get_many(waiting)}
+        for task_id in waiting:
+            task = tasks.get(task_id)
+            if task is None:
+                del self.traces[task_id]
+            elif task["state"] in (DONE, FAILED):
+                self._export_trace(task_id, task["result"])
+
+    def _collect_remote_results(self):
+        """多节点模式：从共享队列读取由其他节点执行完成的任务结果"""
+        remote = [task_id for task_id in self.pending_tasks if task_id not in self.task_assignments]
+        for task in self.queue.get_many(remote):
+            if task["state"] not in (DONE, FAILED):
+                continue
+            result = dict(task["result"] or {})
+            result.setdefault("client_id", task["client_id"])
+            if task["state"] == DONE and task["idempotency_key"]:
+                self.result_cache.put(task["idempotency_key"], task["fingerprint"], result)
+            self._resolve(task["task_id"], result)
+
+    def _resolve(self, task_id: str, result: dict):
+        """唤醒等待任务结果的调用方"""
+        future = self.pending_tasks.pop(task_id, None)
+        if future is not None and not future.done():
+            future.set_result(result)
+
+    # ==================== 任务接口 ====================
+
+    async def send_task(
+        self,
+        client_id: str,
+        app: str,
+        workflow: str,
+        params: dict = None,
+        timeout: int = 30,
+        idempotent: bool = False,
+        wait_timeout: Optional[float] = None,
+        idempotency_key: Optional[str] = None,
+    ) -> dict:
+        """
+        向指定客户端发送任务并等待结果
+
+        任务先写入持久化队列，客户端空闲时下发；失败时按错误码的重试策略
+        （见 task_queue.RETRY_POLICIES）自动重试。
 
         Args:
             client_id: 客户端 ID
             app: 应用名称
             workflow: 工作流名称
             params: 参数字典
-            timeout: 超时时间（秒）
+            timeout: 单次执行的超时时间（秒）
+            idempotent: 任务是否可以安全地重复执行。客户端断开时，幂等任务会重新排队并
+                派给其他空闲客户端，否则立即返回 CLIENT_LOST
+            wait_timeout: 最长等待时间（秒）。None 时按 timeout 推算（见 default_wait_timeout），
+                math.inf 表示等到任务结束。超时后返回 WAIT_TIMEOUT，任务仍留在队列中，可通过 get_task 查询
+            idempotency_key: 调用方提供的幂等键。相同 key 的任务未结束时，重复请求等待同一个
+                结果；已成功的结果在 result_cache_ttl 内直接返回（带 "cached": True），不再下发到设备
 
         Returns:
-            任务执行结果
+            任务执行结果（包含实际执行任务的 client_id）
+        """
+        return await self._enqueue_and_wait(
+            app, workflow, params, timeout, client_id, idempotent, wait_timeout, idempotency_key
+        )
+
+    async def submit(
+        self,
+        app: str,
+        workflow: str,
+        params: dict = None,
+        timeout: int = 30,
+        idempotent: bool = False,
+        wait_timeout: Optional[float] = None,
+        idempotency_key: Optional[str] = None,
+    ) -> dict:
+        """
+        自动选择客户端并执行任务
+
+        根据心跳上报的忙碌状态、在途任务数、各工作流的近期耗时以及目标应用
+        是否已在前台，选择预计最快完成的客户端。所有客户端都忙碌时，任务在
+        队列中等待，最多等待 queue_ttl 秒。
+
+        Args:
+            app: 应用名称
+            workflow: 工作流名称
+            params: 参数字典
+            timeout: 单次执行的超时时间（秒）
+            idempotent: 任务是否可以安全地重复执行（见 send_task）
+            wait_timeout: 最长等待时间（秒），None 时按 timeout 推算（见 send_task）
+            idempotency_key: 调用方提供的幂等键（见 send_task）
+
+        Returns:
+            任务执行结果（包含实际执行任务的 client_id）
         """
-        if client_id not in self.clients:
+        return await self._enqueue_and_wait(
+            app, workflow, params, timeout, None, idempotent, wait_timeout, idempotency_key
+        )
+
+    async def _enqueue_and_wait(
+        self,
+        app: str,
+        workflow: str,
+        params: Optional[dict],
+        timeout: float,
+        target_client: Optional[str],
+        idempotent: bool,
+        wait_timeout: Optional[float],
+        idempotency_key: Optional[str],
+    ) -> dict:
+        """任务入队并等待结果；带 idempotency_key 时优先复用缓存结果或进行中的任务"""
+        if wait_timeout is None:
+            wait_timeout = self.default_wait_timeout(timeout)
+        fingerprint = None
+        if idempotency_key:
+            fingerprint = request_fingerprint(app, workflow, params)
+
+            cached = self.result_cache.get(idempotency_key)
+            if cached is not None:
+                if cached[0] != fingerprint:
+                    return conflict_result(idempotency_key)
+                logger.info("♻️ 命中结果缓存: %s", idempotency_key)
+                return dict(cached[1], cached=True)
+
+            # 进行中的任务，或缓存淘汰/服务端重启后仍在有效期内的成功任务
+            existing = self.queue.find_by_key(idempotency_key, done_within=self.result_cache.ttl)
+            if existing is not None:
+                if existing["fingerprint"] != fingerprint:
+                    return conflict_result(idempotency_key)
+                logger.info("♻️ 复用任务 %s: %s", existing["task_id"], idempotency_key)
+                result = await self.wait_task(existing["task_id"], wait_timeout)
+                return dict(result, cached=True) if result.get("success") else dict(result)
+
+        if target_client is not None and self.registry.get_client(target_client) is None:
             return {
                 "success": False,
-                "error": f"客户端 '{client_id}' 未连接",
+                "error": f"客户端 '{target_client}' 未连接",
                 "code": "CLIENT_NOT_FOUND"
             }
 
-        task_id = str(uuid.uuid4())
-        task_msg = {
-            "type": "task",
-            "task_id": task_id,
-            "app": app,
-            "workflow": workflow,
-            "params": params or {},
-            "timeout": timeout
-        }
+        task_id = self.queue.enqueue(
+            app, workflow, params, timeout,
+            target_client=target_client, idempotent=idempotent, ttl=self.queue_ttl,
+            idempotency_key=idempotency_key, fingerprint=fingerprint,
+        )
+        return await self.wait_task(task_id, wait_timeout)
 
-        # 创建等待future
-        future = asyncio.Future()
-        self.pending_tasks[task_id] = future
+    def default_wait_timeout(self, timeout: float) -> float:
+        """
+        未指定 wait_timeout 时的等待上限
 
-        try:
-            # 发送任务
-            ws = self.clients[client_id]
-            await ws.send(json.dumps(task_msg))
-
-            print(f"\n{'='*60}")
-            print(f"📤 已发送任务: {task_id}")
-            print(f"   客户端: {client_id}")
-            print(f"   应用: {app}")
-            print(f"   工作流: {workflow}")
-            print(f"   参数: {params}")
-            print(f"{'='*60}\n")
-
-            # 等待结果
-            result = await asyncio.wait_for(future, timeout=timeout)
-            return result
+        按 TIMEOUT 重试策略执行完所有次数（每次最多 timeout 秒，另留一次的余量）、
+        加上各次重试的退避时间和 DEFAULT_QUEUE_WAIT 的排队时间。
+        以前 timeout 就是等待上限，改为持久化队列后不再无限等待到队列过期（queue_ttl）。
+
+        Args:
+            timeout: 单次执行的超时时间（秒）
+
+        Returns:
+            等待上限（秒）
+        """
+        policy = self.queue.retry_policies.get("TIMEOUT") or {}
+        attempts = policy.get("max_attempts", 1)
+        backoff = sum(min(policy.get("backoff", 0.0) * 2 ** i, MAX_BACKOFF) for i in range(attempts - 1))
+        return timeout * (attempts + 1) + backoff + DEFAULT_QUEUE_WAIT
+
+    async def wait_task(self, task_id: str, wait_timeout: Optional[float] = None) -> dict:
+        """
+        等待任务结束
+
+        Args:
+            task_id: 任务 ID
+            wait_timeout: 最长等待时间（秒）。None 时按任务的 timeout 推算（见 default_wait_timeout），
+                math.inf 表示等到任务结束
+
+        Returns:
+            任务执行结果
+        """
+        task = self.queue.get(task_id)
+        if task is None:
+            return {"success": False, "task_id": task_id, "error": "任务不存在", "code": "TASK_NOT_FOUND"}
+        if task["state"] in (DONE, FAILED):
+            return task["result"]
+        if wait_timeout is None:
+            wait_timeout = self.default_wait_timeout(task["timeout"])
+
+        future = self.pending_tasks.get(task_id)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self.pending_tasks[task_id] = future
+        self._queue_changed.set()
 
+        try:
+            # shield：等待方超时不影响任务本身和其他等待方
+            return await asyncio.wait_for(asyncio.shield(future),
+                                          timeout=None if math.isinf(wait_timeout) else wait_timeout)
         except asyncio.TimeoutError:
+            task = self.queue.get(task_id)
             return {
                 "success": False,
-                "error": f"任务执行超时（{timeout}秒）",
-                "code": "TIMEOUT"
+                "task_id": task_id,
+                "error": f"等待结果超时（{wait_timeout:g}秒），任务仍在执行",
+                "code": "WAIT_TIMEOUT",
+                "state": task["state"] if task else None
             }
-        except Exception as e:
-            return {
-                "success": False,
-                "error": str(e),
-                "code": "SEND_ERROR"
-            }
-        finally:
-            # 清理
-            if task_id in self.pending_tasks:
-                del self.pending_tasks[task_id]
+
+    def get_task(self, task_id: str) -> Optional[dict]:
+        """查询任务状态和结果"""
+        return self.queue.get(task_id)
+
+    def get_queue_stats(self) -> dict:
+        """获取队列中各状态的任务数"""
+        return self.queue.stats()
 
     def get_online_clients(self) -> list:
-        """获取在线客户端列表"""
+        """获取在线客户端列表（多节点模式下包含所有节点的客户端）"""
         return [
             {
-                "client_id": client_id,
-                "device_info": self.client_info.get(client_id, {}),
-                "connected": True
+                "client_id": record["client_id"],
+                "device_info": record["device_info"],
+                "connected": True,
+                "node_id": record["node_id"],
+                "state": (
+                    self.scheduler.snapshot(record["client_id"])
+                    if record["client_id"] in self.clients
+                    else record["state"]
+                )
             }
-            for client_id in self.clients.keys()
+            for record in self.registry.list_clients()
         ]
 
 
@@ -235,19 +756,17 @@ async def example_usage():
         # 获取在线客户端
         clients = server.get_online_clients()
         if clients:
-            client_id = clients[0]["client_id"]
-            print(f"\n🧪 测试：向客户端 {client_id} 发送任务...\n")
+            logger.info("🧪 测试：自动选择客户端发送任务...")
 
-            # 发送任务
-            result = await server.send_task(
-                client_id=client_id,
+            # 发送任务（由调度器选择客户端）
+            result = await server.submit(
                 app="sunlogin",
                 workflow="execute",
                 params={"image_index": 0},
                 timeout=30
             )
 
-            print(f"\n🧪 测试结果: {result}\n")
+            logger.info("🧪 测试结果: %s", result)
 
 
 # ==================== 集成到 FastAPI 示例 ====================
@@ -261,6 +780,10 @@ from fastapi.responses import JSONResponse
 app = FastAPI()
 task_server = TaskServer()
 
+@app.on_event("startup")
+async def startup():
+    task_server.start_background_tasks()
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await websocket.accept()
@@ -281,6 +804,15 @@ async def send_task_api(
     )
     return JSONResponse(content=result)
 
+@app.post("/api/task/submit")
+async def submit_task_api(app: str, workflow: str, params: dict = None):
+    result = await task_server.submit(app=app, workflow=workflow, params=params)
+    return JSONResponse(content=result)
+
+@app.get("/api/task/{task_id}")
+async def get_task_api(task_id: str):
+    return JSONResponse(content=task_server.get_task(task_id))
+
 @app.get("/api/clients")
 async def get_clients():
     clients = task_server.get_online_clients()
@@ -289,9 +821,26 @@ async def get_clients():
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="WebSocket 任务服务端")
+    parser.add_argument("--host", default="0.0.0.0", help="监听地址")
+    parser.add_argument("--port", type=int, default=8000, help="监听端口")
+    parser.add_argument("--queue-db", default=DEFAULT_PATH, help="任务队列数据库文件（默认在程序所在目录）")
+    parser.add_argument("--cluster", action="store_true", help="多节点模式：与使用同一个 --queue-db 的其他节点共享客户端注册表")
+    parser.add_argument("--node-id", default=None, help="节点 ID（默认自动生成）")
+    parser.add_argument("--trace-dir", default=None, help="链路追踪输出目录（每个任务一个 Chrome Trace 文件）")
+    args = parser.parse_args()
+    log.setup()
+
     try:
         # 简单模式：只启动服务端
-        server = TaskServer(host="0.0.0.0", port=8000)
+        server = TaskServer(
+            host=args.host,
+            port=args.port,
+            queue_path=args.queue_db,
+            registry=SQLiteRegistry(args.queue_db) if args.cluster else None,
+            node_id=args.node_id,
+            trace_dir=args.trace_dir,
+        )
         asyncio.run(server.start())
 
         # 高级模式：启动服务端并测试发送任务（取消注释下面一行）
@@ -0,0 +1,391 @@
+"""持久化任务队列 - 基于 SQLite（WAL 模式）
+
+任务状态流转：
+
+    queued ──下发──> dispatched ──成功──> done
+       ^                 │
+       └──可重试的失败───┤
+                         └──不可重试的失败 / 重试次数用尽──> failed
+
+服务端重启后，未完成的任务仍在数据库中，调用 recover() 即可继续执行。
+已结束的任务由 purge() 定期删除（TaskServer 的调度循环按 purge_interval 调用）。
+
+各方法都是同步的单条 SQL（带索引、WAL + synchronous=NORMAL，通常在 1 毫秒以内），TaskServer 直接在事件循环中调用，
+没有放到线程池：同一个连接跨线程使用需要额外加锁，而线程切换的开销与语句本身相当。
+磁盘很慢或任务量很大（purge 一次删除大量任务）时会短暂阻塞事件循环。
+"""
+import json
+import os
+import sqlite3
+import time
+import uuid
+from typing import Dict, List, Optional
+
+
+# 任务状态
+QUEUED = "queued"
+DISPATCHED = "dispatched"
+DONE = "done"
+FAILED = "failed"
+
+# 按错误码配置的重试策略，未列出的错误码（如 APP_NOT_FOUND、WORKFLOW_NOT_FOUND、
+# EXECUTION_ERROR）不重试
+#   max_attempts: 最多执行次数（包含第一次）
+#   backoff: 第一次重试前的等待时间（秒），之后每次翻倍
+#   idempotent_only: 只有幂等任务才重试（任务可能已在设备上执行过）
+RETRY_POLICIES: Dict[str, dict] = {
+    "DEVICE_BUSY": {"max_attempts": 10, "backoff": 1.0, "idempotent_only": False},
+    "TIMEOUT": {"max_attempts": 3, "backoff": 5.0, "idempotent_only": True},
+    "SEND_ERROR": {"max_attempts": 3, "backoff": 1.0, "idempotent_only": False},
+    "CLIENT_LOST": {"max_attempts": 3, "backoff": 0.0, "idempotent_only": True},
+}
+
+# 退避等待时间上限（秒）
+MAX_BACKOFF = 60.0
+
+# 默认的数据库文件（在本模块所在目录，不随启动时的工作目录变化）
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tasks.db")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT PRIMARY KEY,
+    app TEXT NOT NULL,
+    workflow TEXT NOT NULL,
+    params TEXT NOT NULL,
+    timeout REAL NOT NULL,
+    target_client TEXT,
+    idempotent INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    client_id TEXT,
+    result TEXT,
+    error_code TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    next_attempt_at REAL NOT NULL,
+    expires_at REAL NOT NULL,
+    idempotency_key TEXT,
+    fingerprint TEXT,
+    node_id TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_ready ON tasks (state, next_attempt_at, created_at);
+"""
+
+# 旧版本数据库缺少的列：列名 -> 类型
+_MIGRATIONS = {
+    "idempotency_key": "TEXT",
+    "fingerprint": "TEXT",
+    "node_id": "TEXT",
+}
+
+
+class TaskQueue:
+    """持久化任务队列"""
+
+    def __init__(self, path: str = DEFAULT_PATH, retry_policies: Optional[Dict[str, dict]] = None):
+        """
+        初始化任务队列
+
+        Args:
+            path: SQLite 数据库文件路径，":memory:" 表示不持久化
+            retry_policies: 按错误码配置的重试策略，默认使用 RETRY_POLICIES
+        """
+        self.path = path
+        self.retry_policies = RETRY_POLICIES if retry_policies is None else retry_policies
+        # timeout: 多个服务端进程共享队列时等待写锁的时间
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=10)
+        self.conn.row_factory = sqlite3.Row
+        # WAL 模式下写入只追加日志，读写互不阻塞；synchronous=NORMAL 在 WAL 下仍能保证崩溃一致性
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        """为旧版本数据库补充新增的列和索引"""
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(tasks)")}
+        for name, column_type in _MIGRATIONS.items():
+            if name not in columns:
+                self.conn.execute(f"ALTER TABLE tasks ADD COLUMN {name} {column_type}")
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_tasks_idempotency ON tasks (idempotency_key, created_at)"
+        )
+
+    def close(self):
+        """关闭数据库连接"""
+        self.conn.close()
+
+    # ==================== 入队与查询 ====================
+
+    def enqueue(
+        self,
+        app: str,
+        workflow: str,
+        params: Optional[dict] = None,
+        timeout: float = 30,
+        target_client: Optional[str] = None,
+        idempotent: bool = False,
+        ttl: float = 600,
+        task_id: Optional[str] = None,
+        idempotency_key: Optional[str] = None,
+        fingerprint: Optional[str] = None,
+    ) -> str:
+        """
+        任务入队
+
+        Args:
+            app: 应用名称
+            workflow: 工作流名称
+            params: 参数字典
+            timeout: 单次执行的超时时间（秒）
+            target_client: 指定执行的客户端，None 表示由调度器选择
+            idempotent: 任务是否可以安全地重复执行
+            ttl: 任务在队列中最长等待时间（秒），超过后以 QUEUE_TIMEOUT 失败
+            task_id: 任务 ID，默认自动生成 UUID
+            idempotency_key: 调用方提供的幂等键（见 find_by_key）
+            fingerprint: 请求内容指纹，用于发现同一个幂等键被用于不同请求
+
+        Returns:
+            任务 ID
+        """
+        task_id = task_id or str(uuid.uuid4())
+        now = time.time()
+        self.conn.execute(
+            "INSERT INTO tasks (task_id, app, workflow, params, timeout, target_client, idempotent,"
+            " state, created_at, updated_at, next_attempt_at, expires_at, idempotency_key, fingerprint)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                task_id, app, workflow, json.dumps(params or {}, ensure_ascii=False), timeout,
+                target_client, int(idempotent), QUEUED, now, now, now, now + ttl,
+                idempotency_key, fingerprint,
+            ),
+        )
+        return task_id
+
+    def get(self, task_id: str) -> Optional[dict]:
+        """获取任务详情"""
+        row = self.conn.execute("SELECT * FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def find_by_key(self, idempotency_key: str, done_within: float) -> Optional[dict]:
+        """
+        按幂等键查找可复用的任务
+
+        Args:
+            idempotency_key: 幂等键
+            done_within: 已成功的任务在结束后多长时间内（秒）可以复用
+
+        Returns:
+            未结束的任务，或在有效期内成功结束的任务；都没有时返回 None
+        """
+        row = self.conn.execute(
+            "SELECT * FROM tasks WHERE idempotency_key = ?"
+            " AND (state IN (?, ?) OR (state = ? AND updated_at >= ?))"
+            " ORDER BY created_at DESC LIMIT 1",
+            (idempotency_key, QUEUED, DISPATCHED, DONE, time.time() - done_within),
+        ).fetchone()
+        return self._to_dict(row) if row else None
+
+    def get_many(self, task_ids: List[str]) -> List[dict]:
+        """批量获取任务详情"""
+        if not task_ids:
+            return []
+        placeholders = ",".join("?" * len(task_ids))
+        rows = self.conn.execute(
+            f"SELECT * FROM tasks WHERE task_id IN ({placeholders})", list(task_ids)
+        ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def ready(self, limit: int = 100) -> List[dict]:
+        """获取可以下发的任务（按入队顺序）"""
+        rows = self.conn.execute(
+            "SELECT * FROM tasks WHERE state = ? AND next_attempt_at <= ?"
+            " ORDER BY created_at LIMIT ?",
+            (QUEUED, time.time(), limit),
+        ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def dispatched_nodes(self) -> List[str]:
+        """有已下发任务的服务端节点"""
+        rows = self.conn.execute(
+            "SELECT DISTINCT node_id FROM tasks WHERE state = ? AND node_id IS NOT NULL", (DISPATCHED,)
+        ).fetchall()
+        return [row["node_id"] for row in rows]
+
+    def stats(self) -> Dict[str, int]:
+        """各状态的任务数"""
+        counts = {QUEUED: 0, DISPATCHED: 0, DONE: 0, FAILED: 0}
+        for row in self.conn.execute("SELECT state, COUNT(*) AS n FROM tasks GROUP BY state"):
+            counts[row["state"]] = row["n"]
+        return counts
+
+    # ==================== 状态流转 ====================
+
+    def mark_dispatched(self, task_id: str, client_id: str, node_id: Optional[str] = None) -> bool:
+        """
+        领取任务并标记为已下发
+
+        多个服务端节点共享队列时，同一个任务只有一个节点能领取成功。
+
+        Args:
+            task_id: 任务 ID
+            client_id: 执行任务的客户端
+            node_id: 持有该客户端连接的服务端节点
+
+        Returns:
+            是否领取成功
+        """
+        cursor = self.conn.execute(
+            "UPDATE tasks SET state = ?, client_id = ?, node_id = ?, attempts = attempts + 1, updated_at = ?"
+            " WHERE task_id = ? AND state = ?",
+            (DISPATCHED, client_id, node_id, time.time(), task_id, QUEUED),
+        )
+        return cursor.rowcount == 1
+
+    def complete(self, task_id: str, result: dict) -> str:
+        """
+        记录一次执行结果，并根据重试策略决定任务的下一个状态
+
+        Args:
+            task_id: 任务 ID
+            result: 客户端返回（或服务端生成）的结果
+
+        Returns:
+            任务的新状态（queued / done / failed）
+        """
+        task = self.get(task_id)
+        if task is None:
+            return FAILED
+
+        now = time.time()
+        if result.get("success"):
+            state, delay = DONE, 0.0
+        else:
+            delay = self.retry_delay(task, result.get("code"))
+            state = QUEUED if delay is not None else FAILED
+
+        if state == QUEUED:
+            # 客户端丢失时不再绑定原客户端，允许调度到其他设备
+            retarget = result.get("code") == "CLIENT_LOST"
+            self.conn.execute(
+                "UPDATE tasks SET state = ?, error_code = ?, result = ?, updated_at = ?,"
+                " next_attempt_at = ?, target_client = CASE WHEN ? THEN NULL ELSE target_client END"
+                " WHERE task_id = ?",
+                (QUEUED, result.get("code"), json.dumps(result, ensure_ascii=False), now,
+                 now + delay, int(retarget), task_id),
+            )
+        else:
+            self.conn.execute(
+                "UPDATE tasks SET state = ?, error_code = ?, result = ?, updated_at = ? WHERE task_id = ?",
+                (state, result.get("code"), json.dumps(result, ensure_ascii=False), now, task_id),
+            )
+        return state
+
+    def retry_delay(self, task: dict, code: Optional[str]) -> Optional[float]:
+        """
+        计算重试前的等待时间
+
+        Returns:
+            等待秒数，不重试时返回 None
+        """
+        policy = self.retry_policies.get(code or "")
+        if not policy:
+            return None
+        if policy.get("idempotent_only") and not task["idempotent"]:
+            return None
+        if task["attempts"] >= policy["max_attempts"]:
+            return None
+        return min(policy["backoff"] * (2 ** (task["attempts"] - 1)), MAX_BACKOFF)
+
+    def expire(self) -> List[dict]:
+        """让等待过久的排队任务失败
+
+        Returns:
+            本次过期的任务
+        """
+        now = time.time()
+        rows = self.conn.execute(
+            "SELECT * FROM tasks WHERE state = ? AND expires_at <= ?", (QUEUED, now)
+        ).fetchall()
+        expired = []
+        for row in rows:
+            task = self._to_dict(row)
+            result = {
+                "type": "result",
+                "task_id": task["task_id"],
+                "success": False,
+                "error": "任务排队超时，没有可用的客户端",
+                "code": "QUEUE_TIMEOUT",
+            }
+            # 保留最后一次执行的错误信息，便于排查
+            if task["result"]:
+                result["last_error"] = task["result"].get("error")
+            cursor = self.conn.execute(
+                "UPDATE tasks SET state = ?, error_code = ?, result = ?, updated_at = ?"
+                " WHERE task_id = ? AND state = ?",
+                (FAILED, "QUEUE_TIMEOUT", json.dumps(result, ensure_ascii=False), now, task["task_id"], QUEUED),
+            )
+            if cursor.rowcount != 1:
+                continue  # 已被其他节点领取或处理
+            task.update(state=FAILED, error_code="QUEUE_TIMEOUT", result=result)
+            expired.append(task)
+        return expired
+
+    def recover(self, node_ids: Optional[List[str]] = None) -> Dict[str, int]:
+        """服务端重启后恢复任务
+
+        重启前已下发的任务结果无法再收到：幂等任务重新排队，其他任务标记为失败
+        （设备可能已经执行过，不能自动重复执行）。
+
+        Args:
+            node_ids: 只恢复由这些节点下发的任务（多节点模式下恢复已停止的节点），
+                None 表示恢复全部已下发的任务
+
+        Returns:
+            {"requeued": 重新排队的任务数, "failed": 标记失败的任务数}
+        """
+        if node_ids is not None and not node_ids:
+            return {"requeued": 0, "failed": 0}
+
+        node_filter, node_args = "", []
+        if node_ids is not None:
+            node_filter = f" AND node_id IN ({','.join('?' * len(node_ids))})"
+            node_args = list(node_ids)
+
+        now = time.time()
+        result = json.dumps({
+            "type": "result",
+            "success": False,
+            "error": "服务端重启，任务执行结果未知",
+            "code": "SERVER_RESTART",
+        }, ensure_ascii=False)
+        requeued = self.conn.execute(
+            "UPDATE tasks SET state = ?, next_attempt_at = ?, updated_at = ?"
+            " WHERE state = ? AND idempotent = 1" + node_filter,
+            [QUEUED, now, now, DISPATCHED] + node_args,
+        ).rowcount
+        failed = self.conn.execute(
+            "UPDATE tasks SET state = ?, error_code = ?, result = ?, updated_at = ?"
+            " WHERE state = ?" + node_filter,
+            [FAILED, "SERVER_RESTART", result, now, DISPATCHED] + node_args,
+        ).rowcount
+        return {"requeued": requeued, "failed": failed}
+
+    def purge(self, older_than: float = 86400) -> int:
+        """删除已结束且超过指定时间的任务
+
+        Returns:
+            删除的任务数
+        """
+        return self.conn.execute(
+            "DELETE FROM tasks WHERE state IN (?, ?) AND updated_at < ?",
+            (DONE, FAILED, time.time() - older_than),
+        ).rowcount
+
+    def _to_dict(self, row: sqlite3.Row) -> dict:
+        """数据库行转为字典"""
+        task = dict(row)
+        task["params"] = json.loads(task["params"])
+        task["idempotent"] = bool(task["idempotent"])
+        task["result"] = json.loads(task["result"]) if task["result"] else None
+        return task
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""模板匹配 - 在截图中查找参考小图（图标、按钮），作为文本 / ID / 坐标之外的定位方式
+
+微信、支付宝的部分按钮没有可用的无障碍节点（文本被混淆或为空），按文本查找只能等到超时再退回固定坐标比例。
+模板匹配直接在内存中的截图上查找按钮的参考图，不依赖界面结构：
+
+    - 归一化相关系数（与 OpenCV 的 TM_CCOEFF_NORMED 相同），对亮度和对比度变化不敏感
+    - 安装了 opencv-python 时使用 cv2.matchTemplate，否则使用 NumPy 的 FFT 卷积 + 积分图实现
+    - 截图先缩小到 WORK_WIDTH 宽度再匹配；模板按 屏幕宽度 / 录制模板时的屏幕宽度 缩放，
+      并在其附近尝试多个比例（适配不同分辨率和字体缩放）
+    - 灰度化、缩放后的模板按 (路径, 比例) 缓存，文件修改后自动重新加载
+
+参考图放在各应用的 templates/ 目录下（如 apps/wechat/templates/album.png），在 config.py 的 TEMPLATES 中登记。
+依赖 numpy（未安装时匹配会抛出 RuntimeError，Actions 中按未找到处理）。
+
+使用方法：
+    # 从截图中裁剪参考图（坐标为截图像素）
+    python template_match.py crop screen.png 960 120 1060 220 apps/wechat/templates/album.png
+
+    # 在截图中查找参考图，输出位置和相似度
+    python template_match.py match screen.png apps/wechat/templates/album.png
+"""
+import argparse
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # 未安装 numpy 时不能使用模板匹配
+    np = None
+
+try:
+    import cv2
+except ImportError:  # 未安装 OpenCV 时使用 NumPy 实现
+    cv2 = None
+
+# 相似度阈值（归一化相关系数，1 为完全相同）
+DEFAULT_THRESHOLD = 0.85
+
+# 在按分辨率换算出的比例附近尝试的倍数（按顺序尝试，相似度足够高时提前结束）
+DEFAULT_SCALES = (1.0, 0.9, 1.1, 0.8, 1.2)
+
+# 录制参考图时的屏幕宽度（像素）
+REFERENCE_WIDTH = 1080
+
+# 匹配前截图缩小到的宽度（像素），越小越快，但太小的图标会丢失细节
+WORK_WIDTH = 540
+
+# 相似度达到该值时不再尝试其他比例
+EARLY_EXIT_SCORE = 0.97
+
+
+def available() -> bool:
+    """是否可以使用模板匹配（已安装 numpy）"""
+    return np is not None
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("模板匹配需要 numpy，请执行: uv pip install numpy（可选 opencv-python-headless 加速）")
+
+
+def to_gray(image) -> "np.ndarray":
+    """
+    转为 float32 灰度图
+
+    Args:
+        image: PIL 图像，或 numpy 数组（灰度 / RGB(A)，如 framebuffer.RawScreencap 的原始截图）
+
+    Returns:
+        二维 float32 数组
+    """
+    _require_numpy()
+    if hasattr(image, "convert"):  # PIL
+        return np.asarray(image.convert("L"), dtype=np.float32)
+    array = np.asarray(image)
+    if array.ndim == 2:
+        return array.astype(np.float32)
+    # RGB(A) -> 灰度，权重与 PIL 的 L 模式一致
+    return (array[..., 0] * 0.299 + array[..., 1] * 0.587 + array[..., 2] * 0.114).astype(np.float32)
+
+
+def resize(gray: "np.ndarray", scale: float) -> "np.ndarray":
+    """按比例缩放灰度图（缩小时按区域平均，避免细线条丢失）"""
+    if abs(scale - 1.0) < 1e-3:
+        return gray
+    height, width = gray.shape
+    size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+    if cv2 is not None:
+        interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+        return cv2.resize(gray, size, interpolation=interpolation)
+    from PIL import Image
+
+    resample = Image.Resampling.BOX if scale < 1 else Image.Resampling.BILINEAR
+    return np.asarray(Image.fromarray(gray).resize(size, resample), dtype=np.float32)
+
+
+# ==================== 模板缓存 ====================
+
+class TemplateCache:
+    """缓存灰度化、缩放后的模板（LRU，文件修改后重新加载）"""
+
+    def __init__(self, maxsize: int = 256):
+        """
+        初始化缓存
+
+        Args:
+            maxsize: 最多缓存的 (模板, 比例) 数量
+        """
+        self.maxsize = maxsize
+        self._items: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._sources = {}  # 路径 -> (修改时间, 原始灰度图)
+        self._lock = threading.Lock()
+
+    def _source(self, path: str) -> "np.ndarray":
+        mtime = os.path.getmtime(path)
+        cached = self._sources.get(path)
+        if cached is None or cached[0] != mtime:
+            from PIL import Image
+
+            with Image.open(path) as image:
+                cached = self._sources[path] = (mtime, to_gray(image))
+            # 文件已修改，丢弃旧的缩放结果
+            for key in [key for key in self._items if key[0] == path]:
+                del self._items[key]
+        return cached[1]
+
+    def get(self, path: str, scale: float = 1.0) -> "np.ndarray":
+        """
+        获取缩放后的模板
+
+        Args:
+            path: 模板图片路径
+            scale: 缩放比例
+
+        Returns:
+            float32 灰度图
+        """
+        _require_numpy()
+        key = (path, round(scale, 3))
+        with self._lock:
+            source = self._source(path)
+            template = self._items.get(key)
+            if template is None:
+                template = self._items[key] = resize(source, scale)
+                if len(self._items) > self.maxsize:
+                    self._items.popitem(last=False)
+            else:
+                self._items.move_to_end(key)
+            return template
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._items.clear()
+            self._sources.clear()
+
+
+CACHE = TemplateCache()
+
+
+# ==================== 匹配 ====================
+
+def _window_sums(integral: "np.ndarray", height: int, width: int) -> "np.ndarray":
+    """由积分图计算每个 height x width 窗口的和"""
+    return (integral[height:, width:] - integral[:-height, width:]
+            - integral[height:, :-width] + integral[:-height, :-width])
+
+
+def _ncc_numpy(image: "np.ndarray", template: "np.ndarray") -> "np.ndarray":
+    """归一化相关系数（TM_CCOEFF_NORMED）：分子用 FFT 卷积，窗口均值和方差用积分图"""
+    image = image.astype(np.float64)
+    template = template.astype(np.float64)
+    th, tw = template.shape
+    height, width = image.shape
+    zero_mean = template - template.mean()
+    template_norm = np.sqrt((zero_mean ** 2).sum())
+    result_shape = (height - th + 1, width - tw + 1)
+    if template_norm == 0:  # 纯色模板没有可匹配的结构
+        return np.zeros(result_shape)
+
+    shape = (height + th - 1, width + tw - 1)
+    spectrum = np.fft.rfft2(image, shape) * np.fft.rfft2(zero_mean[::-1, ::-1], shape)
+    numerator = np.fft.irfft2(spectrum, shape)[th - 1:height, tw - 1:width]
+
+    integral = np.pad(image, ((1, 0), (1, 0))).cumsum(0).cumsum(1)
+    integral_sq = np.pad(image ** 2, ((1, 0), (1, 0))).cumsum(0).cumsum(1)
+    sums = _window_sums(integral, th, tw)
+    variance = _window_sums(integral_sq, th, tw) - sums ** 2 / (th * tw)
+    denominator = np.sqrt(np.maximum(variance, 0)) * template_norm
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator > 1e-6 * template_norm, numerator / denominator, 0.0)
+
+
+def match(image: "np.ndarray", template: "np.ndarray") -> Tuple[float, int, int]:
+    """
+    在灰度图中查找模板
+
+    Args:
+        image: 灰度截图
+        template: 灰度模板（不能大于截图）
+
+    Returns:
+        (相似度, 左上角 x, 左上角 y)
+    """
+    if cv2 is not None:
+        result = cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (x, y) = cv2.minMaxLoc(result)
+        return float(score), int(x), int(y)
+    result = _ncc_numpy(image, template)
+    y, x = np.unravel_index(int(np.argmax(result)), result.shape)
+    return float(result[y, x]), int(x), int(y)
+
+
+def locate(
+    screen,
+    template_path: str,
+    threshold: float = DEFAULT_THRESHOLD,
+    scales: Sequence[float] = DEFAULT_SCALES,
+    reference_width: int = REFERENCE_WIDTH,
+    region: Optional[Tuple[float, float, float, float]] = None,
+) -> Optional[dict]:
+    """
+    在截图中查找参考图
+
+    Args:
+        screen: 截图（PIL 图像或 RGB(A) / 灰度 numpy 数组）
+        template_path: 参考图路径
+        threshold: 相似度阈值
+        scales: 在按分辨率换算出的比例附近尝试的倍数
+        reference_width: 录制参考图时的屏幕宽度
+        region: 只在该区域内查找，(左, 上, 右, 下) 为屏幕宽高的比例，如右上角 (0.5, 0, 1, 0.3)
+
+    Returns:
+        找到时返回 {"x", "y"（中心点，屏幕像素）, "score", "scale", "bounds"}，否则返回 None
+    """
+    width, height = screen.size if hasattr(screen, "size") and not hasattr(screen, "shape") else \
+        (screen.shape[1], screen.shape[0])
+    left = top = 0
+    if region:
+        # 先截取区域再灰度化，只处理关注的像素
+        left, top, right, bottom = (int(region[0] * width), int(region[1] * height),
+                                    int(region[2] * width), int(region[3] * height))
+        screen = screen.crop((left, top, right, bottom)) if hasattr(screen, "crop") else screen[top:bottom, left:right]
+    gray = to_gray(screen)
+
+    factor = min(1.0, WORK_WIDTH / width)
+    image = resize(gray, factor)
+    base = width / reference_width
+
+    best = None
+    for multiplier in scales:
+        template = CACHE.get(template_path, base * multiplier * factor)
+        th, tw = template.shape
+        if th > image.shape[0] or tw > image.shape[1] or min(th, tw) < 4:
+            continue
+        score, x, y = match(image, template)
+        if best is None or score > best["score"]:
+            best = {"score": score, "scale": base * multiplier, "x": x, "y": y, "w": tw, "h": th}
+        if score >= EARLY_EXIT_SCORE:
+            break
+
+    if best is None or best["score"] < threshold:
+        return None
+    x1, y1 = left + best["x"] / factor, top + best["y"] / factor
+    x2, y2 = x1 + best["w"] / factor, y1 + best["h"] / factor
+    return {
+        "x": int(round((x1 + x2) / 2)),
+        "y": int(round((y1 + y2) / 2)),
+        "score": round(best["score"], 4),
+        "scale": round(best["scale"], 3),
+        "bounds": (int(x1), int(y1), int(x2), int(y2)),
+    }
+
+
+# ==================== 命令行 ====================
+
+def main():
+    from PIL import Image
+
+    parser = argparse.ArgumentParser(description="模板匹配工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    crop = subparsers.add_parser("crop", help="从截图中裁剪参考图")
+    crop.add_argument("screenshot", help="截图文件")
+    crop.add_argument("box", nargs=4, type=int, metavar="N", help="左 上 右 下（截图像素）")
+    crop.add_argument("output", help="输出文件（.png）")
+
+    match_parser = subparsers.add_parser("match", help="在截图中查找参考图")
+    match_parser.add_argument("screenshot", help="截图文件")
+    match_parser.add_argument("template", help="参考图文件")
+    match_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="相似度阈值")
+    match_parser.add_argument("--reference-width", type=int, default=REFERENCE_WIDTH,
+                              help="录制参考图时的屏幕宽度")
+    args = parser.parse_args()
+
+    if args.command == "crop":
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with Image.open(args.screenshot) as image:
+            image.crop(tuple(args.box)).save(args.output)
+        print(f"✓ 参考图已保存: {args.output}")
+        return
+
+    with Image.open(args.screenshot) as image:
+        start = time.perf_counter()
+        found = locate(image, args.template, args.threshold, reference_width=args.reference_width)
+        elapsed = (time.perf_counter() - start) * 1000
+    engine = "opencv" if cv2 is not None else "numpy"
+    if found:
+        print(f"✓ 找到: ({found['x']}, {found['y']})  相似度 {found['score']}  比例 {found['scale']}  "
+              f"耗时 {elapsed:.1f} ms（{engine}）")
+    else:
+        print(f"✗ 未找到（耗时 {elapsed:.1f} ms，{engine}）")
+
+
+if __name__ == "__main__":
+    main()
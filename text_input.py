@@ -0,0 +1,244 @@
+"""文字输入 - 按设备选择最快的输入方式，输入后读取输入框内容校验
+
+以前 input_text 固定用 clear_text + send_keys：uiautomator2 每次都要检查一遍当前输入法，再用广播发送文字，
+之后固定等待 0.5 秒。这里按以下顺序尝试，记住每台设备上第一个校验通过的方式，之后直接使用：
+
+    set_text   直接设置当前输入框的内容（一次调用，长文本、中文都没有逐字延迟）
+    clipboard  写入剪贴板后粘贴（部分自绘输入框不支持直接设置时使用）
+    ime        通过 uiautomator2 的 AdbKeyboard 输入法广播文字（长文本分段发送），输入后切回原来的输入法
+    send_keys  uiautomator2 的 send_keys（兜底）
+
+输入后读取输入框内容，与期望一致才算成功，不再需要固定等待；不一致时清空输入框，换下一种方式重新输入。
+环境变量 QRCODE_INPUT_METHODS 可以指定尝试的方式和顺序，如 "clipboard,send_keys"。
+
+使用方法：
+    engine = text_input.engine_for(actions.device_key)
+    engine.input(device, "你好", clear=True)   # {"method", "verified", "duration", "attempts"}
+"""
+import base64
+import logging
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+METHODS = ("set_text", "clipboard", "ime", "send_keys")
+
+# 需要找到当前输入框的方式（没有获得焦点的输入框时跳过）
+FIELD_METHODS = ("set_text", "clipboard")
+
+# 查找当前输入框的超时时间（秒）
+FIELD_TIMEOUT = 1.0
+
+# ime 方式每次广播的最大字符数（命令行长度有限，长文本分段发送）
+IME_CHUNK = 1000
+
+KEYCODE_PASTE = 279
+
+_BROADCAST_OK = re.compile(r"result=-1\b")
+
+
+def _configured_methods() -> List[str]:
+    """QRCODE_INPUT_METHODS 指定的方式（未指定时为全部）"""
+    value = os.environ.get("QRCODE_INPUT_METHODS", "")
+    methods = [method.strip() for method in value.split(",") if method.strip()]
+    unknown = set(methods) - set(METHODS)
+    if unknown:
+        raise ValueError(f"不支持的输入方式: {sorted(unknown)}（可选: {', '.join(METHODS)}）")
+    return methods or list(METHODS)
+
+
+class InputEngine:
+    """一台设备的文字输入"""
+
+    def __init__(self, methods: Optional[List[str]] = None):
+        """
+        初始化
+
+        Args:
+            methods: 按顺序尝试的输入方式，默认为 QRCODE_INPUT_METHODS 或全部
+        """
+        self.methods = list(methods or _configured_methods())
+        self.method: Optional[str] = None  # 最近一次校验通过的方式
+        self.stats: Dict[str, dict] = {}  # 方式 -> {"count", "failures", "time"}
+        self._previous_ime: Optional[str] = None  # 切换到 AdbKeyboard 之前的输入法（输入后切回）
+
+    # ---------- 输入框 ----------
+
+    @staticmethod
+    def _field(device):
+        """当前获得焦点的输入框"""
+        return device(focused=True)
+
+    def read(self, device) -> Optional[str]:
+        """读取当前输入框的内容（没有获得焦点的输入框时返回 None）"""
+        try:
+            return self._field(device).get_text(timeout=FIELD_TIMEOUT) or ""
+        except Exception as e:
+            logger.debug("读取输入框失败: %s", e)
+            return None
+
+    # ---------- 输入方式 ----------
+
+    def available(self, device, method: str) -> bool:
+        """设备是否支持该输入方式"""
+        if method == "clipboard":
+            return hasattr(device, "set_clipboard")
+        if method == "ime":
+            return hasattr(device, "set_input_ime") and hasattr(device, "shell")
+        return True
+
+    def _set_text(self, device, text: str):
+        self._field(device).set_text(text, timeout=FIELD_TIMEOUT)
+
+    def _clipboard(self, device, text: str):
+        field = self._field(device)
+        field.clear_text(timeout=FIELD_TIMEOUT)
+        if text:
+            device.set_clipboard(text)
+            device.press(KEYCODE_PASTE)
+
+    def _ime(self, device, text: str):
+        if self._previous_ime is None:
+            # 记住用户的输入法再切换到 AdbKeyboard，输入结束后由 restore_ime 切回
+            self._previous_ime = self._current_ime(device)
+            device.set_input_ime(True)
+        self._broadcast(device, "ADB_KEYBOARD_CLEAR_TEXT")
+        for start in range(0, len(text), IME_CHUNK):
+            chunk = base64.b64encode(text[start:start + IME_CHUNK].encode("utf-8")).decode("ascii")
+            self._broadcast(device, "ADB_KEYBOARD_INPUT_TEXT", chunk)
+
+    @staticmethod
+    def _broadcast(device, action: str, text: Optional[str] = None):
+        args = ["am", "broadcast", "-a", action]
+        if text is not None:
+            args += ["--es", "text", text]
+        output = device.shell(args).output
+        if not _BROADCAST_OK.search(output):
+            raise RuntimeError(f"广播 {action} 失败: {output.strip()}")
+
+    @staticmethod
+    def _current_ime(device) -> str:
+        output = device.shell(["settings", "get", "secure", "default_input_method"]).output
+        return output.strip()
+
+    def restore_ime(self, device):
+        """切回切换到 AdbKeyboard 之前的输入法（没有切换过时不做任何事）"""
+        previous, self._previous_ime = self._previous_ime, None
+        if previous is None:
+            return
+        try:
+            if previous and previous != "null":
+                device.shell(["ime", "set", previous])
+            else:
+                device.set_input_ime(False)
+        except Exception as e:
+            logger.warning("⚠️  切回原来的输入法失败: %s", e)
+
+    def _clear(self, device, field_missing: bool = False):
+        """清空当前输入框（换一种方式重新输入前，避免上一种方式输入的文字残留）"""
+        try:
+            if not field_missing:
+                try:
+                    self._field(device).clear_text(timeout=FIELD_TIMEOUT)
+                    return
+                except Exception:
+                    pass
+            device.clear_text()
+        except Exception as e:
+            logger.debug("清空输入框失败: %s", e)
+
+    def _send_keys(self, device, text: str):
+        device.clear_text()
+        if text:
+            device.send_keys(text)
+
+    # ---------- 输入 ----------
+
+    def _candidates(self, device) -> List[str]:
+        """本次尝试的方式：最近成功的方式优先，其余按配置顺序"""
+        ordered = ([self.method] if self.method else []) + [m for m in self.methods if m != self.method]
+        return [method for method in ordered if self.available(device, method)]
+
+    def _record(self, method: str, elapsed: float, ok: bool):
+        stats = self.stats.setdefault(method, {"count": 0, "failures": 0, "time": 0.0})
+        stats["count"] += 1
+        stats["time"] += elapsed
+        if not ok:
+            stats["failures"] += 1
+
+    def input(self, device, text: str, clear: bool = True, verify: bool = True) -> dict:
+        """
+        在当前输入框中输入文字
+
+        Args:
+            device: 设备对象
+            text: 要输入的文字
+            clear: 是否替换输入框原有内容（False 时追加到原有内容之后）
+            verify: 输入后读取输入框校验（不校验时使用第一个不报错的方式）
+
+        Returns:
+            {"method": 使用的方式, "verified": 是否校验通过, "duration": 耗时（秒）, "attempts": 尝试过的方式}
+        """
+        start = time.perf_counter()
+        target = text
+        if not clear:
+            # 各方式都是整体替换输入框内容，追加时先读取原有内容
+            target = (self.read(device) or "") + text
+
+        try:
+            return self._input(device, target, verify, start)
+        finally:
+            self.restore_ime(device)
+
+    def _input(self, device, target: str, verify: bool, start: float) -> dict:
+        attempts = []
+        field_missing = False
+        for method in self._candidates(device):
+            if field_missing and method in FIELD_METHODS:
+                continue
+            if attempts:
+                self._clear(device, field_missing)
+            attempts.append(method)
+            method_start = time.perf_counter()
+            try:
+                getattr(self, f"_{method}")(device, target)
+            except Exception as e:
+                logger.debug("输入方式 %s 失败: %s", method, e)
+                self._record(method, time.perf_counter() - method_start, False)
+                if method in FIELD_METHODS and type(e).__name__ == "UiObjectNotFoundError":
+                    field_missing = True  # 没有获得焦点的输入框
+                continue
+
+            actual = self.read(device) if verify else target
+            ok = actual == target
+            self._record(method, time.perf_counter() - method_start, ok)
+            if ok:
+                if method != self.method:
+                    logger.debug("输入方式: %s", method)
+                self.method = method
+                return {"method": method, "verified": verify, "duration": round(time.perf_counter() - start, 3),
+                        "attempts": attempts}
+            logger.warning("⚠️  输入方式 %s 校验失败: 期望 %s 个字，输入框中为 %s",
+                           method, len(target), "无法读取" if actual is None else f"{len(actual)} 个字")
+
+        if self.method in attempts:
+            self.method = None
+        return {"method": None, "verified": False, "duration": round(time.perf_counter() - start, 3),
+                "attempts": attempts}
+
+
+_engines: Dict[object, InputEngine] = {}
+_engines_lock = threading.Lock()
+
+
+def engine_for(key) -> InputEngine:
+    """获取设备的输入引擎（key 为 Actions.device_key）"""
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = _engines[key] = InputEngine()
+        return engine
@@ -0,0 +1,204 @@
+"""链路追踪 - 把一个任务在服务端、客户端和设备操作上的耗时串成一棵 span 树
+
+一个任务对应一条 trace（trace_id 即 task_id）：
+    服务端  task ─┬─ queue（排队等待空闲客户端）
+                  └─ attempt（下发 → 收到结果，每次重试一个）
+    客户端            ├─ transit（服务端发出 → 客户端收到，受两端时钟偏差影响）
+                      └─ client.task ─ workflow ─ Actions 方法 ─ 设备调用 / 固定等待
+
+服务端在 task 消息中带上 trace 字段（trace_id、父 span_id、发送时间），客户端按它创建子 span，
+并在 result 消息的 trace 字段中带回自己记录的 span；服务端合并后导出为 Chrome Trace Event 格式的
+JSON 文件，可以用 https://ui.perfetto.dev 或 chrome://tracing 打开。
+
+使用方法：
+    trace = tracing.Trace("task-1234", process="server")
+    with trace.span("task") as root:
+        with trace.span("workflow", parent_id=root["span_id"]) as span, trace.capture_actions(span["span_id"]):
+            workflow_func(actions)
+    trace.export("traces/task-1234.json")
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import instrumentation
+
+
+def new_span_id() -> str:
+    """生成 span ID（16 位十六进制）"""
+    return uuid.uuid4().hex[:16]
+
+
+class Trace:
+    """一条 trace 在本进程内记录的 span"""
+
+    def __init__(self, trace_id: str, process: str):
+        """
+        初始化 trace
+
+        Args:
+            trace_id: trace ID（任务 ID）
+            process: 记录方名称（如 server、client:my-device-001），导出时作为进程名
+        """
+        self.trace_id = trace_id
+        self.process = process
+        self.spans: List[dict] = []
+        self._lock = threading.Lock()
+
+    def start_span(self, name: str, parent_id: Optional[str] = None, start: Optional[float] = None,
+                   **attributes) -> dict:
+        """
+        开始一个 span（需要调用 end_span 结束）
+
+        Args:
+            name: span 名称
+            parent_id: 父 span ID
+            start: 开始时间（time.time()），默认为当前时间
+            **attributes: 附加属性
+
+        Returns:
+            span 字典
+        """
+        return {
+            "trace_id": self.trace_id,
+            "span_id": new_span_id(),
+            "parent_id": parent_id,
+            "name": name,
+            "process": self.process,
+            "start": time.time() if start is None else start,
+            "duration": None,
+            "status": "ok",
+            "attributes": attributes,
+        }
+
+    def end_span(self, span: dict, end: Optional[float] = None, status: Optional[str] = None) -> dict:
+        """
+        结束 span 并记录
+
+        Args:
+            span: start_span 返回的 span
+            end: 结束时间（time.time()），默认为当前时间
+            status: ok / error，默认保持 start_span 时的 ok
+        """
+        span["duration"] = max(0.0, (time.time() if end is None else end) - span["start"])
+        if status:
+            span["status"] = status
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    def add_span(self, name: str, start: float, end: float, parent_id: Optional[str] = None,
+                 **attributes) -> dict:
+        """记录一个已知起止时间的 span"""
+        return self.end_span(self.start_span(name, parent_id, start, **attributes), end)
+
+    @contextmanager
+    def span(self, name: str, parent_id: Optional[str] = None, **attributes):
+        """记录代码块耗时（代码块抛出异常时 status 为 error）"""
+        span = self.start_span(name, parent_id, **attributes)
+        try:
+            yield span
+        except BaseException as e:
+            span["attributes"]["error"] = f"{type(e).__name__}: {e}"
+            self.end_span(span, status="error")
+            raise
+        self.end_span(span)
+
+    @contextmanager
+    def capture_actions(self, parent_id: str):
+        """把代码块内（当前线程）Actions 方法、设备调用和固定等待的埋点事件记录为 parent_id 的子 span"""
+        handler = _ActionSpanHandler(self, parent_id)
+        instrumentation.add_handler(handler)
+        try:
+            yield
+        finally:
+            instrumentation.remove_handler(handler)
+
+    def merge(self, spans: List[dict]):
+        """合并其他进程记录的 span（如客户端随结果带回的 span）"""
+        with self._lock:
+            self.spans.extend(span for span in spans if span.get("trace_id") == self.trace_id)
+
+    def export(self, path: str) -> str:
+        """
+        导出为 Chrome Trace Event 格式
+
+        Args:
+            path: 输出文件路径
+
+        Returns:
+            输出文件路径
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            spans = list(self.spans)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(to_chrome_trace(spans, self.trace_id), f, ensure_ascii=False)
+        return path
+
+
+class _ActionSpanHandler(instrumentation.Handler):
+    """把 instrumentation 事件转成 span（只记录开启捕获的线程，按事件嵌套关系确定父 span）"""
+
+    def __init__(self, trace: Trace, parent_id: str):
+        self.trace = trace
+        self.parent_id = parent_id
+        self.thread_id = threading.get_ident()
+        self._open: Dict[int, dict] = {}  # id(event) -> span
+        self._stack: List[str] = []
+
+    def on_start(self, event: dict):
+        if threading.get_ident() != self.thread_id:
+            return
+        parent_id = self._stack[-1] if self._stack else self.parent_id
+        span = self.trace.start_span(f"{event['kind']}.{event['name']}", parent_id, event["start"])
+        self._open[id(event)] = span
+        self._stack.append(span["span_id"])
+
+    def on_end(self, event: dict):
+        span = self._open.pop(id(event), None)
+        if span is None:
+            return
+        if self._stack and self._stack[-1] == span["span_id"]:
+            self._stack.pop()
+        for key in ("locator", "timeout", "retries", "error"):
+            if event.get(key):
+                span["attributes"][key] = event[key]
+        self.trace.end_span(span, event["start"] + event["duration"], "ok" if event["ok"] else "error")
+
+
+def to_chrome_trace(spans: List[dict], trace_id: Optional[str] = None) -> dict:
+    """
+    把 span 列表转为 Chrome Trace Event 格式（每个记录方一个进程，span 为完整事件 ph=X）
+
+    Args:
+        spans: span 列表
+        trace_id: 写入 otherData 的 trace ID
+
+    Returns:
+        可直接 json.dump 的字典
+    """
+    pids: Dict[str, int] = {}
+    events = []
+    for span in sorted(spans, key=lambda s: s["start"]):
+        pid = pids.setdefault(span["process"], len(pids) + 1)
+        events.append({
+            "name": span["name"],
+            "cat": span["name"].split(".", 1)[0],
+            "ph": "X",
+            "ts": round(span["start"] * 1e6, 3),
+            "dur": round((span["duration"] or 0) * 1e6, 3),
+            "pid": pid,
+            "tid": 1,
+            "args": dict(span["attributes"], span_id=span["span_id"], parent_id=span["parent_id"],
+                         status=span["status"]),
+        })
+    for process, pid in pids.items():
+        events.append({"name": "process_name", "ph": "M", "pid": pid, "args": {"name": process}})
+    return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"trace_id": trace_id}}
@@ -0,0 +1,173 @@
+"""弹窗处理 - 按规则自动关闭更新提示、广告、权限申请等打断工作流的弹窗
+
+支付宝、微信等应用会随机弹出更新提示、广告和权限申请，挡住要点击的按钮，
+以前只能等 click_by_text 超时后整个任务失败。现在每个应用在 config.py 中声明弹窗规则：
+
+    WATCHERS = [
+        {"name": "更新提示", "text": "以后再说"},                                 # 点击匹配到的元素
+        {"name": "青少年模式", "text": "青少年模式", "click": {"text": "我知道了"}},  # 匹配后点击另一个元素
+        {"name": "广告", "resource_id": "com.example:id/iv_close"},
+        {"name": "活动页", "text_contains": "限时活动", "action": "back"},           # 匹配后按返回键
+    ]
+
+匹配条件可以是 text / text_contains / resource_id / description，可以加 package 限定所属应用。
+系统的权限申请弹窗与应用无关，规则在 SYSTEM_WATCHERS 中，所有应用都会检查。
+
+Actions.launch_app 按包名加载应用的规则；应用有自己的规则时，之后等待元素（click_by_text / click_by_id /
+wait_for_element）时分段等待，每段未找到就导出一次界面结构，按所有规则检查并关闭弹窗，然后继续等待剩余时间。
+弹窗在一个检查间隔（WATCH_INTERVAL）内被关闭，而不是耗尽超时后失败重试。
+没有自己规则的应用不分段等待（不额外导出界面结构），系统弹窗只在页面识别（pages.py）无法识别当前页面时
+用同一份界面结构检查。
+"""
+import importlib
+import os
+import re
+import threading
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Optional, Tuple
+
+# 等待元素时每隔多少秒检查一次弹窗
+WATCH_INTERVAL = float(os.environ.get("QRCODE_WATCH_INTERVAL", "1.0"))
+
+# 一次检查最多连续关闭的弹窗数（防止规则写错时反复点击）
+MAX_ROUNDS = 3
+
+# 关闭弹窗后等待界面响应的时间（秒）
+DISMISS_PAUSE = 0.3
+
+# 系统弹窗规则（扫码需要相机和存储权限，首次使用时系统会弹出申请）
+SYSTEM_WATCHERS = [
+    {"name": "权限申请（使用时允许）",
+     "resource_id": "com.android.permissioncontroller:id/permission_allow_foreground_only_button"},
+    {"name": "权限申请（允许）", "resource_id": "com.android.permissioncontroller:id/permission_allow_button"},
+    {"name": "权限申请（使用时允许）",
+     "resource_id": "com.google.android.permissioncontroller:id/permission_allow_foreground_only_button"},
+    {"name": "权限申请（允许）", "resource_id": "com.google.android.permissioncontroller:id/permission_allow_button"},
+]
+
+# 规则中的匹配条件 -> 界面结构节点的属性
+_CONDITIONS = {
+    "text": "text",
+    "text_contains": "text",
+    "resource_id": "resource-id",
+    "description": "content-desc",
+}
+
+_BOUNDS = re.compile(r"\[(-?\d+),(-?\d+)\]\[(-?\d+),(-?\d+)\]")
+
+
+def _center(node: ET.Element) -> Optional[Tuple[int, int]]:
+    """节点中心坐标（bounds 为 [左,上][右,下]）"""
+    match = _BOUNDS.match(node.get("bounds") or "")
+    if not match:
+        return None
+    left, top, right, bottom = map(int, match.groups())
+    return (left + right) // 2, (top + bottom) // 2
+
+
+def _matches(node: ET.Element, selector: dict) -> bool:
+    """节点是否满足选择器的全部条件"""
+    if not any(key in selector for key in _CONDITIONS):
+        return False
+    for key, attribute in _CONDITIONS.items():
+        if key not in selector:
+            continue
+        value = node.get(attribute) or ""
+        if key == "text_contains":
+            if selector[key] not in value:
+                return False
+        elif value != selector[key]:
+            return False
+    if selector.get("package") and node.get("package") != selector["package"]:
+        return False
+    return True
+
+
+class WatcherSet:
+    """一个应用的弹窗规则"""
+
+    _instances: Dict[str, "WatcherSet"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, rules: List[dict], system: List[dict] = ()):
+        """
+        初始化
+
+        Args:
+            rules: 应用的弹窗规则（格式见模块说明），按顺序检查
+            system: 与应用无关的系统弹窗规则，在应用的规则之后检查
+        """
+        self.app_rules = len(rules)  # 应用自己的规则数（为 0 时等待元素不分段）
+        rules = list(rules) + list(system)
+        for rule in rules:
+            if not any(key in rule for key in _CONDITIONS):
+                raise ValueError(f"弹窗规则缺少匹配条件: {rule}")
+            if rule.get("action", "click") not in ("click", "back"):
+                raise ValueError(f"不支持的弹窗处理方式: {rule.get('action')}（可选: click / back）")
+        self.rules = list(rules)
+
+    def __bool__(self) -> bool:
+        return bool(self.rules)
+
+    @classmethod
+    def for_app(cls, app: str) -> "WatcherSet":
+        """加载应用 config.py 中的 WATCHERS 和系统弹窗规则（每个应用只加载一次）"""
+        with cls._instances_lock:
+            watchers = cls._instances.get(app)
+            if watchers is None:
+                config = importlib.import_module(f"apps.{app}.config")
+                watchers = cls._instances[app] = cls(getattr(config, "WATCHERS", []), SYSTEM_WATCHERS)
+            return watchers
+
+    @classmethod
+    def for_package(cls, package: str) -> "WatcherSet":
+        """按包名查找应用的弹窗规则（没有对应应用时只有系统弹窗规则）"""
+        app = _apps_by_package().get(package)
+        return cls.for_app(app) if app else cls([], SYSTEM_WATCHERS)
+
+    def find(self, xml: str) -> Optional[Tuple[dict, Optional[Tuple[int, int]]]]:
+        """
+        在界面结构中查找第一个匹配的弹窗
+
+        Args:
+            xml: dump_hierarchy 返回的 XML
+
+        Returns:
+            (规则, 要点击的坐标)，按返回键处理时坐标为 None；没有弹窗时返回 None
+        """
+        nodes = list(ET.fromstring(xml).iter("node"))
+        for rule in self.rules:
+            node = next((node for node in nodes if _matches(node, rule)), None)
+            if node is None:
+                continue
+            if rule.get("action") == "back":
+                return rule, None
+            if rule.get("click"):
+                node = next((target for target in nodes if _matches(target, rule["click"])), None)
+                if node is None:
+                    continue  # 要点击的按钮还没出现
+            point = _center(node)
+            if point is not None:
+                return rule, point
+        return None
+
+
+_packages: Optional[Dict[str, str]] = None
+_packages_lock = threading.Lock()
+
+
+def _apps_by_package() -> Dict[str, str]:
+    """包名 -> 应用名（扫描 apps/ 下各应用的 config.py）"""
+    global _packages
+    with _packages_lock:
+        if _packages is None:
+            apps_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "apps")
+            _packages = {}
+            for app in sorted(os.listdir(apps_dir)):
+                if not os.path.isfile(os.path.join(apps_dir, app, "config.py")):
+                    continue
+                config = importlib.import_module(f"apps.{app}.config")
+                package = getattr(config, "PACKAGE_NAME", None)
+                if package:
+                    _packages[package] = app
+        return _packages
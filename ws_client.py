@@ -11,13 +11,17 @@
 import asyncio
 import websockets
 import json
+import logging
 import sys
 import argparse
 import time
-from datetime import datetime
 from device import get_device_manager
 from actions import Actions
 import importlib
+import log
+import tracing
+
+logger = logging.getLogger(__name__)
 
 
 class TaskClient:
@@ -36,8 +40,10 @@ class TaskClient:
         self.device_manager = None
         self.device = None
         self.actions = None
+        self.device_serial = None  # 设备序列号（写入日志上下文）
         self.ws = None
         self.is_busy = False  # 任务执行状态
+        self.current_app = None  # 最近一次成功运行的应用（仍在前台，供服务端调度参考）
         self.heartbeat_task = None
         self.reconnect_interval = 5  # 重连间隔（秒）
 
@@ -49,9 +55,7 @@ class TaskClient:
         # 循环重连
         while True:
             try:
-                print(f"\n{'='*60}")
-                print(f"⏳ 正在连接服务端: {self.server_url}")
-                print(f"{'='*60}")
+                logger.info("⏳ 正在连接服务端: %s", self.server_url)
 
                 async with websockets.connect(
                     self.server_url,
@@ -59,8 +63,7 @@ class TaskClient:
                     ping_timeout=10,  # ping超时时间
                 ) as ws:
                     self.ws = ws
-                    print(f"✅ 已连接到服务端")
-                    print(f"⏰ 连接时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+                    logger.info("✅ 已连接到服务端")
 
                     # 注册设备
                     await self._register()
@@ -72,27 +75,27 @@ class TaskClient:
                     await self._listen_tasks()
 
             except websockets.exceptions.ConnectionClosed:
-                print(f"\n❌ 连接已关闭")
+                logger.warning("❌ 连接已关闭")
                 await self._cleanup()
             except Exception as e:
-                print(f"\n❌ 连接错误: {e}")
+                logger.error("❌ 连接错误: %s", e)
                 await self._cleanup()
 
             # 等待重连
-            print(f"⏳ {self.reconnect_interval} 秒后尝试重连...\n")
+            logger.info("⏳ %s 秒后尝试重连...", self.reconnect_interval)
             await asyncio.sleep(self.reconnect_interval)
 
     async def _init_device(self):
         """初始化设备连接"""
         try:
-            print("⏳ 正在连接 Android 设备...")
+            logger.info("⏳ 正在连接 Android 设备...")
             self.device_manager = get_device_manager()
             self.device = self.device_manager.connect()
             self.actions = Actions(self.device)
-            print("✅ 设备已连接\n")
+            self.device_serial = getattr(self.device, "serial", None)
+            logger.info("✅ 设备已连接")
         except Exception as e:
-            print(f"❌ 设备连接失败: {e}")
-            print("请确保设备已连接并开启 USB 调试\n")
+            logger.error("❌ 设备连接失败: %s（请确保设备已连接并开启 USB 调试）", e)
             sys.exit(1)
 
     async def _register(self):
@@ -111,7 +114,7 @@ class TaskClient:
         }
 
         await self.ws.send(json.dumps(register_msg))
-        print(f"📤 已发送注册请求: {self.client_id}")
+        logger.info("📤 已发送注册请求: %s", self.client_id)
 
         # 等待服务端响应（超时 5 秒）
         try:
@@ -120,24 +123,26 @@ class TaskClient:
 
             if data.get("type") == "register_ack":
                 if data.get("success"):
-                    print(f"✅ 注册成功: {data.get('message', '已注册')}")
+                    logger.info("✅ 注册成功: %s", data.get("message", "已注册"))
                     if "server_time" in data:
                         server_time = data["server_time"]
                         local_time = int(time.time())
                         time_diff = abs(server_time - local_time)
                         if time_diff > 60:
-                            print(f"⚠️  时间偏差: {time_diff} 秒（服务端时间: {server_time}，本地时间: {local_time}）")
+                            logger.warning(
+                                "⚠️  时间偏差: %s 秒（服务端时间: %s，本地时间: %s）", time_diff, server_time, local_time
+                            )
                 else:
                     error = data.get("error", "未知错误")
                     code = data.get("code", "UNKNOWN")
-                    print(f"❌ 注册失败: {error} (错误码: {code})")
+                    logger.error("❌ 注册失败: %s (错误码: %s)", error, code)
 
                     # 根据错误码处理
                     if code == "CLIENT_ID_CONFLICT":
                         # client_id 冲突，自动添加随机后缀重试
                         import random
                         new_id = f"{self.client_id}-{random.randint(1000, 9999)}"
-                        print(f"🔄 尝试使用新 ID: {new_id}")
+                        logger.info("🔄 尝试使用新 ID: %s", new_id)
                         self.client_id = new_id
                         # 递归重新注册
                         await self._register()
@@ -145,14 +150,14 @@ class TaskClient:
                         # 其他错误，抛出异常
                         raise Exception(f"注册失败: {error}")
             else:
-                print(f"⚠️  收到非预期消息: {data.get('type')}")
+                logger.warning("⚠️  收到非预期消息: %s", data.get("type"))
 
         except asyncio.TimeoutError:
-            print(f"⚠️  注册响应超时（5秒），假定注册成功")
+            logger.warning("⚠️  注册响应超时（5秒），假定注册成功")
         except json.JSONDecodeError:
-            print(f"⚠️  注册响应格式错误")
+            logger.warning("⚠️  注册响应格式错误")
         except Exception as e:
-            print(f"❌ 注册过程出错: {e}")
+            logger.error("❌ 注册过程出错: %s", e)
             raise
 
     async def _heartbeat(self):
@@ -165,14 +170,15 @@ class TaskClient:
                         "type": "heartbeat",
                         "client_id": self.client_id,
                         "is_busy": self.is_busy,
+                        "current_app": self.current_app,
                         "timestamp": int(time.time()),
                     }
                     await self.ws.send(json.dumps(heartbeat_msg))
-                    print(f"💓 心跳已发送 [忙碌: {self.is_busy}]")
+                    logger.debug("💓 心跳已发送 [忙碌: %s]", self.is_busy)
         except asyncio.CancelledError:
             pass
         except Exception as e:
-            print(f"⚠️ 心跳错误: {e}")
+            logger.warning("⚠️ 心跳错误: %s", e)
 
     async def _listen_tasks(self):
         """监听并处理任务"""
@@ -194,44 +200,70 @@ class TaskClient:
                     elif msg_type == "cancel":
                         # 取消任务（暂不支持）
                         task_id = data.get("task_id")
-                        print(f"⚠️ 收到取消任务请求: {task_id}（暂不支持）")
+                        logger.warning("⚠️ 收到取消任务请求: %s（暂不支持）", task_id)
                     else:
-                        print(f"⚠️ 未知消息类型: {msg_type}")
+                        logger.warning("⚠️ 未知消息类型: %s", msg_type)
 
                 except json.JSONDecodeError:
-                    print(f"⚠️ 无效的 JSON 消息: {message}")
+                    logger.warning("⚠️ 无效的 JSON 消息: %s", message)
                 except Exception as e:
-                    print(f"❌ 处理消息失败: {e}")
+                    logger.error("❌ 处理消息失败: %s", e)
 
         except asyncio.CancelledError:
             pass
 
     async def _handle_task(self, task):
         """处理任务"""
+        received_at = time.time()
         task_id = task.get("task_id")
         app_name = task.get("app")
         workflow_name = task.get("workflow")
         params = task.get("params", {})
+        trace_context = task.get("trace")
+
+        with log.context(task_id=task_id, device=self.device_serial, app=app_name, workflow=workflow_name):
+            if not trace_context:
+                result = self._run_task(task_id, app_name, workflow_name, params)
+            else:
+                # 服务端开启了链路追踪：记录本端的 span 并随结果带回
+                trace = tracing.Trace(trace_context["trace_id"], process=f"client:{self.client_id}")
+                parent_id = trace_context.get("parent_id")
+                if trace_context.get("sent_at"):
+                    trace.add_span("transit", trace_context["sent_at"], received_at, parent_id)
+                span = trace.start_span("client.task", parent_id, received_at, app=app_name, workflow=workflow_name)
+                result = self._run_task(task_id, app_name, workflow_name, params, trace, span["span_id"])
+                trace.end_span(span, status="ok" if result.get("success") else "error")
+                result["trace"] = {"trace_id": trace.trace_id, "spans": trace.spans}
 
-        print(f"\n{'='*60}")
-        print(f"📥 收到任务: {task_id}")
-        print(f"   应用: {app_name}")
-        print(f"   工作流: {workflow_name}")
-        print(f"   参数: {params}")
-        print(f"{'='*60}\n")
+            await self.ws.send(json.dumps(result))
+
+    def _run_task(self, task_id, app_name, workflow_name, params, trace=None, parent_id=None) -> dict:
+        """
+        执行任务（日志上下文由 _handle_task 设置）
+
+        Args:
+            task_id: 任务 ID
+            app_name: 应用名称
+            workflow_name: 工作流名称
+            params: 工作流参数
+            trace: 链路追踪（服务端开启追踪时），工作流和每个 Actions 调用记录为 parent_id 的子 span
+            parent_id: 父 span ID
+
+        Returns:
+            发送给服务端的 result 消息
+        """
+        logger.info("📥 收到任务: %s 应用: %s 工作流: %s 参数: %s", task_id, app_name, workflow_name, params)
 
         # 检查是否忙碌
         if self.is_busy:
-            error_msg = {
+            logger.warning("❌ 任务被拒绝: 设备忙碌")
+            return {
                 "type": "result",
                 "task_id": task_id,
                 "success": False,
                 "error": "设备忙碌，正在执行其他任务",
                 "code": "DEVICE_BUSY",
             }
-            await self.ws.send(json.dumps(error_msg))
-            print(f"❌ 任务被拒绝: 设备忙碌\n")
-            return
 
         # 标记为忙碌
         self.is_busy = True
@@ -248,7 +280,11 @@ class TaskClient:
             workflow_func = workflows[workflow_name]
 
             # 执行工作流
-            result = workflow_func(self.actions, **params)
+            if trace is None:
+                result = workflow_func(self.actions, **params)
+            else:
+                with trace.span("workflow", parent_id) as span, trace.capture_actions(span["span_id"]):
+                    result = workflow_func(self.actions, **params)
 
             # 添加执行时长
             duration = round(time.time() - start_time, 2)
@@ -256,39 +292,33 @@ class TaskClient:
             result["task_id"] = task_id
             result["type"] = "result"
 
-            # 发送结果
-            await self.ws.send(json.dumps(result))
-
             if result.get("success"):
-                print(f"\n✅ 任务执行成功: {task_id}")
-                print(f"   耗时: {duration} 秒\n")
+                self.current_app = app_name
+                logger.info("✅ 任务执行成功: %s 耗时: %s 秒", task_id, duration)
             else:
-                print(f"\n❌ 任务执行失败: {task_id}")
-                print(f"   错误: {result.get('error')}\n")
+                logger.error("❌ 任务执行失败: %s 错误: %s", task_id, result.get("error"))
+                self.actions.capture_failure(result, since=start_time)
+            return result
 
         except ModuleNotFoundError:
-            error_msg = {
+            logger.error("❌ 应用不存在: %s", app_name)
+            return {
                 "type": "result",
                 "task_id": task_id,
                 "success": False,
                 "error": f"应用 '{app_name}' 不存在",
                 "code": "APP_NOT_FOUND",
             }
-            await self.ws.send(json.dumps(error_msg))
-            print(f"❌ 应用不存在: {app_name}\n")
 
         except Exception as e:
-            error_msg = {
+            logger.exception("❌ 任务执行异常: %s", e)
+            return self.actions.capture_failure({
                 "type": "result",
                 "task_id": task_id,
                 "success": False,
                 "error": str(e),
                 "code": "EXECUTION_ERROR",
-            }
-            await self.ws.send(json.dumps(error_msg))
-            print(f"❌ 任务执行异常: {e}\n")
-            import traceback
-            traceback.print_exc()
+            }, since=start_time)
 
         finally:
             # 解除忙碌状态
@@ -322,6 +352,7 @@ async def main():
     )
 
     args = parser.parse_args()
+    log.setup()
 
     print("""
 ╔══════════════════════════════════════════════════════════════╗